@@ -0,0 +1,56 @@
+# Fires thousands of concurrent API clients at the asyncio server, backed by a replayed upstream with latency.
+# Run from the repository root: python -m benchmarks.bench_async_api
+import asyncio
+import time
+
+import aiohttp
+from aiohttp.test_utils import TestServer
+from benchmarks.bench_suite import make_config, make_provider, make_symbols, managers
+from mstocks.async_server import AsyncApiServices, create_app
+from mstocks.endpoints import ApiServices
+
+
+async def run_async(clients=2000, symbol_count=50, symbol_sets=20, latency=0.2):
+    symbols = make_symbols(symbol_count)
+    provider = make_provider(symbols, latency)
+    # No default watchlists, so every request goes through the on-demand fetch path
+    config = make_config([], [])
+    stocks, crypto = managers(config, provider)
+    services = AsyncApiServices(config, services=ApiServices(config, stocks_manager=stocks, crypto_manager=crypto,
+                                                             metrics=provider.metrics))
+    server = TestServer(create_app(services=services))
+    await server.start_server()
+
+    # Every client asks for one of a few overlapping watchlists
+    paths = [f"/api/stocks/{';'.join(symbols[i % symbol_sets::symbol_sets])}" for i in range(symbol_sets)]
+    latencies = []
+
+    async def client(session, path):
+        started = time.perf_counter()
+        async with session.get(server.make_url(path)) as response:
+            await response.read()
+            assert response.status == 200
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=0)) as session:
+        await asyncio.gather(*(client(session, paths[i % symbol_sets]) for i in range(clients)))
+    elapsed = time.perf_counter() - started
+
+    await server.close()
+
+    latencies.sort()
+    print(f"clients: {clients}, watchlists: {symbol_sets}, symbols: {symbol_count}, upstream latency: {latency:.2f}s")
+    print(f"wall time:       {elapsed:.2f}s ({clients / elapsed:.0f} requests/s)")
+    print(f"p50 latency:     {latencies[len(latencies) // 2] * 1000:.0f}ms")
+    print(f"p99 latency:     {latencies[int(len(latencies) * 0.99)] * 1000:.0f}ms")
+    print(f"upstream calls:  {provider.calls}")
+    return {"elapsed": elapsed, "upstream_calls": provider.calls}
+
+
+def run(**kwargs):
+    return asyncio.run(run_async(**kwargs))
+
+
+if __name__ == "__main__":
+    run()
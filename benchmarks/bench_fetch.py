@@ -0,0 +1,47 @@
+# Compares sequential and concurrent crypto refreshes against a fake, latency-injecting data source.
+# Run from the repository root: python -m benchmarks.bench_fetch
+import random
+import time
+
+from mstocks.batch import BatchFetcher
+from mstocks.crypto import CryptoManager
+from mstocks.executor import FetchExecutor
+from tests.helpers import daily_bars
+
+
+class LatencySource:
+    def __init__(self, latencies):
+        self.latencies = latencies
+
+    def download(self, symbols, period=None, start=None):
+        time.sleep(max(self.latencies[symbol] for symbol in symbols))
+        return daily_bars(symbols, [100.0, 101.0])
+
+
+def run(symbol_count=32, workers=32, seed=1):
+    rng = random.Random(seed)
+    symbols = [f"SYM{i}-USD" for i in range(symbol_count)]
+    latencies = {symbol: rng.uniform(0.05, 0.3) for symbol in symbols}
+
+    results = {}
+    for label, max_workers in (("sequential", 1), ("concurrent", workers)):
+        executor = FetchExecutor(max_workers, timeout=5)
+        # One symbol per request so every symbol pays its own latency
+        fetcher = BatchFetcher(LatencySource(latencies), batch_size=1, executor=executor)
+        manager = CryptoManager({'crypto_currency': 'USD'}, executor=executor, fetcher=fetcher)
+        manager.convert_price = float
+        start = time.perf_counter()
+        manager.get_crypto_prices(";".join(symbols))
+        results[label] = time.perf_counter() - start
+        executor.shutdown()
+
+    print(f"symbols: {symbol_count}, workers: {workers}")
+    print(f"sum of latencies:     {sum(latencies.values()):.2f}s")
+    print(f"slowest symbol:       {max(latencies.values()):.2f}s")
+    print(f"sequential refresh:   {results['sequential']:.2f}s")
+    print(f"concurrent refresh:   {results['concurrent']:.2f}s")
+    return results
+
+
+if __name__ == "__main__":
+    run()
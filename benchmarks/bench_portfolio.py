@@ -0,0 +1,52 @@
+# Values a large synthetic portfolio with the per-symbol loop the managers used to run and with Portfolio.
+# Run from the repository root: python -m benchmarks.bench_portfolio
+import random
+import time
+
+from mstocks.portfolio import Portfolio
+
+
+def loop_earnings(investments, symbol, current_price):
+    # The per-lot loop of the old calculate_earnings, kept here as the reference
+    invested = earnings = amount = 0.0
+    for lot in investments.get(symbol, []):
+        quantity = lot.get('quantity', 1)
+        invested += lot.get('buy_price', 0) * quantity + lot.get('fee', 0)
+        earnings += (current_price - lot.get('buy_price', 0)) * quantity
+        amount += quantity
+    return earnings, invested
+
+
+def run(lot_count=100000, symbol_count=5000, seed=1):
+    rng = random.Random(seed)
+    symbols = [f"SYM{i}" for i in range(symbol_count)]
+    investments = {}
+    for _ in range(lot_count):
+        investments.setdefault(rng.choice(symbols), []).append(
+            {'buy_price': rng.uniform(10, 500), 'quantity': rng.uniform(0.1, 20), 'fee': rng.uniform(0, 5)})
+    prices = {symbol: rng.uniform(10, 500) for symbol in symbols}
+
+    start = time.perf_counter()
+    expected = {symbol: loop_earnings(investments, symbol, prices[symbol]) for symbol in symbols}
+    loop_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    portfolio = Portfolio(investments)
+    load_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    valuation = portfolio.valuate(prices)
+    valuate_time = time.perf_counter() - start
+
+    for i, symbol in enumerate(portfolio.symbols):
+        assert abs(valuation['earnings'][i] - expected[symbol][0]) < 1e-6 * max(1.0, abs(expected[symbol][0]))
+
+    print(f"lots: {len(portfolio)}, symbols: {len(portfolio.symbols)}")
+    print(f"per-symbol loop:      {loop_time * 1000:.1f}ms")
+    print(f"portfolio load:       {load_time * 1000:.1f}ms (once per config)")
+    print(f"vectorized valuation: {valuate_time * 1000:.1f}ms")
+    return {"loop": loop_time, "load": load_time, "valuate": valuate_time}
+
+
+if __name__ == "__main__":
+    run()
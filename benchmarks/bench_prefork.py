@@ -0,0 +1,85 @@
+# Read throughput of the pre-forked Flask API with 1, 2 and 4 workers, serving a replayed watchlist from the
+# shared snapshot to concurrent HTTP clients. Scaling depends on the number of cores available.
+# Run from the repository root: python -m benchmarks.bench_prefork
+import http.client
+import logging
+import os
+import threading
+import time
+
+from benchmarks.bench_suite import make_config, make_provider, make_symbols, managers
+from mstocks.endpoints import ApiServices
+from mstocks.prefork import PreforkServer
+
+
+# Forked workers inherit the level, so the access log does not flood the output
+logging.getLogger('werkzeug').setLevel(logging.ERROR)
+
+
+def services_factory(symbols):
+    def build(config):
+        provider = make_provider(symbols, 0.0)
+        stocks, crypto = managers(config, provider)
+        return ApiServices(config, stocks_manager=stocks, crypto_manager=crypto, metrics=provider.metrics)
+    return build
+
+
+def wait_ready(port, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+            connection.request("GET", "/api/stocks")
+            response = connection.getresponse()
+            response.read()
+            connection.close()
+            if response.status == 200 and 'X-Data-Age' in response.headers:
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("server did not start")
+
+
+def load(port, path, clients, seconds):
+    counts = [0] * clients
+    deadline = time.perf_counter() + seconds
+
+    def client(index):
+        # One keep-alive connection per client
+        connection = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+        while time.perf_counter() < deadline:
+            connection.request("GET", path)
+            response = connection.getresponse()
+            response.read()
+            counts[index] += 1
+        connection.close()
+
+    threads = [threading.Thread(target=client, args=(index,)) for index in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(counts) / seconds
+
+
+def run(symbol_count=500, workers=(1, 2, 4), clients=16, seconds=5.0):
+    symbols = make_symbols(symbol_count)
+    config = make_config(symbols, [])
+    results = {}
+    print(f"symbols: {symbol_count}, clients: {clients}, cores: {os.cpu_count()}")
+    for count in workers:
+        server = PreforkServer(config, host="127.0.0.1", port=0, workers=count,
+                               services_factory=services_factory(symbols))
+        server.start()
+        try:
+            wait_ready(server.port)
+            results[count] = load(server.port, "/api/stocks", clients, seconds)
+        finally:
+            server.stop()
+        print(f"{count} worker(s): {results[count]:.0f} requests/s, {results[count] / results[workers[0]]:.2f}x")
+    return results
+
+
+if __name__ == "__main__":
+    run()
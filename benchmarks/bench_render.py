@@ -0,0 +1,57 @@
+# Measures the bytes written to the terminal per refresh of a 500-row table: full reprint vs diff renderer.
+# Run from the repository root: python -m benchmarks.bench_render
+import contextlib
+import io
+import random
+
+from mstocks.render import TerminalRenderer
+from mstocks.utils import Utils
+
+
+def make_row(symbol, price, buy_price):
+    change = price - buy_price
+    return ["\033[92m●\033[0m (15:30:00)", f"[{symbol}]", f"{symbol} Corporation", f"{price:.2f} USD",
+            Utils.value_cell(change / 10, "USD", change / buy_price * 10), f"{buy_price:.2f} USD [{buy_price:.2f}]",
+            Utils.value_cell(change, "USD", change / buy_price * 100)]
+
+
+def run(row_count=500, refreshes=20, changed_share=0.1, seed=1):
+    rng = random.Random(seed)
+    symbols = [f"SYM{i:03d}" for i in range(row_count)]
+    buy_prices = {symbol: rng.uniform(50, 150) for symbol in symbols}
+    prices = dict(buy_prices)
+    headers = Utils.table_headers()
+
+    renderer = TerminalRenderer(io.StringIO(), height=row_count + 10)
+    full_bytes = []
+    diff_bytes = []
+    for _ in range(refreshes):
+        # A tick moves the price of a share of the symbols
+        for symbol in rng.sample(symbols, int(row_count * changed_share)):
+            prices[symbol] += rng.uniform(-1, 1)
+        rows = [make_row(symbol, prices[symbol], buy_prices[symbol]) for symbol in symbols]
+
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            print("\033[H\033[J", end="")
+            print("Stock Prices as of 2024-03-06 15:30:00")
+            Utils.print_table_with_fixed_width(rows)
+        full_bytes.append(len(output.getvalue().encode('utf-8')))
+
+        before = renderer.bytes_written
+        renderer.render([renderer.text("Stock Prices as of 2024-03-06 15:30:00")] +
+                        renderer.table("stocks", headers, rows))
+        diff_bytes.append(renderer.bytes_written - before)
+
+    # The first frame is a full draw for both
+    steady_full = sum(full_bytes[1:]) / (refreshes - 1)
+    steady_diff = sum(diff_bytes[1:]) / (refreshes - 1)
+    print(f"rows: {row_count}, refreshes: {refreshes}, rows changed per refresh: {int(row_count * changed_share)}")
+    print(f"first frame:               full {full_bytes[0]} B, diff {diff_bytes[0]} B")
+    print(f"full reprint per refresh:  {steady_full:.0f} B")
+    print(f"diff renderer per refresh: {steady_diff:.0f} B ({steady_full / max(steady_diff, 1):.1f}x less)")
+    return {"full": steady_full, "diff": steady_diff}
+
+
+if __name__ == "__main__":
+    run()
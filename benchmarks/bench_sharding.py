@@ -0,0 +1,48 @@
+# Refresh throughput of a large watchlist fetched in this process and by 2 and 4 shard worker processes.
+# Uses recorded bars replayed from a temporary directory, so no network is needed. Scaling depends on
+# the number of cores available.
+# Run from the repository root: python -m benchmarks.bench_sharding
+import functools
+import os
+import tempfile
+import time
+
+from benchmarks.bench_suite import make_config, make_provider, make_symbols
+from mstocks.metrics import Metrics
+from mstocks.providers import ReplayProvider
+from mstocks.sharding import ShardPool
+from mstocks.stocks import StocksManager
+
+
+def run(symbol_count=4000, processes=(1, 2, 4), refreshes=3, latency=0.0):
+    symbols = make_symbols(symbol_count)
+    request = ";".join(symbols)
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        ReplayProvider.record(directory, symbols, provider=make_provider(symbols, 0.0), period="1mo")
+        factory = functools.partial(ReplayProvider.from_directory, directory, latency=latency)
+        print(f"symbols: {symbol_count}, cores: {os.cpu_count()}")
+        for count in processes:
+            config = make_config(symbols, [])
+            metrics = Metrics()
+            shards = ShardPool("stocks", config, count, metrics=metrics, provider_factory=factory) if count > 1 else None
+            manager = StocksManager(config, provider=factory(), metrics=metrics, shards=shards)
+            try:
+                # The first refresh starts the workers and seeds their bar history
+                manager.fetch_quotes(request)
+                started = time.perf_counter()
+                for _ in range(refreshes):
+                    quotes = manager.fetch_quotes(request)
+                elapsed = (time.perf_counter() - started) / refreshes
+            finally:
+                manager.close()
+            assert len(quotes) == symbol_count and not any(quote.error for quote in quotes)
+            results[count] = elapsed
+            speedup = results[processes[0]] / elapsed
+            print(f"{count} process(es): {elapsed:.2f}s per refresh, {symbol_count / elapsed:.0f} symbols/s, "
+                  f"{speedup:.2f}x")
+    return results
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,53 @@
+# Measures the cost of fanning one refresh out to many streaming clients, against the same clients polling.
+# Run from the repository root: python -m benchmarks.bench_stream
+import json
+import random
+import time
+
+from mstocks.stream import QuoteStream
+
+
+def make_rows(symbols, prices):
+    return {symbol: {"symbol": symbol, "company_name": f"{symbol} Corporation", "currency": "USD",
+                     "last_close_price": prices[symbol], "fetched_at": time.time()} for symbol in symbols}
+
+
+def run(symbol_count=500, subscribers=5000, symbols_per_client=20, changed_share=0.1, refreshes=10, seed=1):
+    rng = random.Random(seed)
+    symbols = [f"SYM{i:04d}" for i in range(symbol_count)]
+    prices = {symbol: rng.uniform(10, 500) for symbol in symbols}
+    stream = QuoteStream()
+    subscriptions = [stream.subscribe("stocks", rng.sample(symbols, symbols_per_client), lambda: None)
+                     for _ in range(subscribers)]
+    stream.publish("stocks", make_rows(symbols, prices))
+    for subscription in subscriptions:
+        subscription.take()
+
+    publish_time = take_time = 0.0
+    stream_bytes = 0
+    for _ in range(refreshes):
+        for symbol in rng.sample(symbols, int(symbol_count * changed_share)):
+            prices[symbol] += rng.uniform(-1, 1)
+        rows = make_rows(symbols, prices)
+        start = time.perf_counter()
+        stream.publish("stocks", rows)
+        publish_time += time.perf_counter() - start
+        start = time.perf_counter()
+        for subscription in subscriptions:
+            payload = subscription.take()
+            stream_bytes += len(payload) if payload else 0
+        take_time += time.perf_counter() - start
+
+    # Polling clients each get every row of their symbols on every refresh
+    poll_bytes = sum(len(json.dumps([rows[symbol] for symbol in subscription.symbols])) for subscription in subscriptions)
+    print(f"symbols: {symbol_count}, subscribers: {subscribers} x {symbols_per_client} symbols, "
+          f"{int(symbol_count * changed_share)} symbols changed per refresh")
+    print(f"publish per refresh:         {publish_time / refreshes * 1000:.1f}ms")
+    print(f"delivery to all subscribers: {take_time / refreshes * 1000:.1f}ms")
+    print(f"bytes per refresh, polling:  {poll_bytes}")
+    print(f"bytes per refresh, stream:   {stream_bytes / refreshes:.0f}")
+    return {"publish": publish_time / refreshes, "take": take_time / refreshes}
+
+
+if __name__ == "__main__":
+    run()
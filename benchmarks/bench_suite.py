@@ -0,0 +1,260 @@
+# End-to-end benchmarks of the refresh and API paths, offline, on synthetic watchlists and portfolios.
+# Drives StocksManager, CryptoManager, Utils.print_table_with_fixed_width and the Flask routes through a
+# ReplayProvider, writes the timings as JSON and compares them with a stored baseline.
+# Run from the repository root:
+#   python -m benchmarks.bench_suite                      # full suite, compared with benchmarks/baseline.json
+#   python -m benchmarks.bench_suite --quick              # small sizes only, for a quick check
+#   python -m benchmarks.bench_suite --latency 0.05       # every upstream call takes 50ms
+#   python -m benchmarks.bench_suite --save-baseline      # store this run as the new baseline
+# Exits with 1 when a case got slower than its baseline by more than --tolerance.
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from mstocks import endpoints
+from mstocks.crypto import CryptoManager
+from mstocks.endpoints import ApiServices, app
+from mstocks.fx import FxRateProvider
+from mstocks.metrics import Metrics
+from mstocks.providers import ReplayProvider
+from mstocks.refresher import QuoteRefresher
+from mstocks.stocks import StocksManager
+from mstocks.utils import Utils
+
+SYMBOL_COUNTS = (10, 100, 1000, 5000)
+LOT_COUNTS = (10, 1000, 100000)
+QUICK_SYMBOL_COUNTS = (10, 100)
+QUICK_LOT_COUNTS = (10, 1000)
+
+BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+# Differences below this many seconds are noise, whatever the ratio
+MIN_DIFFERENCE = 0.002
+
+
+def make_symbols(count, crypto=False):
+    if crypto:
+        return [f"C{i:04d}-USD" for i in range(count)]
+    # A quarter of the watchlist trades in Warsaw, the rest in the US
+    return [f"S{i:04d}.WA" if i % 4 == 0 else f"S{i:04d}" for i in range(count)]
+
+
+def make_provider(symbols, latency, seed=1):
+    rng = random.Random(seed)
+    index = pd.date_range('2024-02-01', periods=30, freq='B')
+    bars = {}
+    for symbol in symbols:
+        closes = np.cumprod(1 + np.array([rng.gauss(0, 0.02) for _ in index])) * rng.uniform(10, 500)
+        bars[symbol] = pd.DataFrame({'Open': closes, 'High': closes, 'Low': closes, 'Close': closes,
+                                     'Volume': [1000.0] * len(index)}, index=index)
+    names = {symbol: f"{symbol} Corporation" for symbol in symbols}
+    return ReplayProvider(bars, names, {"USD": {"PLN": 4.0, "EUR": 0.9, "USD": 1.0}}, latency=latency, seed=seed,
+                          metrics=Metrics())
+
+
+def make_investments(symbols, lot_count, seed=1):
+    rng = random.Random(seed)
+    investments = {}
+    for _ in range(lot_count):
+        investments.setdefault(rng.choice(symbols), []).append(
+            {'buy_price': rng.uniform(10, 500), 'quantity': rng.uniform(0.1, 20), 'fee': rng.uniform(0, 5)})
+    return investments
+
+
+def make_config(stocks, cryptos, investments=None):
+    return {'default_stocks': stocks, 'default_cryptos': cryptos, 'crypto': 'True', 'crypto_currency': 'PLN',
+            'currency_map': {".WA": "PLN", "": "USD"}, 'investments': investments or {}, 'refresh_rate': 60,
+            'batch_size': 100, 'fetch_workers': 8, 'fetch_timeout': 60}
+
+
+def managers(config, provider):
+    metrics = provider.metrics
+    stocks = StocksManager(config, provider=provider, metrics=metrics)
+    crypto = CryptoManager(config, provider=provider, metrics=metrics,
+                           fx_provider=FxRateProvider(source=provider))
+    return stocks, crypto
+
+
+def timed(func, repeat):
+    """Return the median and the fastest of repeat runs of func, in seconds."""
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - started)
+    return {"seconds": statistics.median(times), "min": min(times), "runs": repeat}
+
+
+def repeats(size, small=5, large=2):
+    return small if size <= 1000 else large
+
+
+def bench_managers(symbol_counts, latency):
+    results = {}
+    for count in symbol_counts:
+        stocks_symbols, crypto_symbols = make_symbols(count), make_symbols(count, crypto=True)
+        provider = make_provider(stocks_symbols + crypto_symbols, latency)
+        config = make_config(stocks_symbols, crypto_symbols, make_investments(stocks_symbols + crypto_symbols, count))
+        stocks, crypto = managers(config, provider)
+        stock_request, crypto_request = ";".join(stocks_symbols), ";".join(crypto_symbols)
+
+        # The first refresh downloads a month of bars and every company name, later ones only the new bars
+        results[f"stocks_refresh_cold[{count}]"] = timed(lambda: stocks.get_stock_prices(stock_request), 1)
+        results[f"stocks_refresh_warm[{count}]"] = timed(lambda: stocks.get_stock_prices(stock_request), repeats(count))
+        results[f"stocks_json_warm[{count}]"] = timed(lambda: stocks.get_stock_prices_json(stock_request), repeats(count))
+        results[f"crypto_refresh_cold[{count}]"] = timed(lambda: crypto.get_crypto_prices(crypto_request), 1)
+        results[f"crypto_refresh_warm[{count}]"] = timed(lambda: crypto.get_crypto_prices(crypto_request), repeats(count))
+    return results
+
+
+def bench_portfolio(lot_counts, symbol_count=1000):
+    results = {}
+    symbols = make_symbols(symbol_count)
+    prices = {symbol: 100.0 + i % 50 for i, symbol in enumerate(symbols)}
+    for count in lot_counts:
+        config = make_config(symbols, [], make_investments(symbols, count))
+        manager = StocksManager(config, provider=make_provider([], 0.0))
+        # Parsing the lots happens once per config, valuing them on every refresh
+        results[f"portfolio_load[{count}]"] = timed(lambda: StocksManager(config, provider=manager.provider).portfolio,
+                                                     repeats(count // 100))
+        portfolio = manager.portfolio
+        results[f"portfolio_valuation[{count}]"] = timed(lambda: portfolio.positions(prices), repeats(count // 100))
+    return results
+
+
+def bench_table(symbol_counts):
+    results = {}
+    for count in symbol_counts:
+        symbols = make_symbols(count)
+        provider = make_provider(symbols, 0.0)
+        stocks, _ = managers(make_config(symbols, [], make_investments(symbols, count)), provider)
+        rows = stocks.get_stock_prices(";".join(symbols))
+
+        def print_table():
+            with contextlib.redirect_stdout(io.StringIO()):
+                Utils.print_table_with_fixed_width(rows)
+        results[f"print_table[{count}]"] = timed(print_table, repeats(count))
+    return results
+
+
+def bench_routes(symbol_counts, requests=50):
+    results = {}
+    previous = endpoints._services
+    client = app.test_client()
+    try:
+        for count in symbol_counts:
+            stocks_symbols, crypto_symbols = make_symbols(count), make_symbols(min(count, 100), crypto=True)
+            provider = make_provider(stocks_symbols + crypto_symbols, 0.0)
+            config = make_config(stocks_symbols, crypto_symbols, make_investments(stocks_symbols, count))
+            stocks, crypto = managers(config, provider)
+            refresher = QuoteRefresher(config, stocks, crypto, stocks_symbols, crypto_symbols, metrics=provider.metrics)
+            refresher.refresh("stocks")
+            refresher.refresh("crypto")
+            endpoints._services = ApiServices(config, stocks_manager=stocks, crypto_manager=crypto, refresher=refresher,
+                                              metrics=provider.metrics)
+            subset = "/api/stocks/" + ";".join(stocks_symbols[:min(count, 50)])
+
+            def get(path, times):
+                for _ in range(times):
+                    response = client.get(path)
+                    assert response.status_code == 200, response.status_code
+                    response.get_data()
+
+            per_size = max(1, requests * 10 // count) if count > 100 else requests
+            # Watchlist from the refresher's snapshot, a tracked subset, and the metrics page
+            for name, path in (("route_stocks", "/api/stocks"), ("route_stocks_subset", subset),
+                               ("route_crypto", "/api/crypto"), ("route_metrics", "/metrics")):
+                result = timed(lambda: get(path, per_size), 3)
+                result["seconds"] /= per_size
+                result["min"] /= per_size
+                result["requests"] = per_size
+                results[f"{name}[{count}]"] = result
+    finally:
+        endpoints._services = previous
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Return [(name, baseline seconds, current seconds, ratio)] of the cases slower than baseline by more than tolerance."""
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if reference is None:
+            continue
+        before, after = reference["seconds"], result["seconds"]
+        if after - before > MIN_DIFFERENCE and after > before * (1 + tolerance):
+            regressions.append((name, before, after, after / before if before else float('inf')))
+    return regressions
+
+
+def run(quick=False, latency=0.0, output="bench_results.json", baseline_path=BASELINE, tolerance=0.25,
+        save_baseline=False):
+    symbol_counts = QUICK_SYMBOL_COUNTS if quick else SYMBOL_COUNTS
+    lot_counts = QUICK_LOT_COUNTS if quick else LOT_COUNTS
+
+    results = {}
+    for label, bench in (("managers", lambda: bench_managers(symbol_counts, latency)),
+                         ("portfolio", lambda: bench_portfolio(lot_counts)),
+                         ("table", lambda: bench_table(symbol_counts)),
+                         ("routes", lambda: bench_routes(symbol_counts))):
+        started = time.perf_counter()
+        results.update(bench())
+        print(f"{label}: done in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+    report = {
+        "meta": {"timestamp": time.time(), "python": platform.python_version(), "platform": platform.platform(),
+                 "quick": quick, "latency": latency},
+        "results": results,
+    }
+    with open(output, 'w') as file:
+        json.dump(report, file, indent=4, sort_keys=True)
+
+    baseline = {}
+    if os.path.exists(baseline_path):
+        with open(baseline_path, 'r') as file:
+            baseline = json.load(file).get("results", {})
+    regressions = compare(results, baseline, tolerance)
+    regressed = {name for name, _, _, _ in regressions}
+
+    width = max(len(name) for name in results)
+    print(f"{'case':<{width}}  {'median ms':>10}  {'baseline ms':>11}")
+    for name, result in results.items():
+        reference = baseline.get(name)
+        before = f"{reference['seconds'] * 1000:.2f}" if reference else "-"
+        flag = "  REGRESSION" if name in regressed else ""
+        print(f"{name:<{width}}  {result['seconds'] * 1000:>10.2f}  {before:>11}{flag}")
+    print(f"Results written to {output}")
+
+    if save_baseline:
+        with open(baseline_path, 'w') as file:
+            json.dump(report, file, indent=4, sort_keys=True)
+        print(f"Baseline saved to {baseline_path}")
+    elif regressions:
+        print(f"{len(regressions)} case(s) more than {tolerance:.0%} slower than the baseline")
+    return report, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Offline end-to-end benchmarks of the refresh and API paths.')
+    parser.add_argument('--quick', action='store_true', help='Only run the small sizes')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds every upstream call takes (default: 0)')
+    parser.add_argument('--output', default='bench_results.json', help='Where to write the results (default: bench_results.json)')
+    parser.add_argument('--baseline', default=BASELINE, help='Baseline to compare with (default: benchmarks/baseline.json)')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed slowdown against the baseline (default: 0.25)')
+    parser.add_argument('--save-baseline', action='store_true', help='Store this run as the baseline')
+    args = parser.parse_args(argv)
+    _, regressions = run(args.quick, args.latency, args.output, args.baseline, args.tolerance, args.save_baseline)
+    return 1 if regressions and not args.save_baseline else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
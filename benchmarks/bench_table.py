@@ -0,0 +1,108 @@
+# Micro-benchmarks the console table pipeline on 10k rows: the previous string-parsing printer against
+# the current one fed with structured cells.
+# Run from the repository root: python -m benchmarks.bench_table
+import contextlib
+import io
+import random
+import re
+import time
+
+from mstocks.utils import Utils
+
+
+def strip_ansi_codes_before(text):
+    ansi_escape = re.compile(r'(?:\x1b\[|\x9b)[0-?]*[ -\/]*[@-~]')
+    return ansi_escape.sub('', text)
+
+
+def print_table_before(prices, include_market_status=True):
+    # print_table_with_fixed_width as it was before cells carried their values, kept as the reference
+    headers = Utils.table_headers(include_market_status)
+    max_widths = [0] * len(headers)
+    for row in prices:
+        for i, item in enumerate(row):
+            if i >= len(headers):
+                break
+            length = len(strip_ansi_codes_before(str(item)))
+            if length > max_widths[i]:
+                max_widths[i] = length
+    for i, header in enumerate(headers):
+        if len(header) > max_widths[i]:
+            max_widths[i] = len(header)
+
+    horizontal_sep = '-' * (sum(max_widths) + (3 * (len(max_widths) - 1)))
+    format_str = ' | '.join(f"{Utils.BOLD}{{:<{w}}}{Utils.ENDC}" for w in max_widths)
+    print(format_str.format(*headers))
+    print(horizontal_sep)
+    for row in prices:
+        formatted_row = []
+        for i, item in enumerate(row):
+            if i >= len(headers):
+                break
+            item_str = str(item)
+            if '↑' in item_str:
+                item_str = Utils.OKGREEN + item_str + Utils.ENDC
+            elif '↓' in item_str:
+                item_str = Utils.FAIL + item_str + Utils.ENDC
+            if i == len(row) - 1 and item_str != '—':
+                earnings_value = float(strip_ansi_codes_before(item_str).split()[0])
+                if earnings_value > 0:
+                    item_str = Utils.OKGREEN + item_str + Utils.ENDC
+                elif earnings_value < 0:
+                    item_str = Utils.FAIL + item_str + Utils.ENDC
+            formatted_row.append(item_str)
+        print(format_str.format(*formatted_row[:len(headers)]))
+
+
+def make_rows(row_count, structured, seed=1):
+    rng = random.Random(seed)
+    # Structured rows carry Cells; the old rows carried the same text with color codes baked in
+    cell = Utils.value_cell if structured else Utils._format_value
+    rows = []
+    for i in range(row_count):
+        price, buy_price = rng.uniform(10, 500), rng.uniform(10, 500)
+        change = rng.uniform(-5, 5)
+        rows.append([f"\033[92m●\033[0m (15:30:00)", f"[SYM{i}]", f"Company {i}", f"{price:.2f} USD",
+                     cell(change, "USD", change / price * 100), f"{buy_price:.2f} USD [{buy_price:.2f}]",
+                     cell(price - buy_price, "USD", (price - buy_price) / buy_price * 100)])
+    return rows
+
+
+def best_of(func, rows, repeat):
+    times = []
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            func(rows)
+            times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def run(row_count=10000, repeat=5):
+    legacy_rows = make_rows(row_count, structured=False)
+    structured_rows = make_rows(row_count, structured=True)
+
+    results = {
+        "before": best_of(print_table_before, legacy_rows, repeat),
+        "after, string rows": best_of(Utils.print_table_with_fixed_width, legacy_rows, repeat),
+        "after, cell rows": best_of(Utils.print_table_with_fixed_width, structured_rows, repeat),
+    }
+    texts = [str(item) for row in legacy_rows for item in row]
+    start = time.perf_counter()
+    for text in texts:
+        strip_ansi_codes_before(text)
+    results["strip, compiled per call"] = time.perf_counter() - start
+    start = time.perf_counter()
+    for text in texts:
+        Utils.strip_ansi_codes(text)
+    results["strip, precompiled"] = time.perf_counter() - start
+
+    print(f"rows: {row_count}, best of {repeat}")
+    for label, seconds in results.items():
+        print(f"{label + ':':28}{seconds * 1000:8.1f}ms")
+    print(f"table speedup with cells:   {results['before'] / results['after, cell rows']:.1f}x")
+    return results
+
+
+if __name__ == "__main__":
+    run()
@@ -1,6 +1,5 @@
 import argparse
 import sys
-from mstocks.endpoints import app
 from mstocks.config import Config
 from mstocks.run_manager import RunManager
 from mstocks.stocks import StocksManager
@@ -10,14 +9,25 @@ def main():
     parser = argparse.ArgumentParser(description='Manage stocks and crypto.')
     parser.add_argument('--silent', dest='silent', action='store_true', help='Enable silent mode to run in docker env (default: disabled)')
     parser.add_argument('--serve', dest='serve', action='store_true', help='Start the web server for API (default: disabled)')
+    parser.add_argument('--workers', dest='workers', type=int, metavar='N', help='With --serve, the number of API worker processes (default: api_workers in the config, or one per CPU)')
+    parser.add_argument('--serve-async', dest='serve_async', action='store_true', help='Start the asyncio web server for API (default: disabled)')
+    parser.add_argument('--profile', dest='profile', nargs='?', type=int, const=3, metavar='CYCLES', help='Run CYCLES refreshes of the configured watchlists (default: 3) and report the time per stage and symbol')
+    parser.add_argument('--profile-output', dest='profile_output', metavar='FILE', help='With --profile, also write cProfile stats to FILE')
     args = parser.parse_args()
 
     config = Config()
     runner = RunManager(config)
 
-    if args.serve:
-        # If --serve is specified, start the Flask web server
-        app.run(debug=True, port=5001)  # You can change the port if needed
+    if args.profile is not None:
+        runner.run_profile(args.profile, args.profile_output)
+    elif args.serve_async:
+        # Imported here so aiohttp is only needed for this mode
+        from mstocks import async_server
+        async_server.run(config, port=5001)
+    elif args.serve:
+        # If --serve is specified, start the Flask API in pre-forked workers fed by one refresher process
+        from mstocks import prefork
+        prefork.run(config, port=5001, workers=args.workers)
     elif args.silent:
         runner.run_silent()
     else:
@@ -0,0 +1,212 @@
+import asyncio
+
+from aiohttp import web
+from mstocks.config import Config
+from mstocks.endpoints import ApiServices
+from mstocks.utils import Utils
+
+
+class AsyncApiServices:
+    """
+    Asyncio front of endpoints.ApiServices.
+
+    Requests are answered by the same ApiServices the Flask API uses, so the default watchlists come
+    from its QuoteRefresher and every other symbol set is fetched by its managers: through the
+    QuoteProvider, the shared Upstream rate limiter and circuit breaker, the HistoryStore and the
+    MetadataCache, recorded in Metrics, and cached per symbol set. Those calls block, so they run on
+    worker threads, and concurrent requests for the same asset class and symbol set await a single
+    one of them; a burst of clients costs one thread per distinct symbol set, not per client.
+    Streaming clients get the changes the refresher publishes.
+    """
+
+    def __init__(self, config, services=None):
+        """
+        :param services: The ApiServices to answer from, built from config when None.
+        """
+        self.config = config
+        self.services = services or ApiServices(config)
+        self.stream = self.services.stream
+        self._inflight = {}
+
+    async def close(self):
+        await asyncio.to_thread(self.services.close)
+
+    async def stock_prices(self, symbols):
+        """Return (json rows, age in seconds, stale) for the requested stock symbols."""
+        return await self._prices("stocks", symbols)
+
+    async def crypto_prices(self, symbols):
+        """Return (json rows, age in seconds, stale) for the requested crypto symbols."""
+        return await self._prices("crypto", symbols)
+
+    def stream_symbols(self, kind, symbols=None):
+        """
+        Return the symbols a streaming client of kind asked for, all tracked ones when None.
+        Only the symbols the refresher tracks get updates, so any other symbol raises KeyError.
+        """
+        return self.services.stream_symbols(kind, symbols)
+
+    def metrics_text(self):
+        return self.services.metrics_text()
+
+    async def _prices(self, kind, symbols):
+        key = (kind, ApiServices.normalize_symbols(symbols))
+        load = self._inflight.get(key)
+        if load is None:
+            prices = self.services.stock_prices if kind == "stocks" else self.services.crypto_prices
+            load = self._inflight[key] = asyncio.ensure_future(asyncio.to_thread(prices, list(key[1])))
+            load.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # Shielded so one client hanging up does not cancel the fetch the others wait on
+        rows, age, stale = await asyncio.shield(load)
+        by_symbol = dict(zip(key[1], rows))
+        # Answer in the order the client asked for
+        return [by_symbol[symbol.strip()] for symbol in symbols if symbol.strip()], age, stale
+
+
+SERVICES = web.AppKey("services", AsyncApiServices)
+
+# Seconds between keep-alive messages on an idle stream
+STREAM_KEEPALIVE = 15
+
+
+def _json_with_age(prices, age, stale=False):
+    # Same headers as the Flask API
+    headers = {'X-Data-Age': f"{age:.1f}"}
+    if stale:
+        headers['X-Data-Stale'] = "true"
+    return web.json_response(prices, headers=headers)
+
+
+def _subscribe(services, kind, symbols):
+    # Returns (subscription, event set whenever it has rows pending)
+    loop = asyncio.get_running_loop()
+    ready = asyncio.Event()
+    return services.stream.subscribe(kind, symbols, lambda: loop.call_soon_threadsafe(ready.set)), ready
+
+
+async def _next_payload(subscription, ready, timeout):
+    """Wait up to timeout seconds for changed rows; None when there were none."""
+    try:
+        await asyncio.wait_for(ready.wait(), timeout)
+    except asyncio.TimeoutError:
+        return None
+    ready.clear()
+    return subscription.take()
+
+
+def _untracked(error):
+    return web.json_response({"error": f"Not streamed, only tracked symbols are: {error.args[0]}"}, status=404)
+
+
+async def _event_stream(request, services, kind, symbols):
+    try:
+        symbols = services.stream_symbols(kind, symbols)
+    except KeyError as e:
+        return _untracked(e)
+    response = web.StreamResponse(headers={'Content-Type': 'text/event-stream', 'Cache-Control': 'no-cache'})
+    subscription, ready = _subscribe(services, kind, symbols)
+    try:
+        await response.prepare(request)
+        # The current rows first, then only the rows that changed
+        payload = services.stream.current(kind, symbols)
+        while True:
+            await response.write((f"event: quotes\ndata: {payload}\n\n" if payload is not None
+                                  else ": keep-alive\n\n").encode('utf-8'))
+            payload = await _next_payload(subscription, ready, STREAM_KEEPALIVE)
+    except ConnectionResetError:
+        # The client went away
+        pass
+    finally:
+        subscription.close()
+    return response
+
+
+async def _websocket(request, services, kind, symbols):
+    try:
+        symbols = services.stream_symbols(kind, symbols)
+    except KeyError as e:
+        return _untracked(e)
+    ws = web.WebSocketResponse(heartbeat=STREAM_KEEPALIVE)
+    await ws.prepare(request)
+    subscription, ready = _subscribe(services, kind, symbols)
+
+    async def send():
+        payload = services.stream.current(kind, symbols)
+        while True:
+            if payload is not None:
+                await ws.send_str(payload)
+            payload = await _next_payload(subscription, ready, STREAM_KEEPALIVE)
+
+    sender = asyncio.ensure_future(send())
+    try:
+        # Clients do not send anything; this ends when they close the socket
+        async for _ in ws:
+            pass
+    finally:
+        sender.cancel()
+        subscription.close()
+    return ws
+
+
+def create_app(config=None, services=None):
+    """
+    Build the aiohttp application serving the same routes and json as the Flask API, plus the
+    WebSocket counterparts of the event streams.
+    """
+    services = services or AsyncApiServices(config or Config())
+    routes = web.RouteTableDef()
+
+    @routes.get('/api/stocks')
+    async def api_get_stocks(request):
+        return _json_with_age(*await services.stock_prices(services.config.get('default_stocks', [])))
+
+    @routes.get('/api/stocks/{symbols}')
+    async def api_get_stocks_by_symbols(request):
+        return _json_with_age(*await services.stock_prices(request.match_info['symbols'].split(';')))
+
+    @routes.get('/api/crypto')
+    async def api_get_crypto(request):
+        return _json_with_age(*await services.crypto_prices(services.config.get('default_cryptos', [])))
+
+    @routes.get('/api/crypto/{symbols}')
+    async def api_get_crypto_by_symbols(request):
+        return _json_with_age(*await services.crypto_prices(request.match_info['symbols'].split(';')))
+
+    @routes.get('/api/stream/{kind:stocks|crypto}')
+    async def api_stream(request):
+        return await _event_stream(request, services, request.match_info['kind'], None)
+
+    @routes.get('/api/stream/{kind:stocks|crypto}/{symbols}')
+    async def api_stream_by_symbols(request):
+        return await _event_stream(request, services, request.match_info['kind'],
+                                   request.match_info['symbols'].split(';'))
+
+    @routes.get('/api/ws/{kind:stocks|crypto}')
+    async def api_websocket(request):
+        return await _websocket(request, services, request.match_info['kind'], None)
+
+    @routes.get('/api/ws/{kind:stocks|crypto}/{symbols}')
+    async def api_websocket_by_symbols(request):
+        return await _websocket(request, services, request.match_info['kind'], request.match_info['symbols'].split(';'))
+
+    @routes.get('/metrics')
+    async def metrics(request):
+        text = await asyncio.to_thread(services.metrics_text)
+        return web.Response(body=text.encode('utf-8'), headers={'Content-Type': 'text/plain; version=0.0.4'})
+
+    app = web.Application()
+    app.add_routes(routes)
+    app[SERVICES] = services
+
+    async def close_services(app):
+        await services.close()
+
+    app.on_cleanup.append(close_services)
+    return app
+
+
+def run(config, port=5001):
+    if isinstance(config, Config):
+        config.watch(Utils.as_float(config.get('config_watch_interval', 2), 2))
+    # Like the Flask API, only reachable from this machine unless api_host says otherwise
+    web.run_app(create_app(config), host=config.get('api_host', "127.0.0.1"), port=port)
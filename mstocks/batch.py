@@ -0,0 +1,76 @@
+import pandas as pd
+from .providers import YFinanceProvider
+
+
+class BatchFetcher:
+    def __init__(self, source=None, batch_size=100, executor=None):
+        """
+        :param source: QuoteProvider the bars are downloaded from, live Yahoo Finance by default.
+        """
+        self.source = source or YFinanceProvider()
+        self.batch_size = max(1, int(batch_size))
+        self.executor = executor
+
+    def batches(self, symbols):
+        # Drop blanks and duplicates but keep the order the caller asked for
+        unique = list(dict.fromkeys(symbol for symbol in symbols if symbol))
+        return [unique[i:i + self.batch_size] for i in range(0, len(unique), self.batch_size)]
+
+    def fetch_history(self, symbols, period="2d", start=None):
+        """
+        Fetches history for all symbols using one upstream request per batch.
+
+        :param symbols: Iterable of ticker symbols.
+        :param period: yfinance period string, e.g. "2d".
+        :param start: Optional "YYYY-MM-DD" first day to fetch; takes precedence over period.
+        :return: Dict mapping each symbol to its DataFrame. When a whole batch fails the
+                 symbols of that batch map to the raised exception instead.
+        """
+        batches = self.batches(symbols)
+        if start:
+            download = lambda batch: self.source.download(batch, start=start)
+        else:
+            download = lambda batch: self.source.download(batch, period=period)
+        if self.executor is not None:
+            # Batches are independent requests, so run them side by side with their own deadline
+            frames = self.executor.map(download, batches, lambda batch, e: e)
+        else:
+            frames = []
+            for batch in batches:
+                try:
+                    frames.append(download(batch))
+                except Exception as e:
+                    frames.append(e)
+
+        histories = {}
+        for batch, frame in zip(batches, frames):
+            if isinstance(frame, Exception):
+                histories.update({symbol: frame for symbol in batch})
+            else:
+                histories.update(self.split_frame(frame, batch))
+        return histories
+
+    @staticmethod
+    def split_frame(frame, symbols):
+        """Splits a bulk download frame into one DataFrame per symbol."""
+        empty = pd.DataFrame(columns=['Close'])
+        if frame is None or frame.empty:
+            return {symbol: empty for symbol in symbols}
+
+        histories = {}
+        if isinstance(frame.columns, pd.MultiIndex):
+            tickers = set(frame.columns.get_level_values(0))
+            for symbol in symbols:
+                histories[symbol] = BatchFetcher._clean(frame[symbol]) if symbol in tickers else empty
+        else:
+            # A flat frame only happens for single-symbol downloads
+            for symbol in symbols:
+                histories[symbol] = BatchFetcher._clean(frame) if len(symbols) == 1 else empty
+        return histories
+
+    @staticmethod
+    def _clean(frame):
+        # Symbols from different exchanges share one date index, so drop the days this one did not trade
+        if 'Close' in frame.columns:
+            return frame.dropna(subset=['Close'])
+        return frame.dropna(how='all')
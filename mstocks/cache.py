@@ -0,0 +1,141 @@
+import threading
+import time
+
+
+class _Flight:
+    # One in-progress load that concurrent callers for the same key wait on
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class TTLCache:
+    """
+    Thread-safe key/value cache with a time-to-live, single-flight loading and a stale fallback.
+
+    With max_entries set, storing a new key beyond the cap first drops entries too old to be served
+    even as stale, then the oldest stored ones.
+    """
+
+    def __init__(self, ttl, max_stale=None, clock=time.monotonic, max_entries=None):
+        """
+        :param ttl: Seconds a stored value is considered fresh.
+        :param max_stale: Seconds past the ttl a value may still be served when a reload fails.
+                          None means stale values are served for as long as the upstream is failing.
+        :param clock: Monotonic time source, overridable in tests.
+        :param max_entries: Most keys kept at once, None for no limit.
+        """
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.clock = clock
+        self.max_entries = max_entries
+        self._entries = {}
+        self._inflight = {}
+        self._lock = threading.Lock()
+        # get_or_load outcomes, for metrics: served fresh, loaded (or joined a load), served stale
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+
+    def get(self, key, default=None):
+        """Return the fresh value for key, or default when it is missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None or self.clock() - entry[1] > self.ttl:
+            return default
+        return entry[0]
+
+    def get_stale(self, key, default=None):
+        """Return the value for key even when expired, as long as it is within max_stale."""
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None or not self._within_stale(entry):
+            return default
+        return entry[0]
+
+    def age(self, key):
+        """Return how many seconds ago key was stored, or None when it is not cached."""
+        with self._lock:
+            entry = self._entries.get(key)
+        return None if entry is None else self.clock() - entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._store(key, value)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def invalidate(self, key=None):
+        """Drop one key, or everything when key is None."""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def get_or_load(self, key, loader):
+        """
+        Return the cached value for key, calling loader() when it is missing or expired.
+
+        Concurrent callers asking for the same key while a load is running wait for that load
+        instead of starting their own. When loader() raises and an older value is still within
+        max_stale, that value is returned instead of the error.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.clock() - entry[1] <= self.ttl:
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            value = loader()
+        except Exception as e:
+            with self._lock:
+                self._inflight.pop(key, None)
+            if entry is not None and self._within_stale(entry):
+                flight.value = entry[0]
+                with self._lock:
+                    self.stale_hits += 1
+            else:
+                flight.error = e
+            flight.event.set()
+            if flight.error is not None:
+                raise
+            return flight.value
+
+        with self._lock:
+            self._store(key, value)
+            self._inflight.pop(key, None)
+        flight.value = value
+        flight.event.set()
+        return value
+
+    def _store(self, key, value):
+        # Called with the lock held. Re-inserting keeps the entries ordered from oldest to newest write
+        self._entries.pop(key, None)
+        self._entries[key] = (value, self.clock())
+        if self.max_entries is None or len(self._entries) <= self.max_entries:
+            return
+        for old_key in [old_key for old_key, entry in self._entries.items() if not self._within_stale(entry)]:
+            del self._entries[old_key]
+        while len(self._entries) > self.max_entries:
+            del self._entries[next(iter(self._entries))]
+
+    def _within_stale(self, entry):
+        if self.max_stale is None:
+            return True
+        return self.clock() - entry[1] <= self.ttl + self.max_stale
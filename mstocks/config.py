@@ -1,9 +1,47 @@
 import json
+import math
+import os
+import threading
+
+_MISSING = object()
+
 
 class Config:
+    """
+    The parsed config.json, read once and replaced by a new snapshot when the file changes.
+
+    reload() compares the file's modification time and size with the last read and only parses it
+    again when they differ. A file that does not parse or validate leaves the current snapshot in
+    place. Otherwise the new snapshot is swapped in with a single assignment, so readers see either
+    the old or the new one, never a mix. Values that did not change keep the objects of the old
+    snapshot, so caches keyed on them, e.g. the portfolio arrays, stay valid. Listeners then get
+    the set of changed keys.
+    """
+
+    # Keys that must have a specific type when present
+    TYPES = {
+        'default_stocks': list,
+        'default_cryptos': list,
+        'currency_map': dict,
+        'investments': dict,
+        'refresh_intervals': dict,
+        'market_holidays': dict,
+    }
+
+    # Numeric fields of an investment lot
+    LOT_FIELDS = ('buy_price', 'quantity', 'fee')
+
     def __init__(self, filename='data/config.json'):
         self.filename = filename
+        self._stamp = self._file_stamp()
         self.config_data = self.load_config()
+        self._overrides = {}
+        self.version = 0
+        self.last_error = None
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._watcher = None
+        self._stop = threading.Event()
 
     def load_config(self):
         """Load configuration from the config.json file."""
@@ -13,3 +51,111 @@ class Config:
     def get(self, key, default=None):
         """Get a value from the configuration data."""
         return self.config_data.get(key, default)
+
+    def override(self, values):
+        """Replace the values of keys in this process, and keep them over the file's values on every reload."""
+        with self._lock:
+            self._overrides = dict(self._overrides, **values)
+            self.config_data = dict(self.config_data, **self._overrides)
+
+    def add_listener(self, listener):
+        """Call listener(changed_keys) after every reload that changed something."""
+        self._listeners.append(listener)
+
+    @classmethod
+    def validate(cls, data):
+        """Raise ValueError when data is not a usable configuration."""
+        if not isinstance(data, dict):
+            raise ValueError("The configuration must be a json object")
+        for key, expected in cls.TYPES.items():
+            if key in data and not isinstance(data[key], expected):
+                raise ValueError(f"'{key}' must be a json {'array' if expected is list else 'object'}")
+        for key in ('default_stocks', 'default_cryptos'):
+            if not all(isinstance(symbol, str) for symbol in data.get(key, [])):
+                raise ValueError(f"'{key}' must only hold symbol strings")
+        for kind, section in data.get('investments', {}).items():
+            if kind in ("stocks", "cryptos"):
+                if not isinstance(section, dict):
+                    raise ValueError(f"'investments.{kind}' must be a json object")
+                for symbol, lots in section.items():
+                    cls.validate_lots(f"investments.{kind}.{symbol}", lots)
+            else:
+                # Lots listed directly under investments by symbol, the older layout
+                cls.validate_lots(f"investments.{kind}", section)
+
+    @classmethod
+    def validate_lots(cls, path, lots):
+        """Raise ValueError unless lots is a list of lots with non-negative numeric fields."""
+        if not isinstance(lots, list):
+            raise ValueError(f"'{path}' must be a json array of lots")
+        for index, lot in enumerate(lots):
+            if not isinstance(lot, dict):
+                raise ValueError(f"'{path}[{index}]' must be a json object")
+            for field in cls.LOT_FIELDS:
+                value = lot.get(field, 0)
+                # bool is an int in Python, but true is no quantity
+                if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value) or value < 0:
+                    raise ValueError(f"'{path}[{index}].{field}' must be a non-negative number")
+
+    def reload(self, force=False):
+        """
+        Read the file again when it changed since the last read, or always with force.
+
+        :return: The set of top-level keys whose values changed; empty when nothing changed or
+                 the new file was rejected, in which case last_error tells why.
+        """
+        with self._lock:
+            stamp = self._file_stamp()
+            if not force and stamp == self._stamp:
+                return set()
+            self._stamp = stamp
+            try:
+                data = self.load_config()
+                self.validate(data)
+            except (OSError, ValueError) as e:
+                self.last_error = e
+                return set()
+            self.last_error = None
+            data = dict(data, **self._overrides)
+
+            old = self.config_data
+            changed = {key for key in old.keys() | data.keys() if old.get(key, _MISSING) != data.get(key, _MISSING)}
+            if not changed:
+                return set()
+            self.config_data = {key: value if key in changed else old[key] for key, value in data.items()}
+            self.version += 1
+            listeners = list(self._listeners)
+
+        for listener in listeners:
+            try:
+                listener(changed)
+            except Exception:
+                # One failing listener must not keep the others on the old configuration
+                pass
+        return changed
+
+    def watch(self, interval=2.0):
+        """Check the file for changes every interval seconds on a background thread."""
+        if self._watcher is not None or not interval or interval <= 0:
+            return
+        self._stop.clear()
+
+        def run():
+            while not self._stop.wait(interval):
+                self.reload()
+
+        self._watcher = threading.Thread(target=run, name="mstocks-config-watch", daemon=True)
+        self._watcher.start()
+
+    def stop_watching(self):
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
+
+    def _file_stamp(self):
+        try:
+            stat = os.stat(self.filename)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
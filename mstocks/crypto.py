@@ -1,143 +1,204 @@
-import yfinance as yf
 import time
-from datetime import datetime
 from .market import Market
 from .config import Config
 from .utils import Utils
-import requests
+from .fx import FxRateProvider, FxRateError
+from .executor import FetchExecutor
+from .batch import BatchFetcher
+from .providers import YFinanceProvider
+from .upstream import Upstream, CircuitOpenError
+from .history import HistoryStore
+from .models import Quote
+from .metrics import Metrics
+from .sharding import ShardPool
+from .portfolio import Portfolio
+from .suffix import SuffixResolver
 
 
 class CryptoManager:
-    def __init__(self, config):
+    def __init__(self, config, fx_provider=None, executor=None, fetcher=None, history=None, upstream=None,
+                 provider=None, metrics=None, shards=None):
         self.config = config
+        # Latency of every stage and the failing symbols, served on /metrics
+        self.metrics = metrics or Metrics.shared()
         self.utils = Utils()
         self.market = Market(self.utils)
-        self.currency_map = config.get('currency_map', {"": "USD"})
         crypto_str = self.config.get('crypto', 'False')  # Default to 'False' if not found
         self.crypto_enabled = True if crypto_str == "True" else False
+        self.target_currency = config.get('crypto_currency', 'PLN')
+        fx_ttl = Utils.as_float(config.get('fx_ttl', 3600), 3600)
+        # Rates come from the given provider, or from the provider shared by every manager with the same fx_ttl
+        self.fx = fx_provider or (FxRateProvider(ttl=fx_ttl, source=provider) if provider else FxRateProvider.shared(ttl=fx_ttl))
+        self.executor = executor or FetchExecutor(max_workers=Utils.as_int(config.get('fetch_workers', 8), 8),
+                                                  timeout=Utils.as_float(config.get('fetch_timeout', 10), 10))
+        # Every yfinance call of every manager shares one rate limit and circuit breaker
+        self.upstream = upstream or Upstream.from_config(config)
+        # Live Yahoo Finance unless another QuoteProvider, e.g. a ReplayProvider, is given
+        self.provider = provider or YFinanceProvider(self.upstream, metrics=self.metrics)
+        self.fetcher = fetcher or BatchFetcher(self.provider,
+                                               batch_size=Utils.as_int(config.get('batch_size', 100), 100),
+                                               executor=self.executor)
+        history_path = config.get('history_store', None)
+        self.history = history or HistoryStore(self.fetcher, path=history_path if isinstance(history_path, str) else None)
+        self._portfolio = None
+        self._portfolio_investments = None
+        self._currency_resolver = None
+        self._currency_resolver_map = None
+        # With refresh_processes > 1 the symbols are fetched by a pool of worker processes
+        processes = Utils.as_int(config.get('refresh_processes', 1), 1)
+        self.shards = shards or (ShardPool("crypto", config, processes, metrics=self.metrics) if processes > 1 else None)
 
     def get_crypto_prices(self, symbols):
-        prices = []
-        for symbol in symbols.split(';'):
-            symbol = symbol.strip()
-            crypto = yf.Ticker(symbol)
-            hist = crypto.history(period="2d")  # Fetches the last 2 days data
-            try:
-                if len(hist) > 1:
-                    last_close = hist['Close'].iloc[-1]
-                    prev_close = hist['Close'].iloc[-2]
-                    price_change = last_close - prev_close
-                    percent_change = (price_change / prev_close) * 100
-                    # Determine the price direction
-                    trend = Utils._format_value(price_change, "PLN", percent_change)
-                else:
-                    last_close = hist['Close'].iloc[-1] if len(hist) == 1 else 0
-                    trend = "—"
-
-                # Convert USD price to PLN
-                pln_price = self.convert_to_pln(last_close)
-                earnings, invested, percent_earned, buy_price, quantity = self.calculate_earnings(symbol, pln_price if isinstance(pln_price, float) else 0)
-                earnings_str = Utils._format_value(earnings, "PLN", percent_earned) if earnings is not None else "—"
-                invested_str = f"{invested:.2f} PLN" if invested is not None else "—"                
-
-                formatted_price = f"{pln_price:,.4f} PLN".replace(",", " ") if isinstance(pln_price, float) else pln_price
-                prices.append([f"[{symbol}]", "Crypto", formatted_price, trend, invested_str, earnings_str])
-            except IndexError:
-                current_time = datetime.now().strftime('%H:%M:%S')
-                prices.append(["Error", f"[{symbol}]", "N/A", "Not found", current_time, "—"])
-        return prices
-    
+        quotes = self.fetch_quotes(symbols)
+        with self.metrics.timer("format", [quote.symbol for quote in quotes]):
+            return [self.quote_row(quote) for quote in quotes]
+
     # Thisn method fetches the stock prices for the given symbols
     # it returns a list of lists containing the stock prices in array format
     def get_crypto_prices_json(self, symbols):
-        prices = []
-        for symbol in symbols.split(';'):
-            symbol = symbol.strip()
-            try:
-                crypto = yf.Ticker(symbol)
-                hist = crypto.history(period="2d")
-                currency = self.utils.get_currency(symbol, self.currency_map)
-                if len(hist) > 1:
-                    last_close = hist['Close'].iloc[-1]
-                    prev_close = hist['Close'].iloc[-2]
-                    price_change = last_close - prev_close
-                    percent_change = (price_change / prev_close) * 100
-                    # Determine the price direction
-                    trend = {
-                        "price_change": price_change,
-                        "percent_change": percent_change
-                    }
-                else:
-                    last_close = hist['Close'].iloc[-1] if len(hist) == 1 else 0
-                    trend = "—"
-
-                pln_price = self.convert_to_pln(last_close)
-                earnings, invested, percent_earned, buy_price, quantity = self.calculate_earnings(symbol, pln_price if isinstance(pln_price, float) else 0)
-                
-                earnings_info = {
-                    "earnings": earnings,
-                    "percent_earned": percent_earned
-                } if earnings is not None else "—"
-                invested_info = {
-                    "invested": f"{invested:.2f}",
-                    "quantity": f"{quantity:.2f}",
-                    "average_buy_price": f"{buy_price:.2f}"
-                } if invested is not None else "—"
-
-                formatted_price = f"{last_close:.2f} {currency}" if isinstance(last_close, float) else last_close
-
-                prices.append({
-                    "symbol": symbol,
-                    "last_close_price": formatted_price,
-                    "trend": trend,
-                    "invested": invested_info,
-                    "earnings": earnings_info
-                })
-            except ValueError as e:
-                # Handling the case where the symbol is invalid or data could not be fetched.
-                prices.append(["Error", f"[{symbol}]", "N/A", "Invalid Symbol or Data Not Found", "—", "—", "—"])
-            except Exception as e:
-                # General error handling, could be network error, etc.
-                prices.append(["Error", f"[{symbol}]", "N/A", "Error Fetching Data", "—", "—", "—"])
-                
-        return prices
+        quotes = self.fetch_quotes(symbols)
+        with self.metrics.timer("format", [quote.symbol for quote in quotes]):
+            return [self.quote_json(quote) for quote in quotes]
+
+    # This method fetches the given symbols once and returns their quotes,
+    # which is what the background refresher keeps in its snapshot
+    def fetch_quotes(self, symbols):
+        symbol_list = [symbol.strip() for symbol in symbols.split(';')]
+        if self.shards is not None:
+            # Downloads, pandas work and conversions run in the worker processes, the valuation here
+            return self.value_quotes(self.shards.fetch(symbol_list))
+        histories = self.history.histories(symbol_list)  # Last 2 days, only the new bars are downloaded
+        return self.quotes(symbol_list, histories)
+
+    def json_rows(self, symbol_list, histories):
+        # Same as get_crypto_prices_json for histories that were already downloaded
+        quotes = self.quotes(symbol_list, histories)
+        with self.metrics.timer("format", [quote.symbol for quote in quotes]):
+            return [self.quote_json(quote) for quote in quotes]
+
+    def quotes(self, symbol_list, histories):
+        return self.value_quotes(self.price_quotes(symbol_list, histories))
+
+    # Quotes with converted prices but no positions yet, which is what a shard worker returns
+    def price_quotes(self, symbol_list, histories):
+        return self.executor.map(lambda symbol: self._quote(symbol, HistoryStore.history_for(histories, symbol)),
+                                 symbol_list, lambda symbol, error: Quote.failed(symbol, error, time.time()))
+
+    def value_quotes(self, quotes):
+        # Positions are in the display currency, valued in one pass over the whole portfolio
+        with self.metrics.timer("earnings", [quote.symbol for quote in quotes]):
+            positions = self.portfolio.positions({quote.symbol: quote.converted_price for quote in quotes if not quote.error})
+        for quote in quotes:
+            quote.position = positions.get(quote.symbol)
+            if quote.error:
+                self.metrics.count_error("crypto", quote.symbol, quote.error)
+        return quotes
+
+    def _quote(self, symbol, hist):
+        closes = hist['Close']
+        price = float(closes.iloc[-1]) if len(closes) > 0 else None
+        previous_close = float(closes.iloc[-2]) if len(closes) > 1 else None
+
+        # Convert USD price to the display currency
+        converted_price = self.convert_price(price) if price is not None else None
+        converted_price = converted_price if isinstance(converted_price, float) else None
+        return Quote(symbol, self.currency_resolver.resolve(symbol), price, previous_close,
+                     converted_price=converted_price, converted_currency=self.target_currency, fetched_at=time.time())
+
+    # Console row of a quote
+    def quote_row(self, quote):
+        if quote.error:
+            # Row for a symbol whose fetch failed or ran past its deadline, so the rest of the table still renders
+            return [f"[{quote.symbol}]", "Error", quote.error_message, "—", "—", "—"]
+
+        currency, position = quote.converted_currency, quote.position
+        change = quote.change
+        price_known = quote.converted_price is not None
+        trend = Utils.value_cell(change, currency, quote.percent_change) if change is not None else "—"
+        earnings_str = Utils.value_cell(position.earnings, currency, position.percent) if position.earnings is not None else "—"
+        invested_str = f"{position.invested:.2f} {currency}"
+
+        formatted_price = f"{quote.converted_price:,.4f} {currency}".replace(",", " ") if price_known else "N/A"
+        return [f"[{quote.symbol}]", "Crypto", formatted_price, trend, invested_str, earnings_str]
+
+    # Json row of a quote, as served by the API; failed fetches are error lists like the console rows
+    @staticmethod
+    def quote_json(quote):
+        if quote.error:
+            return ["Error", f"[{quote.symbol}]", "N/A", quote.error_message, "—", "—", "—"]
+
+        position = quote.position
+        change = quote.change
+        trend = {
+            "price_change": change,
+            "percent_change": quote.percent_change
+        } if change is not None else "—"
+        earnings_info = {
+            "earnings": position.earnings,
+            "percent_earned": position.percent
+        } if position is not None and position.earnings is not None else "—"
+        invested_info = {
+            "invested": f"{position.invested:.2f}",
+            "quantity": f"{position.quantity:.2f}",
+            "average_buy_price": f"{position.average_price:.2f}"
+        } if position is not None else "—"
+
+        # The price in the symbol's own currency; positions are in the display currency
+        formatted_price = f"{quote.price:.2f} {quote.currency}" if quote.price is not None else 0
+
+        return {
+            "symbol": quote.symbol,
+            "last_close_price": formatted_price,
+            "trend": trend,
+            "invested": invested_info,
+            "earnings": earnings_info
+        }
 
     def convert_to_pln(self, usd_price):
-        # Use an API or library to get the exchange rate from USD to PLN
-        response = requests.get("https://api.exchangerate-api.com/v4/latest/USD")
-        exchange_rates = response.json().get('rates')
-        pln_rate = exchange_rates.get('PLN')
-        pln_price = usd_price * pln_rate
-        return pln_price
+        return self.convert_price(usd_price, "PLN")
+
+    def convert_price(self, usd_price, target_currency=None):
+        # Rates come from the shared provider, so a whole refresh costs at most one FX request
+        try:
+            return float(self.fx.convert(usd_price, "USD", target_currency or self.target_currency))
+        except FxRateError:
+            return "N/A"
     
+    @property
+    def currency_map(self):
+        # Read on every use, so a reloaded config applies to the next refresh
+        return self.config.get('currency_map', {"": "USD"})
+
+    @property
+    def currency_resolver(self):
+        # Compiled once per currency_map object, like the portfolio
+        currency_map = self.currency_map
+        if self._currency_resolver is None or self._currency_resolver_map is not currency_map:
+            self._currency_resolver = SuffixResolver(currency_map if isinstance(currency_map, dict) else {},
+                                                     default="USD")
+            self._currency_resolver_map = currency_map
+        return self._currency_resolver
+
+    @property
+    def portfolio(self):
+        # Lots are parsed once per investments object; a config reload only replaces it when the lots changed
+        investments = self.config.get('investments', {})
+        if self._portfolio is None or self._portfolio_investments is not investments:
+            self._portfolio = Portfolio.from_config(self.config, "cryptos")
+            self._portfolio_investments = investments
+        return self._portfolio
+
+    def close(self):
+        # Stops the shard worker processes, if any
+        if self.shards is not None:
+            self.shards.close()
+
     def calculate_earnings(self, symbol, current_price):
-        earnings = 0
-        invested = 0
-        buy_price = 0
-        percentage = 0
-        amount = 0
-        fee = 0
-        investments = self.config.get('investments', {}).get("cryptos", {})
-
-        if symbol in investments:
-            for investment in  investments[symbol]:
-                buy_price = investment.get('buy_price', 0)
-                quantity = investment.get('quantity', 1)
-                fee = investment.get('fee', 0)
-
-                invested += (buy_price * quantity) + fee
-                earnings += (current_price - buy_price) * quantity
-                amount += quantity
-
-        avg_price = invested / amount if amount > 0 else 0
-
-        if invested:
-            percentage = (earnings / invested) * 100
-        return earnings, invested, percentage, avg_price, amount
-    
-    def _display_crypto_prices(self, symbols, now):
-        crypto_prices = self.get_crypto_prices(";".join(symbols))
-        if symbols:
+        with self.metrics.timer("earnings", (symbol,)):
+            return self.portfolio.position(symbol, current_price)
+
+    def _display_crypto_prices(self, crypto_prices, now):
+        if crypto_prices:
             print("\n" + "-" * 50 + "\n")
         print("Cryptocurrency Prices as of " + now)
         self.utils.print_table_with_fixed_width(crypto_prices, False)
\ No newline at end of file
@@ -1,36 +1,337 @@
+import threading
 from mstocks.config import Config
 from mstocks.stocks import StocksManager
 from mstocks.crypto import CryptoManager
-from flask import Flask, jsonify
+from mstocks.cache import TTLCache
+from mstocks.refresher import QuoteRefresher
+from mstocks.stream import QuoteStream
+from mstocks.utils import Utils
+from mstocks.metrics import Metrics
+from mstocks.metadata import MetadataCache
+from mstocks.upstream import Upstream
+from mstocks.shared_snapshot import SnapshotReader
+from flask import Flask, Response, jsonify
 
 app = Flask(__name__)
 
+
+class ApiServices:
+    """
+    Managers, background refresher and response cache shared by every API request.
+
+    The default watchlists are kept fresh by a QuoteRefresher and served straight from its snapshot.
+    Other symbol sets are fetched on demand and cached per asset class and normalized symbol set for
+    refresh_rate seconds; concurrent requests for the same set wait for one upstream fetch. Requests
+    made before the first snapshot wait for it up to fetch_timeout seconds, then are fetched on demand.
+    After a restart the snapshot saved by the last run, if any, is served marked stale until the first
+    refresh.
+    """
+
+    def __init__(self, config, stocks_manager=None, crypto_manager=None, refresher=None, metrics=None):
+        self.config = config
+        self.metrics = metrics or Metrics.shared()
+        self.stocks_manager = stocks_manager or StocksManager(config, metrics=self.metrics)
+        self.crypto_manager = crypto_manager or CryptoManager(config, metrics=self.metrics)
+        self.responses = TTLCache(Utils.as_float(config.get('refresh_rate', 60), 60),
+                                  max_entries=Utils.as_int(config.get('response_cache_size', 1000), 1000))
+        if refresher is None:
+            refresher = QuoteRefresher(config, self.stocks_manager, self.crypto_manager,
+                                       config.get('default_stocks', []), config.get('default_cryptos', []),
+                                       metrics=self.metrics)
+            refresher.start()
+        self.refresher = refresher
+        self.ready_timeout = Utils.as_float(config.get('fetch_timeout', 10), 10)
+        # Streaming clients get the changes of every refresh of the watched symbols
+        self.stream = QuoteStream()
+        refresher.add_listener(self._publish)
+        for kind in ("stocks", "crypto"):
+            snapshot = refresher.snapshot(kind)
+            if snapshot is not None:
+                self._publish(kind, snapshot)
+        if isinstance(config, Config):
+            config.add_listener(self._config_changed)
+
+    def _config_changed(self, changed):
+        # Called after config.json was reloaded, with the keys whose values changed
+        if 'default_stocks' in changed:
+            self.refresher.set_symbols("stocks", self.config.get('default_stocks', []))
+        if 'default_cryptos' in changed:
+            self.refresher.set_symbols("crypto", self.config.get('default_cryptos', []))
+        if changed & {'investments', 'currency_map'}:
+            # Cached responses hold positions valued with the old lots
+            self.responses.invalidate()
+            self.refresher.wake(force=True)
+
+    @staticmethod
+    def normalize_symbols(symbols):
+        # Order and duplicates do not change what has to be fetched, so they share one cache entry
+        return tuple(sorted(set(symbol.strip() for symbol in symbols if symbol.strip())))
+
+    def stock_prices(self, symbols):
+        """Return (json rows, age in seconds, stale) for the requested stock symbols."""
+        return self._prices("stocks", symbols, self.stocks_manager.get_stock_prices_json)
+
+    def crypto_prices(self, symbols):
+        """Return (json rows, age in seconds, stale) for the requested crypto symbols."""
+        return self._prices("crypto", symbols, self.crypto_manager.get_crypto_prices_json)
+
+    def _prices(self, kind, symbols, fetch):
+        key = self.normalize_symbols(symbols)
+        snapshot = None
+        if key and self.refresher.tracks(kind, key):
+            # A failing upstream may never produce a first snapshot, so the wait is bounded
+            snapshot = self.refresher.snapshot(kind) or self.refresher.wait_ready(kind, self.ready_timeout)
+        if snapshot is not None:
+            by_symbol, age, stale = snapshot.by_symbol, snapshot.age, snapshot.stale
+        else:
+            by_symbol, age, stale = self._fetch_prices(kind, key, fetch)
+        # Answer in the order the client asked for
+        return [by_symbol[symbol.strip()] for symbol in symbols if symbol.strip()], age, stale
+
+    def _fetch_prices(self, kind, key, fetch):
+        # Symbols the refresher does not track, fetched on demand and cached per symbol set
+        if not key:
+            # Only blank symbols, e.g. an empty watchlist: nothing to ask upstream for
+            return {}, 0.0, False
+        by_symbol = self.responses.get_or_load((kind, key), lambda: dict(zip(key, fetch(";".join(key)))))
+        return by_symbol, self.responses.age((kind, key)) or 0.0, False
+
+    def _publish(self, kind, snapshot):
+        self.stream.publish(kind, snapshot.by_symbol)
+
+    def stream_symbols(self, kind, symbols=None):
+        """
+        Return the symbols a streaming client of kind asked for, all tracked ones when None.
+        Only the symbols the refresher tracks get updates, so any other symbol raises KeyError.
+        """
+        tracked = self.refresher.jobs[kind].symbols
+        if symbols is None:
+            return list(tracked)
+        symbols = [symbol.strip() for symbol in symbols if symbol.strip()]
+        untracked = [symbol for symbol in symbols if symbol not in tracked]
+        if untracked:
+            raise KeyError(", ".join(untracked))
+        return symbols
+
+    def metrics_text(self):
+        """
+        Return the Prometheus text served on /metrics: the stage histograms and call and error counters,
+        plus the upstream limiter and breaker, cache hit counts and refresher state at this moment.
+        """
+        managers = {"stocks": self.stocks_manager, "crypto": self.crypto_manager}
+        gauges = []
+
+        # Managers built from the same config share one Upstream, which is reported once
+        upstreams = {}
+        for kind, manager in managers.items():
+            upstream = getattr(manager, 'upstream', None)
+            if isinstance(upstream, Upstream):
+                upstreams.setdefault(id(upstream), (upstream, []))[1].append(kind)
+        states = [({"managers": ",".join(kinds)}, upstream.state()) for upstream, kinds in upstreams.values()]
+        for name, metric_type, key, help_text in (
+                ("upstream_limiter_tokens", "gauge", "limiter_tokens", "Calls the rate limiter allows right now."),
+                ("upstream_limiter_wait_seconds_total", "counter", "limiter_wait_seconds", "Time calls waited for the rate limiter."),
+                ("upstream_attempts_total", "counter", "calls", "Upstream attempts, retries included."),
+                ("upstream_retries_total", "counter", "retries", "Attempts that were retried after a failure."),
+                ("upstream_failures_total", "counter", "failures", "Calls that failed after their retries."),
+                ("upstream_rejected_total", "counter", "rejected", "Calls rejected while the circuit breaker was open."),
+                ("upstream_breaker_trips_total", "counter", "breaker_trips", "Times the circuit breaker opened.")):
+            gauges.append((name, metric_type, help_text, [(labels, state[key]) for labels, state in states]))
+        gauges.append(("upstream_breaker_open", "gauge", "1 while the circuit breaker rejects calls.",
+                       [(labels, state["breaker_state"] != "closed") for labels, state in states]))
+
+        caches = [("responses", self.responses)]
+        fx = getattr(self.crypto_manager, 'fx', None)
+        if isinstance(getattr(fx, 'cache', None), TTLCache):
+            caches.append(("fx", fx.cache))
+        metadata = getattr(self.stocks_manager, 'metadata', None)
+        if isinstance(metadata, MetadataCache):
+            caches.append(("metadata", metadata))
+        gauges.append(("cache_hits_total", "counter", "Lookups answered from a cache.",
+                       [({"cache": name}, cache.hits) for name, cache in caches]))
+        gauges.append(("cache_misses_total", "counter", "Lookups that had to load the value.",
+                       [({"cache": name}, cache.misses) for name, cache in caches]))
+
+        snapshots = [(kind, self.refresher.snapshot(kind)) for kind in self.refresher.jobs]
+        gauges.append(("snapshot_age_seconds", "gauge", "Seconds since the served snapshot was refreshed.",
+                       [({"kind": kind}, snapshot.age) for kind, snapshot in snapshots if snapshot is not None]))
+        gauges.append(("refresh_last_duration_seconds", "gauge", "Duration of the latest refresh that fetched quotes.",
+                       [({"kind": kind}, job.last_duration) for kind, job in self.refresher.jobs.items()
+                        if job.last_duration is not None]))
+        gauges.append(("refresh_failing", "gauge", "1 while the latest refresh of the asset class failed.",
+                       [({"kind": kind}, job.last_error is not None) for kind, job in self.refresher.jobs.items()]))
+        return self.metrics.render(gauges)
+
+    def close(self):
+        self.refresher.stop(timeout=0)
+        for manager in (self.stocks_manager, self.crypto_manager):
+            if isinstance(manager, (StocksManager, CryptoManager)):
+                manager.close()
+
+
+class SharedApiServices(ApiServices):
+    """
+    ApiServices of a pre-forked API worker, reading the snapshots the refresher process publishes to a SharedSnapshot.
+
+    The watchlists are answered with the json bytes of the shared mapping as they are, so a worker
+    neither fetches, formats nor encodes them, and holds no copy of them. Only symbols the refresher
+    does not track are fetched on demand, by the worker's own managers. Rows are decoded only in a
+    worker with streaming clients, and /metrics serves what the refresher process published.
+    """
+
+    def __init__(self, config, shared, stocks_manager=None, crypto_manager=None, metrics=None, poll_interval=0.5):
+        """
+        :param shared: SharedSnapshot the refresher process publishes to.
+        :param poll_interval: Seconds between checks for a new snapshot, for streaming clients.
+        """
+        self.shared = shared
+        reader = SnapshotReader(shared, config, poll_interval)
+        super().__init__(config, stocks_manager, crypto_manager, refresher=reader, metrics=metrics)
+        reader.start()
+
+    def _prices(self, kind, symbols, fetch):
+        key = self.normalize_symbols(symbols)
+        if key and self.refresher.tracks(kind, key):
+            section = self.refresher.snapshot(kind) or self.refresher.wait_ready(kind, self.ready_timeout)
+            if section is not None:
+                try:
+                    return section.encoded([symbol.strip() for symbol in symbols if symbol.strip()]), section.age, section.stale
+                except KeyError:
+                    # The watchlist changed between the check and the read
+                    pass
+        by_symbol, age, stale = self._fetch_prices(kind, key, fetch)
+        return [by_symbol[symbol.strip()] for symbol in symbols if symbol.strip()], age, stale
+
+    def _publish(self, kind, snapshot):
+        if self.stream.subscriber_count(kind):
+            super()._publish(kind, snapshot)
+
+    def stream_symbols(self, kind, symbols=None):
+        symbols = super().stream_symbols(kind, symbols)
+        section = self.refresher.snapshot(kind)
+        if section is not None and not self.stream.subscriber_count(kind):
+            # Nothing was published while no client listened, so the first one starts from the latest rows
+            self.stream.publish(kind, section.by_symbol)
+        return symbols
+
+    def metrics_text(self):
+        view = self.shared.view()
+        return view.metrics() if view is not None else self.metrics.render()
+
+
+_services = None
+_services_lock = threading.Lock()
+
+
+def init_services(config=None):
+    """Build the shared managers once, at startup. Called again it replaces them."""
+    global _services
+    with _services_lock:
+        if _services is not None:
+            _services.close()
+        config = config or Config()
+        _services = ApiServices(config)
+        if isinstance(config, Config):
+            config.watch(Utils.as_float(config.get('config_watch_interval', 2), 2))
+        return _services
+
+
+def get_services():
+    global _services
+    with _services_lock:
+        if _services is None:
+            _services = ApiServices(Config())
+        return _services
+
+
+def _json_with_age(prices, age, stale=False):
+    # The body keeps its original shape; freshness travels in headers
+    if isinstance(prices, bytes):
+        # Already encoded, e.g. by the refresher process of the pre-forked server
+        response = Response(prices, mimetype='application/json')
+    else:
+        response = jsonify(prices)
+    response.headers['X-Data-Age'] = f"{age:.1f}"
+    if stale:
+        # Restored from the last run and not refreshed yet
+        response.headers['X-Data-Stale'] = "true"
+    return response
+
+
+# Seconds between keep-alive comments on an idle event stream
+STREAM_KEEPALIVE = 15
+
+
+def _event_stream(kind, symbols):
+    services = get_services()
+    try:
+        symbols = services.stream_symbols(kind, symbols)
+    except KeyError as e:
+        response = jsonify({"error": f"Not streamed, only tracked symbols are: {e.args[0]}"})
+        response.status_code = 404
+        return response
+
+    ready = threading.Event()
+    subscription = services.stream.subscribe(kind, symbols, ready.set)
+
+    def events():
+        try:
+            # The current rows first, then only the rows that changed
+            payload = services.stream.current(kind, symbols)
+            while True:
+                if payload is not None:
+                    yield f"event: quotes\ndata: {payload}\n\n"
+                elif not ready.is_set():
+                    # Comment line, so proxies and clients see the connection is alive
+                    yield ": keep-alive\n\n"
+                ready.wait(STREAM_KEEPALIVE)
+                ready.clear()
+                payload = subscription.take()
+        finally:
+            subscription.close()
+
+    return Response(events(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@app.route('/api/stream/stocks', methods=['GET'])
+def api_stream_stocks():
+    return _event_stream("stocks", None)
+
+@app.route('/api/stream/stocks/<symbols>', methods=['GET'])
+def api_stream_stocks_by_symbols(symbols):
+    return _event_stream("stocks", symbols.split(';'))
+
+@app.route('/api/stream/crypto', methods=['GET'])
+def api_stream_crypto():
+    return _event_stream("crypto", None)
+
+@app.route('/api/stream/crypto/<symbols>', methods=['GET'])
+def api_stream_crypto_by_symbols(symbols):
+    return _event_stream("crypto", symbols.split(';'))
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(get_services().metrics_text(), mimetype='text/plain; version=0.0.4')
+
+
 @app.route('/api/stocks', methods=['GET'])
 def api_get_stocks():
-    config = Config()
-    manager = StocksManager(config)
-    stock_symbols = config.get('default_stocks', [])
-    stock_prices = manager.get_stock_prices_json(";".join(stock_symbols))
-    return jsonify(stock_prices)
+    services = get_services()
+    stock_symbols = services.config.get('default_stocks', [])
+    return _json_with_age(*services.stock_prices(stock_symbols))
 
 @app.route('/api/stocks/<symbols>', methods=['GET'])
 def api_get_stocks_by_symbols(symbols):
-    config = Config()
-    manager = StocksManager(config)
-    stock_prices = manager.get_stock_prices_json(symbols)
-    return jsonify(stock_prices)
+    return _json_with_age(*get_services().stock_prices(symbols.split(';')))
 
 @app.route('/api/crypto', methods=['GET'])
 def api_get_crypto():
-    config = Config()
-    manager = CryptoManager(config)
-    crypto_symbols = config.get('default_cryptos', [])
-    crypto_prices = manager.get_crypto_prices_json(";".join(crypto_symbols))
-    return jsonify(crypto_prices)
+    services = get_services()
+    crypto_symbols = services.config.get('default_cryptos', [])
+    return _json_with_age(*services.crypto_prices(crypto_symbols))
 
 @app.route('/api/crypto/<symbols>', methods=['GET'])
 def api_get_crypto_by_symbols(symbols):
-    config = Config()
-    manager = CryptoManager(config)
-    crypto_prices = manager.get_crypto_prices_json(symbols)
-    return jsonify(crypto_prices)
\ No newline at end of file
+    return _json_with_age(*get_services().crypto_prices(symbols.split(';')))
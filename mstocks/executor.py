@@ -0,0 +1,94 @@
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+class FetchTimeout(Exception):
+    """Raised in place of a result when a task runs past its deadline."""
+
+
+class FetchExecutor:
+    """
+    Runs one fetch task per item on a bounded thread pool and assembles the results in input order.
+
+    Every task gets `timeout` seconds from the moment a worker picks it up. A task that overruns is
+    reported through on_error with a FetchTimeout and no longer waited on; its worker thread is
+    released once the underlying call returns on its own.
+    """
+
+    POLL_INTERVAL = 0.25
+
+    def __init__(self, max_workers=8, timeout=10, clock=time.monotonic):
+        self.max_workers = max(1, int(max_workers))
+        self.timeout = timeout
+        self.clock = clock
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    @property
+    def pool(self):
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="mstocks-fetch")
+            return self._pool
+
+    def map(self, func, items, on_error):
+        """
+        :param func: Called as func(item) on a worker thread.
+        :param items: Items to process; the result list keeps their order.
+        :param on_error: Called as on_error(item, exception) to build the result of a failed or late task.
+        :return: List with one result per item.
+        """
+        items = list(items)
+        if not items:
+            return []
+
+        started = {}
+        results = [None] * len(items)
+
+        def run(index):
+            started[index] = self.clock()
+            return func(items[index])
+
+        futures = {self.pool.submit(run, index): index for index in range(len(items))}
+        # Queued tasks cannot wait forever behind stuck workers: once every wave of workers
+        # had its full timeout, whatever is left is reported as late.
+        waves = math.ceil(len(items) / self.max_workers)
+        overall_deadline = self.clock() + self.timeout * (waves + 1)
+        pending = set(futures)
+
+        while pending:
+            done, pending = wait(pending, timeout=self._next_wait(pending, futures, started, overall_deadline),
+                                 return_when=FIRST_COMPLETED)
+            for future in done:
+                index = futures[future]
+                try:
+                    results[index] = future.result()
+                except Exception as e:
+                    results[index] = on_error(items[index], e)
+
+            now = self.clock()
+            for future in list(pending):
+                index = futures[future]
+                start = started.get(index)
+                late = now >= overall_deadline or (start is not None and now - start >= self.timeout)
+                if late:
+                    future.cancel()
+                    pending.discard(future)
+                    results[index] = on_error(items[index], FetchTimeout(f"No result within {self.timeout}s"))
+        return results
+
+    def _next_wait(self, pending, futures, started, overall_deadline):
+        now = self.clock()
+        deadlines = [started[futures[future]] + self.timeout for future in pending if futures[future] in started]
+        next_deadline = min(deadlines + [overall_deadline])
+        # Poll regularly so tasks picked up by a worker after this call still get their deadline checked
+        return max(0.0, min(next_deadline - now, self.POLL_INTERVAL, self.timeout))
+
+    def shutdown(self, wait=False):
+        """Stop the worker threads; the next map starts new ones. With wait, return once they have exited."""
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=wait, cancel_futures=True)
@@ -0,0 +1,69 @@
+import threading
+from .cache import TTLCache
+from .providers import YFinanceProvider
+
+
+class FxRateError(Exception):
+    """Raised when an exchange rate cannot be resolved."""
+
+
+class FxRateProvider:
+    DEFAULT_URL = YFinanceProvider.FX_URL
+
+    _shared = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, url=DEFAULT_URL, ttl=3600, max_stale=None, timeout=10, session=None, source=None):
+        """
+        :param source: QuoteProvider the rate tables come from; the live one at url by default.
+        """
+        self.url = url
+        self.timeout = timeout
+        self.source = source or YFinanceProvider(fx_url=url, session=session, timeout=timeout)
+        self.session = getattr(self.source, 'session', None)
+        self.cache = TTLCache(ttl, max_stale=max_stale)
+
+    @classmethod
+    def shared(cls, ttl=3600):
+        """
+        Return the process-wide provider for ttl, so every manager with the same fx_ttl reuses the same cached rates.
+        """
+        with cls._shared_lock:
+            provider = cls._shared.get(ttl)
+            if provider is None:
+                provider = cls._shared[ttl] = cls(ttl=ttl)
+            return provider
+
+    def get_rates(self, base="USD"):
+        """Return the rate table for base, fetching it at most once per ttl."""
+        base = base.upper()
+        return self.cache.get_or_load(base, lambda: self._fetch_rates(base))
+
+    def has_rates(self, base="USD"):
+        """Return True when a fresh rate table for base is cached."""
+        return self.cache.get(base.upper()) is not None
+
+    def store_rates(self, base, rates):
+        """Cache a rate table for base that was downloaded elsewhere, e.g. by the async server."""
+        self.cache.set(base.upper(), rates)
+
+    def get_rate(self, base, target):
+        base, target = base.upper(), target.upper()
+        if base == target:
+            return 1.0
+        rate = self.get_rates(base).get(target)
+        if rate is None:
+            raise FxRateError(f"No {base}/{target} rate available")
+        return float(rate)
+
+    def convert(self, amount, base, target):
+        return amount * self.get_rate(base, target)
+
+    def _fetch_rates(self, base):
+        try:
+            rates = self.source.fx_rates(base)
+        except Exception as e:
+            raise FxRateError(f"Could not fetch {base} rates: {e}") from e
+        if not rates:
+            raise FxRateError(f"Empty rate table returned for {base}")
+        return rates
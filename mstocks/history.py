@@ -0,0 +1,139 @@
+import os
+import re
+import threading
+import numpy as np
+import pandas as pd
+
+
+class HistoryStore:
+    """
+    Columnar store of daily bars per symbol that only downloads bars it does not have yet.
+
+    Each symbol is a NumPy structured array, kept in memory and, when a path is given, saved as
+    `<path>/<symbol>.npy` and memory-mapped back on startup. An update re-downloads from the date of
+    the newest stored bar, because that bar is still moving while its session is open, and merges the
+    result in. Symbols without any stored bars are seeded with `initial_period` of history.
+    """
+
+    DTYPE = np.dtype([('ts', 'i8'), ('open', 'f8'), ('high', 'f8'), ('low', 'f8'), ('close', 'f8'), ('volume', 'f8')])
+    COLUMNS = {'open': 'Open', 'high': 'High', 'low': 'Low', 'close': 'Close', 'volume': 'Volume'}
+
+    def __init__(self, fetcher, path=None, initial_period="1mo", max_bars=400):
+        self.fetcher = fetcher
+        self.path = path
+        self.initial_period = initial_period
+        self.max_bars = max_bars
+        self._bars = {}
+        self._lock = threading.Lock()
+
+    def bars(self, symbol):
+        """Return the stored bars of symbol, oldest first, as a structured array."""
+        bars = self._bars.get(symbol)
+        if bars is None:
+            bars = self._load(symbol)
+            self._bars[symbol] = bars
+        return bars
+
+    def update(self, symbols):
+        """
+        Download the missing bars of every symbol.
+
+        :return: Dict of symbol -> exception for symbols whose download failed.
+        """
+        # Symbols that have the same newest bar can share one download
+        groups = {}
+        for symbol in dict.fromkeys(symbol for symbol in symbols if symbol):
+            bars = self.bars(symbol)
+            start = None if len(bars) == 0 else pd.Timestamp(int(bars['ts'][-1]), unit='s').strftime('%Y-%m-%d')
+            groups.setdefault(start, []).append(symbol)
+
+        errors = {}
+        for start, group in groups.items():
+            if start is None:
+                frames = self.fetcher.fetch_history(group, period=self.initial_period)
+            else:
+                frames = self.fetcher.fetch_history(group, start=start)
+            with self._lock:
+                for symbol in group:
+                    frame = frames.get(symbol)
+                    if isinstance(frame, Exception):
+                        errors[symbol] = frame
+                    elif frame is not None and len(frame):
+                        self._merge(symbol, frame)
+        return errors
+
+    def histories(self, symbols, bars=2):
+        """
+        Update the symbols and return their last `bars` bars as DataFrames, in the shape
+        BatchFetcher.fetch_history returns them, so callers can use either.
+        """
+        errors = self.update(symbols)
+        return {symbol: errors[symbol] if symbol in errors else self.frame(symbol, bars)
+                for symbol in symbols if symbol}
+
+    def frame(self, symbol, bars=None):
+        stored = self.bars(symbol)
+        if bars is not None:
+            stored = stored[-bars:]
+        index = pd.to_datetime(stored['ts'], unit='s')
+        return pd.DataFrame({column: stored[field] for field, column in self.COLUMNS.items()}, index=index)
+
+    def change(self, symbol, bars):
+        """Return (absolute, percent) change of the close over the last `bars` bars, or None when too short."""
+        closes = self.bars(symbol)['close']
+        if len(closes) <= bars:
+            return None
+        previous, last = closes[-bars - 1], closes[-1]
+        return last - previous, (last - previous) / previous * 100
+
+    @staticmethod
+    def history_for(histories, symbol):
+        # A failed download stores its exception so each symbol can report the error on its own row
+        hist = histories.get(symbol)
+        if isinstance(hist, Exception):
+            raise hist
+        return hist if hist is not None else pd.DataFrame(columns=['Close'])
+
+    def _merge(self, symbol, frame):
+        new = self._to_bars(frame)
+        if len(new) == 0:
+            return
+        old = self.bars(symbol)
+        merged = np.concatenate([old[old['ts'] < new['ts'][0]], new])[-self.max_bars:]
+        self._bars[symbol] = merged
+        self._save(symbol, merged)
+
+    @classmethod
+    def _to_bars(cls, frame):
+        index = pd.DatetimeIndex(frame.index)
+        if index.tz is not None:
+            index = index.tz_localize(None)
+        # One bar per trading day, keyed by the day at midnight UTC
+        days = index.normalize()
+        bars = np.zeros(len(frame), dtype=cls.DTYPE)
+        bars['ts'] = ((days - pd.Timestamp(0)) // pd.Timedelta(seconds=1)).to_numpy()
+        for field, column in cls.COLUMNS.items():
+            bars[field] = frame[column].to_numpy(dtype='f8') if column in frame.columns else np.nan
+        _, last_of_day = np.unique(bars['ts'][::-1], return_index=True)
+        return bars[len(bars) - 1 - last_of_day]
+
+    def _file(self, symbol):
+        return os.path.join(self.path, re.sub(r'[^A-Za-z0-9._-]', '_', symbol) + '.npy')
+
+    def _load(self, symbol):
+        if self.path:
+            try:
+                return np.load(self._file(symbol), mmap_mode='r')
+            except (OSError, ValueError):
+                pass
+        return np.zeros(0, dtype=self.DTYPE)
+
+    def _save(self, symbol, bars):
+        if not self.path:
+            return
+        os.makedirs(self.path, exist_ok=True)
+        file = self._file(symbol)
+        # np.save appends .npy to names without it, so the temporary file keeps that suffix
+        tmp_file = file[:-len('.npy')] + '.tmp.npy'
+        np.save(tmp_file, bars)
+        os.replace(tmp_file, file)
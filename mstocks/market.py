@@ -1,7 +1,90 @@
-from datetime import datetime, time as datetime_time
+import bisect
+import math
+import time
+from datetime import datetime, date, timedelta, time as datetime_time
 import pytz
+from .suffix import SuffixResolver
+
+
+class Exchange:
+    """Trading hours of one exchange, in its local time."""
+
+    __slots__ = ('code', 'name', 'timezone', 'suffixes', 'pre_open', 'open', 'close', 'post_close', 'lunch',
+                 'holidays')
+
+    def __init__(self, code, name, timezone, suffixes, pre_open, market_open, market_close, post_close,
+                 lunch=None, holidays=None):
+        """
+        :param code: Key of the exchange in market_holidays, e.g. "US" or "LSE".
+        :param suffixes: Ticker suffixes that trade there, e.g. (".L",).
+        :param pre_open: Start of the pre-market session; equal to market_open when there is none.
+        :param post_close: End of the post-market session; equal to market_close when there is none.
+        :param lunch: Optional (start, end) of a midday break in the regular session.
+        :param holidays: Function year -> set of dates the exchange is closed on weekdays.
+        """
+        self.code = code
+        self.name = name
+        self.timezone = pytz.timezone(timezone)
+        self.suffixes = suffixes
+        self.pre_open = pre_open
+        self.open = market_open
+        self.close = market_close
+        self.post_close = post_close
+        self.lunch = lunch
+        self.holidays = holidays
+
+    def __repr__(self):
+        return f"Exchange({self.code!r})"
+
+
+class MarketStatus:
+    """
+    Where an exchange is in its trading day at one instant, with the instants around it as epoch seconds.
+
+    A status holds for the whole phase it describes, from since until until, so one object can answer
+    every lookup in that span.
+    """
+
+    __slots__ = ('exchange', 'phase', 'since', 'until', 'next_open', 'next_close', 'last_close')
+
+    def __init__(self, exchange, phase, since, until, next_open=None, next_close=None, last_close=None):
+        self.exchange = exchange
+        self.phase = phase
+        self.since = since
+        self.until = until
+        self.next_open = next_open
+        self.next_close = next_close
+        self.last_close = last_close
+
+    @property
+    def is_open(self):
+        return self.phase == Market.OPEN
+
+    def as_json(self):
+        return {
+            "exchange": self.exchange.code,
+            "status": self.phase,
+            "changes_at": self.until if self.until != math.inf else None,
+            "next_open": self.next_open,
+            "next_close": self.next_close,
+        }
+
+    def __repr__(self):
+        return f"MarketStatus({self.exchange.code!r}, {self.phase!r}, until={self.until!r})"
+
 
 class Market:
+    """
+    Market calendars of the exchanges in EXCHANGES, picked by ticker suffix.
+
+    Each trading day is turned once into the UTC epoch seconds of its session edges (pre-market,
+    open, lunch break, close, post-market). status() looks the instant up among the edges of the
+    surrounding days and remembers the phase it falls in, so until that phase ends a lookup is two
+    number comparisons, without any time zone conversion. Holidays are the regular ones of each
+    exchange; movable feasts the rules do not cover (e.g. lunar new year in Hong Kong, most of the
+    Japanese national holidays) can be added through market_holidays.
+    """
+
     EASTERN = pytz.timezone('US/Eastern')
     CENTRAL_EUROPEAN = pytz.timezone('Europe/Warsaw')
 
@@ -10,21 +93,358 @@ class Market:
     WARSAW_MARKET_OPEN = datetime_time(9, 0, 0)
     WARSAW_MARKET_CLOSE = datetime_time(17, 0, 0)
 
-    def __init__(self, utils):
+    # Extended sessions: pre-market/after-hours in the US, pre-opening and overtime trading on the GPW
+    US_PRE_MARKET_OPEN = datetime_time(4, 0, 0)
+    US_POST_MARKET_CLOSE = datetime_time(20, 0, 0)
+    WARSAW_PRE_MARKET_OPEN = datetime_time(8, 30, 0)
+    WARSAW_POST_MARKET_CLOSE = datetime_time(17, 5, 0)
+
+    US = "US"
+    WARSAW = "WA"
+
+    OPEN = "open"
+    PRE_MARKET = "pre"
+    POST_MARKET = "post"
+    BREAK = "break"
+    CLOSED = "closed"
+
+    # Days of edges looked at around an instant; longer than any run of closed days
+    DAYS_BEFORE = 10
+    DAYS_AFTER = 14
+
+    def __init__(self, utils, extra_holidays=None):
+        """
+        :param utils: Utils instance used for the console colors.
+        :param extra_holidays: Optional {"US": ["2025-01-09"], "WA": [...]} with one-off closures
+                               that the built-in calendars do not know about, by exchange code.
+        """
         self.utils = utils
+        self.extra_holidays = {}
+        for market, days in (extra_holidays or {}).items():
+            self.extra_holidays[market] = {date.fromisoformat(day) for day in days}
+        self._holiday_cache = {}
+        self._day_edges = {}
+        self._current = {}
+
+    @staticmethod
+    def market_for(symbol):
+        return Market.SUFFIXES.resolve(symbol).code
+
+    @staticmethod
+    def exchange_for(symbol):
+        return Market.SUFFIXES.resolve(symbol)
+
+    def status(self, symbol, at=None):
+        """
+        Return the MarketStatus of the symbol's exchange.
+
+        :param at: Epoch seconds to report the status at, defaults to now.
+        """
+        exchange = self.exchange_for(symbol)
+        at = time.time() if at is None else at
+        current = self._current.get(exchange.code)
+        if current is not None and current.since <= at < current.until:
+            return current
+        current = self._status(exchange, at)
+        self._current[exchange.code] = current
+        return current
+
+    def is_market_open(self, symbol, at=None):
+        """
+        Return the console status dot of the symbol's exchange and the time in its time zone.
+
+        :param at: Optional epoch seconds to report the status at, defaults to now.
+        """
+        at = time.time() if at is None else at
+        status = self.status(symbol, at)
+        color = self.utils.GREEN if status.is_open else self.utils.RED
+        local = datetime.fromtimestamp(at, status.exchange.timezone)
+        return f"{color}●{self.utils.RESET}", local.strftime('%H:%M:%S')
+
+    def is_trading_day(self, market, day):
+        return day.weekday() < 5 and day not in self.holidays(market, day.year)
+
+    def session(self, symbol, now=None):
+        """
+        Return which part of the trading day the symbol's exchange is in: OPEN, PRE_MARKET, BREAK,
+        POST_MARKET or CLOSED.
+        """
+        return self.status(symbol, now.timestamp() if now is not None else None).phase
+
+    def last_close(self, symbol, now=None):
+        """Return the aware datetime of the most recent regular session close at or before now."""
+        status = self.status(symbol, now.timestamp() if now is not None else None)
+        return self._local(status.exchange, status.last_close)
+
+    def next_open(self, symbol, now=None):
+        """Return the aware datetime of the next regular session open after now."""
+        status = self.status(symbol, now.timestamp() if now is not None else None)
+        return self._local(status.exchange, status.next_open)
+
+    @staticmethod
+    def _local(exchange, epoch):
+        return datetime.fromtimestamp(epoch, exchange.timezone) if epoch is not None else None
+
+    def _status(self, exchange, at):
+        day = datetime.fromtimestamp(at, exchange.timezone).date()
+        edges = []
+        opens = []
+        closes = []
+        for offset in range(-self.DAYS_BEFORE, self.DAYS_AFTER + 1):
+            day_edges, day_open, day_close = self._edges(exchange, day + timedelta(days=offset))
+            edges.extend(day_edges)
+            if day_open is not None:
+                opens.append(day_open)
+                closes.append(day_close)
+
+        times = [edge for edge, _ in edges]
+        i = bisect.bisect_right(times, at)
+        phase = edges[i - 1][1] if i > 0 else Market.CLOSED
+        since = times[i - 1] if i > 0 else -math.inf
+        until = times[i] if i < len(times) else math.inf
+        j = bisect.bisect_right(opens, at)
+        k = bisect.bisect_right(closes, at)
+        return MarketStatus(exchange, phase, since, until,
+                            next_open=opens[j] if j < len(opens) else None,
+                            next_close=closes[k] if k < len(closes) else None,
+                            last_close=closes[k - 1] if k > 0 else None)
+
+    def _edges(self, exchange, day):
+        # ([(epoch, phase starting there), ...], open epoch, close epoch) of one day, computed once
+        key = (exchange.code, day)
+        cached = self._day_edges.get(key)
+        if cached is not None:
+            return cached
+        if not self.is_trading_day(exchange.code, day):
+            cached = ((), None, None)
+        else:
+            def epoch(at):
+                return exchange.timezone.localize(datetime.combine(day, at)).timestamp()
+
+            market_open, market_close = epoch(exchange.open), epoch(exchange.close)
+            edges = []
+            if exchange.pre_open < exchange.open:
+                edges.append((epoch(exchange.pre_open), Market.PRE_MARKET))
+            edges.append((market_open, Market.OPEN))
+            if exchange.lunch:
+                edges.append((epoch(exchange.lunch[0]), Market.BREAK))
+                edges.append((epoch(exchange.lunch[1]), Market.OPEN))
+            if exchange.post_close > exchange.close:
+                edges.append((market_close, Market.POST_MARKET))
+                edges.append((epoch(exchange.post_close), Market.CLOSED))
+            else:
+                edges.append((market_close, Market.CLOSED))
+            cached = (tuple(edges), market_open, market_close)
+        if len(self._day_edges) >= 4096:
+            self._day_edges = {}
+        self._day_edges[key] = cached
+        return cached
+
+    def holidays(self, market, year):
+        key = (market, year)
+        if key not in self._holiday_cache:
+            rules = Market.EXCHANGES[market].holidays if market in Market.EXCHANGES else None
+            days = rules(year) if rules else set()
+            self._holiday_cache[key] = days | {day for day in self.extra_holidays.get(market, ()) if day.year == year}
+        return self._holiday_cache[key]
+
+    @staticmethod
+    def _easter(year):
+        # Anonymous Gregorian algorithm
+        a = year % 19
+        b, c = divmod(year, 100)
+        d, e = divmod(b, 4)
+        f = (b + 8) // 25
+        g = (b - f + 1) // 3
+        h = (19 * a + b - d - g + 15) % 30
+        i, k = divmod(c, 4)
+        l = (32 + 2 * e + 2 * i - h - k) % 7
+        m = (a + 11 * h + 22 * l) // 451
+        month, day = divmod(h + l - 7 * m + 114, 31)
+        return date(year, month, day + 1)
+
+    @staticmethod
+    def _nth_weekday(year, month, weekday, n):
+        first = date(year, month, 1)
+        return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+
+    @staticmethod
+    def _last_weekday(year, month, weekday):
+        last = date(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)
+        return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+    @staticmethod
+    def _observed(day):
+        # NYSE moves Saturday holidays to Friday and Sunday holidays to Monday
+        if day.weekday() == 5:
+            return day - timedelta(days=1)
+        if day.weekday() == 6:
+            return day + timedelta(days=1)
+        return day
+
+    @staticmethod
+    def _us_holidays(year):
+        days = {
+            Market._nth_weekday(year, 1, 0, 3),            # Martin Luther King Jr. Day
+            Market._nth_weekday(year, 2, 0, 3),            # Washington's Birthday
+            Market._easter(year) - timedelta(days=2),      # Good Friday
+            Market._last_weekday(year, 5, 0),              # Memorial Day
+            Market._observed(date(year, 7, 4)),            # Independence Day
+            Market._nth_weekday(year, 9, 0, 1),            # Labor Day
+            Market._nth_weekday(year, 11, 3, 4),           # Thanksgiving
+            Market._observed(date(year, 12, 25)),          # Christmas
+        }
+        new_year = date(year, 1, 1)
+        # A Saturday New Year's Day is not made up on the Friday before
+        if new_year.weekday() != 5:
+            days.add(Market._observed(new_year))
+        if year >= 2022:
+            days.add(Market._observed(date(year, 6, 19)))  # Juneteenth
+        return days
+
+    @staticmethod
+    def _warsaw_holidays(year):
+        easter = Market._easter(year)
+        return {
+            date(year, 1, 1), date(year, 1, 6),
+            easter - timedelta(days=2), easter + timedelta(days=1),
+            date(year, 5, 1), date(year, 5, 3),
+            easter + timedelta(days=60),                   # Corpus Christi
+            date(year, 8, 15), date(year, 11, 1), date(year, 11, 11),
+            date(year, 12, 24), date(year, 12, 25), date(year, 12, 26), date(year, 12, 31),
+        }
+
+    @staticmethod
+    def _monday_if_sunday(day):
+        return day + timedelta(days=1) if day.weekday() == 6 else day
+
+    @staticmethod
+    def _next_weekday(day):
+        # Many exchanges make up a weekend holiday on the following Monday
+        return day + timedelta(days=(7 - day.weekday()) % 7) if day.weekday() >= 5 else day
+
+    @staticmethod
+    def _christmas_days(year):
+        # Christmas and Boxing Day, moved to the next free weekdays when they fall on a weekend
+        christmas = date(year, 12, 25)
+        if christmas.weekday() == 4:
+            return {christmas, date(year, 12, 28)}
+        if christmas.weekday() == 5:
+            return {date(year, 12, 27), date(year, 12, 28)}
+        if christmas.weekday() == 6:
+            return {date(year, 12, 26), date(year, 12, 27)}
+        return {christmas, date(year, 12, 26)}
+
+    @staticmethod
+    def _lse_holidays(year):
+        easter = Market._easter(year)
+        return {
+            Market._next_weekday(date(year, 1, 1)),
+            easter - timedelta(days=2), easter + timedelta(days=1),
+            Market._nth_weekday(year, 5, 0, 1),            # Early May bank holiday
+            Market._last_weekday(year, 5, 0),              # Spring bank holiday
+            Market._last_weekday(year, 8, 0),              # Summer bank holiday
+        } | Market._christmas_days(year)
+
+    @staticmethod
+    def _xetra_holidays(year):
+        easter = Market._easter(year)
+        return {
+            date(year, 1, 1), easter - timedelta(days=2), easter + timedelta(days=1), date(year, 5, 1),
+            date(year, 12, 24), date(year, 12, 25), date(year, 12, 26), date(year, 12, 31),
+        }
+
+    @staticmethod
+    def _euronext_holidays(year):
+        easter = Market._easter(year)
+        return {
+            date(year, 1, 1), easter - timedelta(days=2), easter + timedelta(days=1), date(year, 5, 1),
+            date(year, 12, 25), date(year, 12, 26),
+        }
+
+    @staticmethod
+    def _six_holidays(year):
+        easter = Market._easter(year)
+        return {
+            date(year, 1, 1), date(year, 1, 2),
+            easter - timedelta(days=2), easter + timedelta(days=1),
+            easter + timedelta(days=39),                   # Ascension
+            easter + timedelta(days=50),                   # Whit Monday
+            date(year, 5, 1), date(year, 8, 1),
+            date(year, 12, 24), date(year, 12, 25), date(year, 12, 26), date(year, 12, 31),
+        }
+
+    @staticmethod
+    def _tse_holidays(year):
+        # New year closure plus the fixed-date national holidays; the movable ones come from market_holidays
+        fixed = [(2, 11), (2, 23), (4, 29), (5, 3), (5, 4), (5, 5), (11, 3), (11, 23)]
+        return {date(year, 1, 1), date(year, 1, 2), date(year, 1, 3), date(year, 12, 31)} | \
+            {Market._monday_if_sunday(date(year, month, day)) for month, day in fixed}
+
+    @staticmethod
+    def _hkex_holidays(year):
+        # Lunar new year, Ching Ming, Buddha's birthday, Tuen Ng and Mid-Autumn come from market_holidays
+        easter = Market._easter(year)
+        days = {easter - timedelta(days=2), easter - timedelta(days=1), easter + timedelta(days=1)}
+        for month, day in [(1, 1), (5, 1), (7, 1), (10, 1), (12, 25), (12, 26)]:
+            days.add(Market._monday_if_sunday(date(year, month, day)))
+        return days
+
+    @staticmethod
+    def _tsx_holidays(year):
+        easter = Market._easter(year)
+        return {
+            Market._next_weekday(date(year, 1, 1)),
+            Market._nth_weekday(year, 2, 0, 3),            # Family Day
+            easter - timedelta(days=2),
+            date(year, 5, 24) - timedelta(days=date(year, 5, 24).weekday()),  # Victoria Day
+            Market._next_weekday(date(year, 7, 1)),        # Canada Day
+            Market._nth_weekday(year, 8, 0, 1),            # Civic Holiday
+            Market._nth_weekday(year, 9, 0, 1),            # Labour Day
+            Market._nth_weekday(year, 10, 0, 2),           # Thanksgiving
+        } | Market._christmas_days(year)
+
+    @staticmethod
+    def _asx_holidays(year):
+        easter = Market._easter(year)
+        return {
+            Market._next_weekday(date(year, 1, 1)),
+            Market._next_weekday(date(year, 1, 26)),       # Australia Day
+            easter - timedelta(days=2), easter + timedelta(days=1),
+            date(year, 4, 25),                             # Anzac Day
+            Market._nth_weekday(year, 6, 0, 2),            # King's Birthday
+        } | Market._christmas_days(year)
+
+
+def _hours(*times):
+    return [datetime_time(*divmod(minutes, 60)) for minutes in times]
+
 
-    def is_market_open(self, symbol):
-        now = None
-        market_open = None
-        market_close = None
-        if ".WA" in symbol:  # Warsaw market
-            now = datetime.now(Market.CENTRAL_EUROPEAN)
-            market_open = Market.WARSAW_MARKET_OPEN
-            market_close = Market.WARSAW_MARKET_CLOSE
-        else:  # Default to US market
-            now = datetime.now(Market.EASTERN)
-            market_open = Market.US_MARKET_OPEN
-            market_close = Market.US_MARKET_CLOSE
-
-        is_open = market_open <= now.time() <= market_close and now.weekday() < 5
-        return (f"{self.utils.GREEN}●{self.utils.RESET}" if is_open else f"{self.utils.RED}●{self.utils.RESET}"), now.strftime('%H:%M:%S')
+# Exchange code -> Exchange; symbols without a known suffix trade in the US
+Market.EXCHANGES = {exchange.code: exchange for exchange in [
+    Exchange(Market.US, "NYSE / Nasdaq", 'US/Eastern', ("",), Market.US_PRE_MARKET_OPEN, Market.US_MARKET_OPEN,
+             Market.US_MARKET_CLOSE, Market.US_POST_MARKET_CLOSE, holidays=Market._us_holidays),
+    Exchange(Market.WARSAW, "Warsaw Stock Exchange", 'Europe/Warsaw', (".WA",), Market.WARSAW_PRE_MARKET_OPEN,
+             Market.WARSAW_MARKET_OPEN, Market.WARSAW_MARKET_CLOSE, Market.WARSAW_POST_MARKET_CLOSE,
+             holidays=Market._warsaw_holidays),
+    Exchange("LSE", "London Stock Exchange", 'Europe/London', (".L", ".IL"),
+             *_hours(7 * 60 + 50, 8 * 60, 16 * 60 + 30, 16 * 60 + 35), holidays=Market._lse_holidays),
+    Exchange("XETRA", "Xetra", 'Europe/Berlin', (".DE",),
+             *_hours(8 * 60 + 50, 9 * 60, 17 * 60 + 30, 17 * 60 + 35), holidays=Market._xetra_holidays),
+    Exchange("EURONEXT", "Euronext", 'Europe/Paris', (".PA", ".AS", ".BR", ".LS"),
+             *_hours(7 * 60 + 15, 9 * 60, 17 * 60 + 30, 17 * 60 + 40), holidays=Market._euronext_holidays),
+    Exchange("SIX", "SIX Swiss Exchange", 'Europe/Zurich', (".SW",),
+             *_hours(6 * 60, 9 * 60, 17 * 60 + 30, 17 * 60 + 40), holidays=Market._six_holidays),
+    Exchange("TSE", "Tokyo Stock Exchange", 'Asia/Tokyo', (".T",),
+             *_hours(8 * 60, 9 * 60, 15 * 60 + 30, 15 * 60 + 30), lunch=_hours(11 * 60 + 30, 12 * 60 + 30),
+             holidays=Market._tse_holidays),
+    Exchange("HKEX", "Hong Kong Exchanges", 'Asia/Hong_Kong', (".HK",),
+             *_hours(9 * 60, 9 * 60 + 30, 16 * 60, 16 * 60 + 10), lunch=_hours(12 * 60, 13 * 60),
+             holidays=Market._hkex_holidays),
+    Exchange("TSX", "Toronto Stock Exchange", 'America/Toronto', (".TO", ".V"),
+             *_hours(7 * 60, 9 * 60 + 30, 16 * 60, 17 * 60), holidays=Market._tsx_holidays),
+    Exchange("ASX", "Australian Securities Exchange", 'Australia/Sydney', (".AX",),
+             *_hours(7 * 60, 10 * 60, 16 * 60, 16 * 60 + 12), holidays=Market._asx_holidays),
+]}
+Market.SUFFIXES = SuffixResolver({suffix: exchange for exchange in Market.EXCHANGES.values()
+                                  for suffix in exchange.suffixes}, default=Market.EXCHANGES[Market.US])
@@ -0,0 +1,97 @@
+import json
+import os
+import tempfile
+import threading
+import time
+
+
+class MetadataCache:
+    """
+    Long-lived cache of per-symbol company metadata, optionally persisted to a JSON file.
+
+    Company names hardly ever change, so they are kept for `ttl` seconds and survive restarts
+    when a path is configured. Lookups that came back without a name are only kept for `miss_ttl`
+    so a transient empty answer from upstream is retried soon.
+    """
+
+    def __init__(self, path=None, ttl=7 * 24 * 3600, miss_ttl=3600, clock=time.time):
+        self.path = path
+        self.ttl = ttl
+        self.miss_ttl = miss_ttl
+        self.clock = clock
+        self._entries = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if path:
+            self._entries = self._load(path)
+
+    @staticmethod
+    def _load(path):
+        try:
+            with open(path, 'r') as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    def get_company_name(self, symbol, fetch):
+        """
+        Return the cached company name for symbol, calling fetch(symbol) only when it is missing or expired.
+        """
+        with self._lock:
+            entry = self._entries.get(symbol)
+            if entry is not None and not self._expired(entry):
+                self.hits += 1
+                return entry['long_name']
+            self.misses += 1
+
+        long_name = fetch(symbol)
+        with self._lock:
+            self._entries[symbol] = {'long_name': long_name, 'fetched_at': self.clock()}
+            self._dirty = True
+        return long_name
+
+    def _expired(self, entry):
+        ttl = self.ttl if entry.get('long_name', 'N/A') != 'N/A' else self.miss_ttl
+        return self.clock() - entry.get('fetched_at', 0) > ttl
+
+    def invalidate(self, symbol=None):
+        """Forget one symbol, or every symbol when None, so the next lookup fetches it again."""
+        with self._lock:
+            if symbol is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(symbol, None)
+            self._dirty = True
+        self.flush()
+
+    def flush(self):
+        """Write pending changes to disk. Does nothing for memory-only caches."""
+        # The refresher and on-demand API fetches flush concurrently; one writer at a time, each
+        # writing the entries as of its turn, so an older copy never replaces a newer one
+        with self._flush_lock:
+            with self._lock:
+                if not self.path or not self._dirty:
+                    return
+                entries = dict(self._entries)
+                self._dirty = False
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # Write to a temporary file first so a crash never leaves a half-written cache behind
+            fd, tmp_path = tempfile.mkstemp(dir=directory or None, prefix=f".{os.path.basename(self.path)}.")
+            try:
+                with os.fdopen(fd, 'w') as file:
+                    json.dump(entries, file, indent=4, sort_keys=True)
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                with self._lock:
+                    self._dirty = True
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+                raise
@@ -0,0 +1,255 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+
+class Histogram:
+    """
+    Latency histogram with fixed bucket bounds, cumulative like a Prometheus histogram.
+    Not thread-safe on its own; Metrics updates it under its lock.
+    """
+
+    # Seconds, from a cached lookup to a throttled download
+    BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        # One count per bucket plus the +Inf bucket
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def cumulative(self):
+        """Return [(upper bound, observations <= bound)], ending with (inf, count)."""
+        total, result = 0, []
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+    def quantile(self, q):
+        """Return the upper bound of the bucket holding the q-th quantile, the max for the +Inf bucket."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        for bound, total in self.cumulative():
+            if total >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def merge(self, other):
+        """Add the observations of other, a histogram with the same buckets."""
+        self.counts = [count + more for count, more in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.sum += other.sum
+        self.max = max(self.max, other.max)
+
+    def copy(self):
+        histogram = Histogram(self.buckets)
+        histogram.counts = list(self.counts)
+        histogram.count, histogram.sum, histogram.max = self.count, self.sum, self.max
+        return histogram
+
+
+class Metrics:
+    """
+    In-process instrumentation: latency histograms per stage and counters of upstream calls and
+    failed symbols, rendered as Prometheus text for the /metrics route and as a one-line summary.
+
+    Stages are the parts of a refresh: "history" downloads, "info" company name lookups, "fx" rate
+    tables, "earnings" portfolio valuation, "format" console and json rows and "render" console
+    redraws, plus "refresh_<kind>" for whole refreshes of an asset class.
+
+    With per_symbol set, e.g. by the --profile mode, the time of every stage is also summed per
+    symbol. A stage run for several symbols at once, like a batch download, is split evenly among them.
+    """
+
+    PREFIX = "mstocks"
+    # Symbols counted one by one; failures of any further symbol are counted under OTHER, since
+    # on-demand requests can name any symbol and every label value is a new time series
+    MAX_ERROR_SYMBOLS = 1000
+    OTHER = "_other"
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, clock=time.perf_counter, per_symbol=False):
+        self.clock = clock
+        self.per_symbol = per_symbol
+        self._stages = {}
+        self._calls = {}
+        self._errors = {}
+        self._symbols = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def shared(cls):
+        """Return the process-wide registry every component records into unless given its own."""
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            histogram = self._stages.get(stage)
+            if histogram is None:
+                histogram = self._stages[stage] = Histogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, stage, symbols=()):
+        """
+        Observe the time spent in the with block as one sample of stage, also when it raises.
+
+        :param symbols: Symbols the block worked on, to attribute the time to with per_symbol.
+        """
+        started = self.clock()
+        try:
+            yield
+        finally:
+            seconds = self.clock() - started
+            self.observe(stage, seconds)
+            if self.per_symbol and symbols:
+                self.observe_symbols(stage, symbols, seconds)
+
+    def observe_symbols(self, stage, symbols, seconds):
+        """Add an even share of seconds to the stage total of every symbol."""
+        share = seconds / len(symbols)
+        with self._lock:
+            for symbol in symbols:
+                stages = self._symbols.setdefault(symbol, {})
+                stages[stage] = stages.get(stage, 0.0) + share
+
+    def count_call(self, operation, outcome):
+        """Count one upstream call, e.g. ("history", "ok") or ("info", "error")."""
+        self._increment(self._calls, (operation, outcome))
+
+    def count_error(self, kind, symbol, error):
+        """Count one quote of symbol that came back with an error code."""
+        with self._lock:
+            key = (kind, symbol, error)
+            if key not in self._errors and len(self._errors) >= self.MAX_ERROR_SYMBOLS:
+                key = (kind, self.OTHER, error)
+            self._errors[key] = self._errors.get(key, 0) + 1
+
+    def _increment(self, counters, key):
+        with self._lock:
+            counters[key] = counters.get(key, 0) + 1
+
+    def stage(self, stage):
+        """Return a copy of the histogram of stage, empty when it was never observed."""
+        with self._lock:
+            histogram = self._stages.get(stage)
+            return histogram.copy() if histogram is not None else Histogram()
+
+    def calls(self):
+        with self._lock:
+            return dict(self._calls)
+
+    def errors(self):
+        with self._lock:
+            return dict(self._errors)
+
+    def symbol_times(self):
+        """Return {symbol: {stage: seconds}} summed since the last reset; empty unless per_symbol is set."""
+        with self._lock:
+            return {symbol: dict(stages) for symbol, stages in self._symbols.items()}
+
+    def top_errors(self, limit=3):
+        """Return [(symbol, count)] of the symbols that failed most often, summed over error codes."""
+        by_symbol = {}
+        for (kind, symbol, error), count in self.errors().items():
+            by_symbol[symbol] = by_symbol.get(symbol, 0) + count
+        return sorted(by_symbol.items(), key=lambda item: (-item[1], item[0]))[:limit]
+
+    def drain(self):
+        """Return (stage histograms, call counters) recorded since the last drain and clear them, e.g. in a worker process."""
+        with self._lock:
+            stages, calls = self._stages, self._calls
+            self._stages, self._calls = {}, {}
+        return stages, calls
+
+    def merge(self, stages, calls):
+        """Add stage histograms and call counters drained from another Metrics."""
+        with self._lock:
+            for stage, histogram in stages.items():
+                mine = self._stages.get(stage)
+                if mine is None:
+                    self._stages[stage] = histogram.copy()
+                else:
+                    mine.merge(histogram)
+            for key, count in calls.items():
+                self._calls[key] = self._calls.get(key, 0) + count
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+            self._calls.clear()
+            self._errors.clear()
+            self._symbols.clear()
+
+    def summary(self):
+        """One line with the mean and p95 of every stage, the upstream calls and the failing symbols."""
+        with self._lock:
+            stages = {stage: histogram.copy() for stage, histogram in self._stages.items()}
+        parts = [f"{stage} {histogram.sum / histogram.count * 1000:.0f}ms avg/{histogram.quantile(0.95) * 1000:.0f}ms p95"
+                 for stage, histogram in sorted(stages.items()) if histogram.count]
+        calls = self.calls()
+        failed = sum(count for (operation, outcome), count in calls.items() if outcome != "ok")
+        parts.append(f"upstream calls {sum(calls.values())} ({failed} failed)")
+        top = self.top_errors()
+        if top:
+            parts.append("errors " + ", ".join(f"{symbol} x{count}" for symbol, count in top))
+        return "Metrics: " + "; ".join(parts)
+
+    def render(self, gauges=()):
+        """
+        Return the metrics in the Prometheus text exposition format.
+
+        :param gauges: Extra (name, type, help, [(labels dict, value)]) samples owned by other
+                       components, e.g. the upstream limiter and breaker state or cache counters.
+        """
+        prefix = self.PREFIX
+        with self._lock:
+            stages = {stage: histogram.copy() for stage, histogram in self._stages.items()}
+        lines = [f"# HELP {prefix}_stage_seconds Time spent per refresh stage.",
+                 f"# TYPE {prefix}_stage_seconds histogram"]
+        for stage, histogram in sorted(stages.items()):
+            for bound, total in histogram.cumulative():
+                le = "+Inf" if bound == float('inf') else repr(float(bound))
+                lines.append(f'{prefix}_stage_seconds_bucket{{stage="{stage}",le="{le}"}} {total}')
+            lines.append(f'{prefix}_stage_seconds_sum{{stage="{stage}"}} {histogram.sum!r}')
+            lines.append(f'{prefix}_stage_seconds_count{{stage="{stage}"}} {histogram.count}')
+
+        lines += [f"# HELP {prefix}_upstream_calls_total Upstream calls by operation and outcome.",
+                  f"# TYPE {prefix}_upstream_calls_total counter"]
+        for (operation, outcome), count in sorted(self.calls().items()):
+            lines.append(f'{prefix}_upstream_calls_total{{operation="{operation}",outcome="{outcome}"}} {count}')
+
+        lines += [f"# HELP {prefix}_symbol_errors_total Quotes that came back with an error, per symbol.",
+                  f"# TYPE {prefix}_symbol_errors_total counter"]
+        for (kind, symbol, error), count in sorted(self.errors().items()):
+            lines.append(f'{prefix}_symbol_errors_total{{kind="{kind}",symbol="{self._escape(symbol)}",'
+                         f'error="{error}"}} {count}')
+
+        for name, metric_type, help_text, samples in gauges:
+            lines += [f"# HELP {prefix}_{name} {help_text}", f"# TYPE {prefix}_{name} {metric_type}"]
+            for labels, value in samples:
+                label_text = ",".join(f'{key}="{self._escape(str(label))}"' for key, label in sorted(labels.items()))
+                lines.append(f"{prefix}_{name}{{{label_text}}} {float(value)!r}" if label_text
+                             else f"{prefix}_{name} {float(value)!r}")
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _escape(value):
+        # Symbols come from the request path, so they may hold characters with a meaning in the format
+        return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
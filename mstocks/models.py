@@ -0,0 +1,129 @@
+from .executor import FetchTimeout
+from .upstream import CircuitOpenError
+
+
+class Position:
+    """What the configured investment lots of one symbol are worth at a given price."""
+
+    __slots__ = ('earnings', 'invested', 'percent', 'average_price', 'quantity')
+
+    def __init__(self, earnings=0.0, invested=0.0, percent=0.0, average_price=0.0, quantity=0.0):
+        self.earnings = earnings
+        self.invested = invested
+        self.percent = percent
+        self.average_price = average_price
+        self.quantity = quantity
+
+    def __iter__(self):
+        # Unpacks like the (earnings, invested, percent, average_price, quantity) tuple it replaced
+        return iter((self.earnings, self.invested, self.percent, self.average_price, self.quantity))
+
+    def __eq__(self, other):
+        if isinstance(other, Position):
+            other = tuple(other)
+        return tuple(self) == other
+
+    def __repr__(self):
+        return "Position(earnings={}, invested={}, percent={}, average_price={}, quantity={})".format(*self)
+
+
+class Quote:
+    """
+    One symbol's latest prices as raw numbers, shared by the stock and crypto managers.
+
+    Managers build quotes once per fetch; turning them into console rows or json happens at the
+    edges (StocksManager.quote_row/quote_json and the crypto equivalents). A failed fetch is a
+    Quote with an error code and no prices, so every symbol keeps its place in the table.
+    """
+
+    __slots__ = ('symbol', 'currency', 'price', 'previous_close', 'name', 'converted_price',
+                 'converted_currency', 'position', 'error', 'fetched_at')
+
+    # Error codes
+    TIMED_OUT = "timed_out"
+    NOT_FOUND = "not_found"
+    INVALID = "invalid"
+    FAILED = "failed"
+    UNAVAILABLE = "unavailable"
+
+    # Errors that say nothing about the symbol, so the last good quote is still worth serving
+    TRANSIENT = (TIMED_OUT, FAILED, UNAVAILABLE)
+
+    MESSAGES = {
+        TIMED_OUT: "Timed out",
+        NOT_FOUND: "Not found",
+        INVALID: "Invalid Symbol or Data Not Found",
+        FAILED: "Error Fetching Data",
+        UNAVAILABLE: "Upstream paused",
+    }
+
+    def __init__(self, symbol, currency=None, price=None, previous_close=None, name=None, converted_price=None,
+                 converted_currency=None, position=None, error=None, fetched_at=None):
+        """
+        :param symbol: Ticker symbol.
+        :param currency: Currency the prices are quoted in.
+        :param price: Last close, None when no bar is available.
+        :param previous_close: Close before the last one, None when only one bar is available.
+        :param name: Company name, for stocks.
+        :param converted_price: Price in the display currency, for crypto. None when no FX rate was available.
+        :param converted_currency: The display currency of converted_price.
+        :param position: Position of the configured investments at the price.
+        :param error: One of the error codes when the fetch failed.
+        :param fetched_at: Epoch seconds of the fetch.
+        """
+        self.symbol = symbol
+        self.currency = currency
+        self.price = price
+        self.previous_close = previous_close
+        self.name = name
+        self.converted_price = converted_price
+        self.converted_currency = converted_currency
+        self.position = position
+        self.error = error
+        self.fetched_at = fetched_at
+
+    @classmethod
+    def failed(cls, symbol, error, fetched_at=None):
+        """Return the error Quote for a fetch that raised error."""
+        if isinstance(error, FetchTimeout):
+            code = cls.TIMED_OUT
+        elif isinstance(error, CircuitOpenError):
+            code = cls.UNAVAILABLE
+        elif isinstance(error, IndexError):
+            code = cls.NOT_FOUND
+        elif isinstance(error, ValueError):
+            code = cls.INVALID
+        else:
+            code = cls.FAILED
+        return cls(symbol, error=code, fetched_at=fetched_at)
+
+    @property
+    def change(self):
+        if self.price is None or self.previous_close is None:
+            return None
+        return self.price - self.previous_close
+
+    @property
+    def percent_change(self):
+        change = self.change
+        return None if change is None else (change / self.previous_close) * 100
+
+    @property
+    def error_message(self):
+        return self.MESSAGES.get(self.error, self.MESSAGES[self.FAILED]) if self.error else None
+
+    def as_record(self):
+        """Return every field as plain json values, for SnapshotStore; from_record reads it back."""
+        record = {name: getattr(self, name) for name in self.__slots__}
+        record['position'] = list(self.position) if self.position is not None else None
+        return record
+
+    @classmethod
+    def from_record(cls, record):
+        position = record.get('position')
+        return cls(**dict(record, position=Position(*position) if position is not None else None))
+
+    def __repr__(self):
+        if self.error:
+            return f"Quote({self.symbol!r}, error={self.error!r})"
+        return f"Quote({self.symbol!r}, price={self.price!r}, previous_close={self.previous_close!r})"
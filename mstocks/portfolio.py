@@ -0,0 +1,113 @@
+import numpy as np
+from .models import Position
+
+
+class Portfolio:
+    """
+    All investment lots of one asset class, loaded once into NumPy arrays.
+
+    Lots are grouped by symbol so a single position is a contiguous slice and a whole portfolio
+    can be valued in one pass. Every position follows the same rules for stocks and crypto:
+    invested = sum(buy_price * quantity + fee), earnings = sum((price - buy_price) * quantity),
+    percent = earnings / invested * 100 and average price = invested / quantity.
+    """
+
+    def __init__(self, investments):
+        """
+        :param investments: {symbol: [{"buy_price": ..., "quantity": ..., "fee": ...}, ...]}
+        """
+        investments = {symbol: lots for symbol, lots in investments.items() if isinstance(lots, list)}
+        self.symbols = sorted(investments)
+        self._index = {symbol: i for i, symbol in enumerate(self.symbols)}
+
+        lots = [lot for symbol in self.symbols for lot in investments[symbol]]
+        counts = np.array([len(investments[symbol]) for symbol in self.symbols], dtype=np.int64)
+        self._offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        self.lot_symbol = np.repeat(np.arange(len(self.symbols), dtype=np.int64), counts)
+        self.buy_price = np.array([float(lot.get('buy_price', 0)) for lot in lots], dtype=np.float64)
+        self.quantity = np.array([float(lot.get('quantity', 1)) for lot in lots], dtype=np.float64)
+        self.fee = np.array([float(lot.get('fee', 0)) for lot in lots], dtype=np.float64)
+
+        size = len(self.symbols)
+        # bincount returns integers when there are no lots at all, so the sums are cast to float
+        self.total_quantity = np.bincount(self.lot_symbol, weights=self.quantity, minlength=size).astype(np.float64)
+        self.invested = np.bincount(self.lot_symbol, weights=self.buy_price * self.quantity + self.fee,
+                                    minlength=size).astype(np.float64)
+        self.average_price = self._ratio(self.invested, self.total_quantity)
+
+    @classmethod
+    def from_config(cls, config, kind):
+        """
+        Build the portfolio of one asset class ("stocks" or "cryptos") from the `investments` config.
+        Lots listed directly under `investments` by symbol, the older layout, count as stocks.
+        """
+        investments = config.get('investments', {})
+        if not isinstance(investments, dict):
+            return cls({})
+        lots = investments.get(kind)
+        if lots is None and kind == "stocks":
+            lots = {symbol: value for symbol, value in investments.items() if symbol not in ("stocks", "cryptos")}
+        return cls(lots if isinstance(lots, dict) else {})
+
+    @staticmethod
+    def _ratio(numerator, denominator):
+        return np.divide(numerator, denominator, out=np.zeros(len(numerator)), where=denominator > 0)
+
+    def __len__(self):
+        return len(self.buy_price)
+
+    def position(self, symbol, current_price):
+        """
+        Value one position at current_price.
+
+        :return: Position, all zero when there are no lots.
+        """
+        i = self._index.get(symbol)
+        if i is None:
+            return Position()
+        start, end = self._offsets[i], self._offsets[i + 1]
+        earnings = float(np.sum((current_price - self.buy_price[start:end]) * self.quantity[start:end]))
+        invested = float(self.invested[i])
+        percent = (earnings / invested) * 100 if invested > 0 else 0.0
+        return Position(earnings, invested, percent, float(self.average_price[i]), float(self.total_quantity[i]))
+
+    def positions(self, prices):
+        """
+        Value the positions of every symbol in prices with a single valuate pass.
+
+        :param prices: {symbol: price}, None when the price is unknown.
+        :return: {symbol: Position}. Symbols without lots get an all-zero Position, and symbols
+                 without a price have None earnings and percent.
+        """
+        valuation = self.valuate({symbol: price for symbol, price in prices.items() if price is not None})
+        earnings, percent = valuation["earnings"], valuation["percent"]
+        positions = {}
+        for symbol in prices:
+            i = self._index.get(symbol)
+            if i is None:
+                positions[symbol] = Position() if prices[symbol] is not None else Position(None, percent=None)
+                continue
+            priced = not np.isnan(earnings[i])
+            positions[symbol] = Position(float(earnings[i]) if priced else None, float(self.invested[i]),
+                                         float(percent[i]) if priced else None, float(self.average_price[i]),
+                                         float(self.total_quantity[i]))
+        return positions
+
+    def valuate(self, prices):
+        """
+        Value every position in one vectorized pass.
+
+        :param prices: Either {symbol: price} or an array aligned with self.symbols. Missing prices are NaN.
+        :return: Dict of arrays aligned with self.symbols: earnings, invested, percent, average_price, quantity.
+        """
+        if isinstance(prices, dict):
+            prices = np.array([prices.get(symbol, np.nan) for symbol in self.symbols], dtype=np.float64)
+        lot_earnings = (prices[self.lot_symbol] - self.buy_price) * self.quantity
+        earnings = np.bincount(self.lot_symbol, weights=lot_earnings, minlength=len(self.symbols)).astype(np.float64)
+        return {
+            "earnings": earnings,
+            "invested": self.invested,
+            "percent": self._ratio(earnings, self.invested) * 100,
+            "average_price": self.average_price,
+            "quantity": self.total_quantity,
+        }
@@ -0,0 +1,209 @@
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import time
+
+from werkzeug.serving import make_server
+
+from . import endpoints
+from .config import Config
+from .crypto import CryptoManager
+from .endpoints import ApiServices, SharedApiServices, app
+from .shared_snapshot import SharedSnapshot
+from .stocks import StocksManager
+from .upstream import Upstream
+from .utils import Utils
+
+
+class PreforkServer:
+    """
+    Production mode of the Flask API: one refresher process and several pre-forked WSGI workers.
+
+    The parent binds the listening socket and forks the children, which all accept on it. The
+    refresher process keeps the watchlists fresh like the single-process server does and publishes
+    every snapshot to a SharedSnapshot, with the metrics text. Each worker is a threaded Werkzeug
+    server whose SharedApiServices answer from that snapshot, so adding workers adds read throughput
+    without adding upstream traffic or copies of the quotes.
+
+    Symbols outside the watchlists are fetched on demand by the workers. The configured upstream
+    rate and burst are split so that all children together stay within them: the refresher process
+    gets ON_DEMAND_SHARE less, and the workers share that part equally. The parent restarts children
+    that die and stops them all on SIGTERM or SIGINT.
+
+    Children are forked, so this needs a POSIX system; run() falls back to one threaded server elsewhere.
+    """
+
+    # Seconds between checks for dead children
+    CHECK_INTERVAL = 1.0
+    # Seconds between republishes of the metrics, so the snapshot ages on /metrics stay current
+    METRICS_INTERVAL = 5.0
+    # Part of the upstream rate and burst the workers share for symbols outside the watchlists
+    ON_DEMAND_SHARE = 0.5
+    # Config keys of the upstream budget
+    LIMIT_KEYS = ('upstream_rate', 'upstream_burst')
+
+    def __init__(self, config, host=None, port=5001, workers=None, services_factory=ApiServices):
+        """
+        :param config: Config or dict of the refresher and the workers.
+        :param host: Address to listen on, the `api_host` config ("127.0.0.1") by default.
+        :param port: Port to listen on; 0 picks a free one, see self.port.
+        :param workers: Worker processes, the `api_workers` config (one per CPU) by default.
+        :param services_factory: Builds the ApiServices of the refresher process from the config.
+        """
+        self.config = config
+        self.host = host or config.get('api_host', "127.0.0.1")
+        self.port = port
+        self.workers = max(1, Utils.as_int(workers if workers is not None else config.get('api_workers', os.cpu_count()),
+                                           os.cpu_count() or 1))
+        self.services_factory = services_factory
+        # Forked, so the children inherit the socket, the shared generation counter and the config
+        self._context = multiprocessing.get_context("fork")
+        self.shared = None
+        self.socket = None
+        self._refresher = None
+        self._workers = []
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Bind the socket and start the children, without waiting for them to serve."""
+        self._stop.clear()
+        family = socket.AF_INET6 if ":" in self.host else socket.AF_INET
+        self.socket = socket.socket(family, socket.SOCK_STREAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.socket.bind((self.host, self.port))
+        self.socket.listen(128)
+        self.port = self.socket.getsockname()[1]
+        self.shared = SharedSnapshot()
+        with self._lock:
+            self._refresher = self._spawn(self._run_refresher, "mstocks-refresher")
+            self._workers = [self._spawn(self._run_worker, f"mstocks-worker-{index}") for index in range(self.workers)]
+
+    def serve_forever(self):
+        """Start, then supervise the children until SIGTERM or SIGINT."""
+        self.start()
+        handlers = {}
+        if threading.current_thread() is threading.main_thread():
+            for signum in (signal.SIGTERM, signal.SIGINT):
+                handlers[signum] = signal.signal(signum, lambda *_: self._stop.set())
+        print(f"Serving on http://{self.host}:{self.port} with {self.workers} workers")
+        try:
+            while not self._stop.wait(self.CHECK_INTERVAL):
+                self.check()
+        finally:
+            for signum, handler in handlers.items():
+                signal.signal(signum, handler)
+            self.stop()
+
+    def check(self):
+        """Replace the children that died."""
+        with self._lock:
+            if self._stop.is_set():
+                return
+            if not self._refresher.is_alive():
+                self._refresher = self._spawn(self._run_refresher, "mstocks-refresher")
+            for index, worker in enumerate(self._workers):
+                if not worker.is_alive():
+                    self._workers[index] = self._spawn(self._run_worker, f"mstocks-worker-{index}")
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        with self._lock:
+            children = [self._refresher] + self._workers if self._refresher is not None else []
+            for child in children:
+                if child.is_alive():
+                    child.terminate()
+            for child in children:
+                child.join(timeout)
+                if child.is_alive():
+                    child.kill()
+                    child.join()
+            self._refresher, self._workers = None, []
+        if self.socket is not None:
+            self.socket.close()
+            self.socket = None
+        if self.shared is not None:
+            self.shared.close()
+            self.shared = None
+
+    def _spawn(self, target, name):
+        # Not daemonic, so a refresher with refresh_processes above 1 may start its own workers
+        process = self._context.Process(target=target, name=name)
+        process.start()
+        return process
+
+    @staticmethod
+    def supported():
+        """Whether children can be forked here, which the shared socket and generation counter rely on."""
+        return "fork" in multiprocessing.get_all_start_methods()
+
+    def _run_refresher(self):
+        # The parent stops the children, so Ctrl+C in a terminal does not interrupt them halfway
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        self.socket.close()
+        services = self.services_factory(self._child_config(self.refresher_config()))
+        shared = self.shared
+
+        def publish(kind, snapshot):
+            shared.publish(kind, snapshot, services.metrics_text())
+
+        services.refresher.add_listener(publish)
+        # Snapshots restored from the snapshot_store, or refreshed before the listener was added
+        for kind in ("stocks", "crypto"):
+            snapshot = services.refresher.snapshot(kind)
+            if snapshot is not None:
+                publish(kind, snapshot)
+        if isinstance(self.config, Config):
+            self.config.watch(Utils.as_float(self.config.get('config_watch_interval', 2), 2))
+        while True:
+            time.sleep(self.METRICS_INTERVAL)
+            shared.publish_metrics(services.metrics_text())
+
+    def refresher_config(self):
+        """Return the config of the refresher process: its share of the configured upstream rate and burst."""
+        return self._limited_config(1 - self.ON_DEMAND_SHARE)
+
+    def worker_config(self):
+        """Return the config of a worker: its share of the configured upstream rate and burst."""
+        return self._limited_config(self.ON_DEMAND_SHARE / self.workers)
+
+    def _limited_config(self, share):
+        data = self.config.config_data if hasattr(self.config, 'config_data') else self.config
+        config = dict(data)
+        # A rate of 0 is unlimited, and stays so
+        config['upstream_rate'] = Utils.as_float(data.get('upstream_rate', 5), 5) * share
+        config['upstream_burst'] = max(1.0, Utils.as_float(data.get('upstream_burst', 10), 10) * share)
+        return config
+
+    def _child_config(self, limited):
+        # In a forked child, so the limits only apply to this process; a Config keeps them over reloads
+        if isinstance(self.config, Config):
+            self.config.override({key: limited[key] for key in self.LIMIT_KEYS})
+            return self.config
+        return limited
+
+    def _run_worker(self):
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        config = self._child_config(self.worker_config())
+        upstream = Upstream.from_config(config)
+        endpoints._services = SharedApiServices(config, self.shared,
+                                                stocks_manager=StocksManager(config, upstream=upstream),
+                                                crypto_manager=CryptoManager(config, upstream=upstream))
+        if isinstance(self.config, Config):
+            # The routes read the watchlists from the config
+            self.config.watch(Utils.as_float(self.config.get('config_watch_interval', 2), 2))
+        server = make_server(self.host, self.port, app, threaded=True, fd=self.socket.fileno())
+        server.serve_forever()
+
+
+def run(config, host=None, port=5001, workers=None):
+    if not PreforkServer.supported():
+        # No fork, e.g. on Windows: one process with a thread per request, refreshing in the background
+        host = host or config.get('api_host', "127.0.0.1")
+        print(f"Serving on http://{host}:{port} in one process, fork is not available here")
+        endpoints.init_services(config)
+        make_server(host, port, app, threaded=True).serve_forever()
+        return
+    PreforkServer(config, host, port, workers).serve_forever()
@@ -0,0 +1,173 @@
+import cProfile
+import io
+import pstats
+import threading
+import time
+
+from .refresher import QuoteRefresher
+from .executor import FetchExecutor
+from .render import TerminalRenderer
+
+
+class RefreshProfiler:
+    """
+    Runs refresh cycles of a RunManager in the foreground and reports where their time went.
+
+    Every cycle fetches all symbols of the watchlists, as if each of them were due, then builds and
+    renders the console frame into a buffer. The time of every stage comes from the Metrics the
+    managers already record, with per-symbol attribution switched on. With a profile_path the cycles
+    also run under cProfile and the stats are written there, for snakeviz, gprof2dot or flameprof.
+    cProfile only follows the thread that enables it, so the fetch workers are restarted with a
+    profiler of their own, and their stats are merged with those of the refresh thread.
+    """
+
+    # Metrics stage -> column of the report
+    STAGES = (("history", "fetch"), ("info", "info"), ("fx", "fx"), ("earnings", "earnings"),
+              ("format", "format"), ("render", "render"))
+    # The fx table is fetched once for all symbols and a render pass draws them all, so neither is split per symbol
+    SYMBOL_STAGES = (("history", "fetch"), ("info", "info"), ("earnings", "earnings"), ("format", "format"))
+    REFRESHER_KEYS = ('refresh_rate', 'refresh_intervals', 'market_holidays', 'closed_market_refresh')
+
+    def __init__(self, run_manager, stock_symbols, crypto_symbols, cycles=3, profile_path=None, top=20):
+        """
+        :param run_manager: RunManager whose managers are profiled.
+        :param cycles: Refresh cycles to run.
+        :param profile_path: Where to write cProfile stats, none when not given.
+        :param top: Slowest symbols listed in the report.
+        """
+        self.run_manager = run_manager
+        self.stock_symbols = list(stock_symbols)
+        self.crypto_symbols = list(crypto_symbols)
+        self.cycles = max(1, int(cycles))
+        self.profile_path = profile_path
+        self.top = top
+        self.metrics = run_manager.metrics
+        self.cycle_times = []
+
+    def run(self):
+        """Run the cycles and return the report text."""
+        self.metrics.reset()
+        self.metrics.per_symbol = True
+        config = self.run_manager.config
+        # Without the snapshot_store setting, so a snapshot restored from the last run cannot stand in for a fetch
+        refresher_config = {key: config.get(key) for key in self.REFRESHER_KEYS if config.get(key) is not None}
+        refresher = QuoteRefresher(refresher_config, self.run_manager.stocks_manager, self.run_manager.crypto_manager,
+                                   self.stock_symbols, self.crypto_symbols, metrics=self.metrics)
+        renderer = TerminalRenderer(io.StringIO(), height=len(self.stock_symbols) + len(self.crypto_symbols) + 10)
+        profile = cProfile.Profile() if self.profile_path else None
+        threads = _ThreadProfiles(self._executors()) if profile is not None else None
+        try:
+            if threads is not None:
+                threads.install()
+            for _ in range(self.cycles):
+                started = time.perf_counter()
+                if profile is not None:
+                    profile.enable()
+                try:
+                    self._cycle(refresher, renderer)
+                finally:
+                    if profile is not None:
+                        profile.disable()
+                self.cycle_times.append(time.perf_counter() - started)
+        finally:
+            self.metrics.per_symbol = False
+            if threads is not None:
+                threads.uninstall()
+        if profile is not None:
+            threads.stats(profile).dump_stats(self.profile_path)
+        return self.report()
+
+    def _executors(self):
+        # The fetch pools of both managers, each once; managers built by hand may share one
+        executors = []
+        for manager in (self.run_manager.stocks_manager, self.run_manager.crypto_manager):
+            for executor in (getattr(manager, 'executor', None), getattr(getattr(manager, 'fetcher', None), 'executor', None)):
+                if isinstance(executor, FetchExecutor) and all(executor is not known for known in executors):
+                    executors.append(executor)
+        return executors
+
+    def _cycle(self, refresher, renderer):
+        for kind in ("stocks", "crypto"):
+            if refresher.jobs[kind].symbols:
+                refresher.refresh(kind, force=True)
+        with self.metrics.timer("render"):
+            renderer.render(self.run_manager._frame(renderer, refresher))
+
+    def report(self):
+        total = sum(self.cycle_times)
+        lines = [f"Profiled {len(self.cycle_times)} refresh cycles of {len(self.stock_symbols)} stocks and "
+                 f"{len(self.crypto_symbols)} cryptos in {total:.2f}s "
+                 f"({total / max(1, len(self.cycle_times)):.2f}s per cycle)", ""]
+
+        rows = []
+        for stage, label in self.STAGES:
+            histogram = self.metrics.stage(stage)
+            mean = histogram.sum / histogram.count if histogram.count else 0.0
+            rows.append([label, str(histogram.count), f"{histogram.sum:.3f}", f"{mean * 1000:.1f}",
+                         f"{histogram.quantile(0.95) * 1000:.1f}", f"{histogram.sum / total * 100:.1f}%" if total else "-"])
+        lines += self._table(["Stage", "Calls", "Total s", "Mean ms", "p95 ms", "Of wall"], rows)
+        lines.append("Stages run side by side on the fetch workers, so their totals may add up to more than the wall time.")
+
+        symbol_times = self.metrics.symbol_times()
+        if symbol_times:
+            slowest = sorted(symbol_times.items(), key=lambda item: (-sum(item[1].values()), item[0]))
+            lines += ["", "Slowest symbols (seconds over all cycles; batched stages are split evenly):"]
+            rows = [[symbol, f"{sum(stages.values()):.3f}"] + [f"{stages.get(stage, 0.0):.3f}" for stage, _ in self.SYMBOL_STAGES]
+                    for symbol, stages in slowest[:self.top]]
+            lines += self._table(["Symbol", "Total"] + [label for _, label in self.SYMBOL_STAGES], rows)
+            if len(slowest) > self.top:
+                lines.append(f"... and {len(slowest) - self.top} more")
+
+        errors = self.metrics.top_errors(limit=self.top)
+        if errors:
+            lines += ["", "Failed quotes: " + ", ".join(f"{symbol} x{count}" for symbol, count in errors)]
+        if self.profile_path:
+            lines += ["", f"cProfile stats written to {self.profile_path}"]
+        return "\n".join(lines)
+
+    @staticmethod
+    def _table(headers, rows):
+        widths = [max(len(str(cell)) for cell in column) for column in zip(headers, *rows)]
+        # Names left aligned, numbers right aligned
+        line = lambda cells: "  ".join(cell.ljust(width) if i == 0 else cell.rjust(width)
+                                       for i, (cell, width) in enumerate(zip(cells, widths)))
+        return [line(headers), line(["-" * width for width in widths])] + [line(row) for row in rows]
+
+
+class _ThreadProfiles:
+    """
+    A cProfile.Profile for every thread started while installed, e.g. the FetchExecutor workers.
+
+    install() stops the running workers of the executors, so the pools start new threads, which
+    threading.setprofile hands to _start before they run anything. uninstall() waits for those
+    threads to exit, so their profiles are complete when stats() merges them.
+    """
+
+    def __init__(self, executors):
+        self.executors = executors
+        self.profiles = []
+        self._lock = threading.Lock()
+
+    def install(self):
+        for executor in self.executors:
+            executor.shutdown(wait=True)
+        threading.setprofile(self._start)
+
+    def uninstall(self):
+        threading.setprofile(None)
+        for executor in self.executors:
+            executor.shutdown(wait=True)
+
+    def _start(self, frame, event, arg):
+        # Called on the first event of a new thread; the profile it enables replaces this hook
+        profile = cProfile.Profile()
+        with self._lock:
+            self.profiles.append(profile)
+        profile.enable()
+
+    def stats(self, profile):
+        """Return the pstats.Stats of profile with those of every profiled thread added."""
+        stats = pstats.Stats(profile)
+        for thread_profile in self.profiles:
+            stats.add(thread_profile)
+        return stats
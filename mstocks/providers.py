@@ -0,0 +1,260 @@
+import ast
+import json
+import logging
+import os
+import random
+import threading
+import time
+
+import pandas as pd
+import requests
+import yfinance as yf
+
+from .metrics import Metrics
+from .upstream import CircuitOpenError, UpstreamError
+
+
+class QuoteProvider:
+    """
+    Where the managers get market data from: daily bars, company names and exchange rates.
+
+    Subclasses implement _download, _company_name and _fx_rates. The public methods send every call
+    through the Upstream (rate limit, retries, circuit breaker) when one is given, so any provider
+    sees the same pipeline as live Yahoo, and record its latency and outcome in Metrics as the
+    "history", "info" and "fx" stages.
+    """
+
+    def __init__(self, upstream=None, metrics=None):
+        self.upstream = upstream
+        self.metrics = metrics or Metrics.shared()
+
+    def download(self, symbols, period="2d", start=None):
+        """
+        Return the daily bars of symbols as one frame with a (symbol, column) MultiIndex, the shape
+        of yf.download(group_by="ticker"). Takes either a relative period or a "YYYY-MM-DD" start.
+        """
+        # yfinance takes either a relative period or an absolute start date
+        window = {'start': start} if start else {'period': period}
+        symbols = list(symbols)
+        return self._call("history", symbols, self._download, symbols, window)
+
+    def company_name(self, symbol):
+        """Return the long name of symbol, 'N/A' when upstream does not know it."""
+        return self._call("info", (symbol,), self._company_name, symbol)
+
+    def fx_rates(self, base):
+        """Return {currency: rate} for one unit of base."""
+        return self._call("fx", (), self._fx_rates, base)
+
+    def _call(self, operation, symbols, func, *args):
+        # Timed as a whole, so rate limiter waits and retries count towards the stage
+        with self.metrics.timer(operation, symbols):
+            try:
+                result = func(*args) if self.upstream is None else self.upstream.call(func, *args)
+            except CircuitOpenError:
+                self.metrics.count_call(operation, "rejected")
+                raise
+            except Exception:
+                self.metrics.count_call(operation, "error")
+                raise
+        self.metrics.count_call(operation, "ok")
+        return result
+
+    def _download(self, symbols, window):
+        raise NotImplementedError
+
+    def _company_name(self, symbol):
+        raise NotImplementedError
+
+    def _fx_rates(self, base):
+        raise NotImplementedError
+
+
+class YFinanceProvider(QuoteProvider):
+    """Live data: bars and names from Yahoo Finance through yfinance, exchange rates from exchangerate-api."""
+
+    FX_URL = "https://api.exchangerate-api.com/v4/latest/{base}"
+
+    def __init__(self, upstream=None, fx_url=FX_URL, session=None, timeout=10, metrics=None):
+        super().__init__(upstream, metrics)
+        self.fx_url = fx_url
+        self.session = session or requests.Session()
+        self.timeout = timeout
+
+    def _download(self, symbols, window):
+        # yf.download does not raise for failed tickers: it logs them and returns empty frames
+        errors = _DownloadErrors()
+        logger = logging.getLogger('yfinance')
+        logger.addHandler(errors)
+        try:
+            frame = yf.download(symbols, group_by="ticker", auto_adjust=True,
+                                multi_level_index=True, progress=False, threads=False, **window)
+        finally:
+            logger.removeHandler(errors)
+        failed = errors.transient()
+        if frame is not None and isinstance(frame.columns, pd.MultiIndex):
+            # Every requested ticker comes back, if only as an empty frame, unless the download broke off
+            returned = set(frame.columns.get_level_values(0))
+            failed.update((symbol, "missing from the download") for symbol in symbols if symbol.upper() not in returned)
+        if failed:
+            # Raised, so the Upstream retries the batch and counts the failure towards its breaker
+            raise UpstreamError("; ".join(f"{symbol}: {error}" for symbol, error in sorted(failed.items())))
+        return frame
+
+    def _company_name(self, symbol):
+        # stock.info is a heavy scrape, so callers cache it
+        return yf.Ticker(symbol).info.get('longName', 'N/A')
+
+    def _fx_rates(self, base):
+        response = self.session.get(self.fx_url.format(base=base), timeout=self.timeout)
+        response.raise_for_status()
+        return response.json().get('rates')
+
+
+class _DownloadErrors(logging.Handler):
+    """
+    Collects the per-ticker errors yf.download logs, e.g. "['AAPL', 'MSFT']: YFRateLimitError(...)",
+    from the calling thread only, so concurrent downloads each see their own.
+    """
+
+    # Errors about the symbol itself; it stays empty and the fetch is not retried
+    PERMANENT = ("delisted", "YFPricesMissingError", "YFTzMissingError", "YFInvalidPeriodError")
+
+    def __init__(self):
+        super().__init__(logging.ERROR)
+        self.thread = threading.get_ident()
+        self.errors = {}
+
+    def emit(self, record):
+        if record.thread != self.thread:
+            return
+        symbols, separator, error = record.getMessage().partition("]: ")
+        if not separator or not symbols.startswith("["):
+            return
+        try:
+            symbols = ast.literal_eval(symbols + "]")
+        except (ValueError, SyntaxError):
+            return
+        for symbol in symbols:
+            self.errors[symbol] = error
+
+    def transient(self):
+        """Return {symbol: error} of the errors that may go away when the download is retried."""
+        return {symbol: error for symbol, error in self.errors.items()
+                if not any(marker in error for marker in self.PERMANENT)}
+
+
+class ReplayProvider(QuoteProvider):
+    """
+    Deterministic offline provider serving recorded bars, names and rates, for tests and benchmarks.
+
+    Data comes from memory or from a directory written by record(): `bars/<symbol>.csv` with a
+    Date index and Open/High/Low/Close/Volume columns, `names.json` ({symbol: name}) and
+    `fx.json` ({base: {currency: rate}}). Every call can be slowed down by `latency` seconds (a
+    number, or a (low, high) range drawn per call) and fail with ConnectionError at `error_rate`,
+    or always for the symbols in `failing`. Random draws come from a generator seeded with `seed`,
+    so a run can be repeated exactly.
+    """
+
+    COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+    def __init__(self, bars=None, names=None, rates=None, latency=0.0, error_rate=0.0, failing=(), seed=0,
+                 upstream=None, sleep=time.sleep, metrics=None):
+        """
+        :param bars: {symbol: DataFrame} with a DatetimeIndex and at least a Close column.
+        :param names: {symbol: company name}.
+        :param rates: {base: {currency: rate}}.
+        """
+        super().__init__(upstream, metrics)
+        self.bars = bars or {}
+        self.names = names or {}
+        self.rates = rates or {}
+        self.latency = latency
+        self.error_rate = error_rate
+        self.failing = frozenset(failing)
+        self.sleep = sleep
+        self._random = random.Random(seed)
+        self.calls = 0
+
+    @classmethod
+    def from_directory(cls, path, **kwargs):
+        bars = {}
+        bars_path = os.path.join(path, "bars")
+        if os.path.isdir(bars_path):
+            for filename in sorted(os.listdir(bars_path)):
+                if filename.endswith(".csv"):
+                    bars[filename[:-4]] = pd.read_csv(os.path.join(bars_path, filename), index_col=0, parse_dates=True)
+        return cls(bars, cls._read_json(os.path.join(path, "names.json")),
+                   cls._read_json(os.path.join(path, "fx.json")), **kwargs)
+
+    @staticmethod
+    def _read_json(path):
+        try:
+            with open(path, 'r') as file:
+                return json.load(file)
+        except OSError:
+            return {}
+
+    @staticmethod
+    def record(path, symbols, provider=None, period="1mo", fx_bases=("USD",)):
+        """Download symbols and rates from provider, the live one by default, into a directory for replay."""
+        provider = provider or YFinanceProvider()
+        os.makedirs(os.path.join(path, "bars"), exist_ok=True)
+        frame = provider.download(symbols, period=period)
+        names = {}
+        for symbol in symbols:
+            if isinstance(frame.columns, pd.MultiIndex) and symbol in frame.columns.get_level_values(0):
+                frame[symbol].dropna(how='all').to_csv(os.path.join(path, "bars", f"{symbol}.csv"))
+            names[symbol] = provider.company_name(symbol)
+        with open(os.path.join(path, "names.json"), 'w') as file:
+            json.dump(names, file, indent=4, sort_keys=True)
+        with open(os.path.join(path, "fx.json"), 'w') as file:
+            json.dump({base: provider.fx_rates(base) for base in fx_bases}, file, indent=4, sort_keys=True)
+
+    def _delay(self, symbols):
+        self.calls += 1
+        latency = self.latency
+        if isinstance(latency, (tuple, list)):
+            latency = self._random.uniform(*latency)
+        if latency:
+            self.sleep(latency)
+        if any(symbol in self.failing for symbol in symbols) or \
+                (self.error_rate and self._random.random() < self.error_rate):
+            raise ConnectionError(f"Injected failure for {', '.join(symbols)}")
+
+    def _download(self, symbols, window):
+        self._delay(symbols)
+        frames = {}
+        for symbol in symbols:
+            bars = self.bars.get(symbol)
+            if bars is None or bars.empty:
+                continue
+            if 'start' in window:
+                bars = bars[bars.index >= pd.Timestamp(window['start'])]
+            else:
+                bars = bars.iloc[-self._period_bars(window['period']):]
+            frames[symbol] = bars.reindex(columns=[column for column in self.COLUMNS if column in bars.columns])
+        if not frames:
+            return pd.DataFrame()
+        # Like yf.download, symbols share one date index and missing days are NaN
+        return pd.concat(frames, axis=1, sort=True)
+
+    @staticmethod
+    def _period_bars(period):
+        # "2d" -> 2 bars, "1mo" -> 21, "1y" -> 252; trading days, since recordings only hold those
+        number = int(''.join(ch for ch in period if ch.isdigit()) or 1)
+        if period.endswith("mo"):
+            return number * 21
+        if period.endswith("y"):
+            return number * 252
+        if period.endswith("wk"):
+            return number * 5
+        return number
+
+    def _company_name(self, symbol):
+        self._delay([symbol])
+        return self.names.get(symbol, 'N/A')
+
+    def _fx_rates(self, base):
+        self._delay([])
+        return self.rates.get(base)
@@ -0,0 +1,294 @@
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from .utils import Utils
+from .market import Market
+from .scheduler import RefreshScheduler
+from .snapshot_store import SnapshotStore
+from .models import Quote
+from .metrics import Metrics
+
+
+class Snapshot:
+    """
+    Immutable result of one refresh of an asset class.
+
+    Holds the Quotes only; the console rows and json rows are formatted from them on first use, by
+    the manager that fetched them, and then kept for every later reader of this snapshot. A stale
+    snapshot holds quotes restored from the SnapshotStore and not refreshed since the process started.
+    """
+
+    def __init__(self, symbols, quotes, refreshed_at, symbol_refreshed_at=None, formatter=None, stale=False,
+                 metrics=None, stale_symbols=None):
+        """
+        :param refreshed_at: Fetch time of the oldest quote, which the age is counted from.
+        :param stale: Whether every quote was restored, when stale_symbols is not given.
+        :param stale_symbols: The symbols whose quotes were restored and not fetched again since.
+        """
+        self.symbols = tuple(symbols)
+        self.quotes = quotes
+        self.refreshed_at = refreshed_at
+        self.formatter = formatter
+        if stale_symbols is None:
+            stale_symbols = self.symbols if stale else ()
+        self.stale_symbols = frozenset(stale_symbols)
+        self.stale = bool(self.stale_symbols)
+        self.metrics = metrics or Metrics.shared()
+        # Closed-market symbols are not refetched every tick, so each one keeps its own fetch time
+        self.symbol_refreshed_at = symbol_refreshed_at or {symbol: refreshed_at for symbol in self.symbols}
+        self._rows = None
+        self._json_rows = None
+        self._by_symbol = None
+
+    @property
+    def rows(self):
+        if self._rows is None:
+            with self.metrics.timer("format", self.symbols):
+                self._rows = [self.formatter.quote_row(quote) for quote in self.quotes]
+        return self._rows
+
+    @property
+    def json_rows(self):
+        if self._json_rows is None:
+            with self.metrics.timer("format", self.symbols):
+                self._json_rows = [self.formatter.quote_json(quote) for quote in self.quotes]
+        return self._json_rows
+
+    @property
+    def by_symbol(self):
+        if self._by_symbol is None:
+            self._by_symbol = dict(zip(self.symbols, self.json_rows))
+        return self._by_symbol
+
+    @property
+    def age(self):
+        """Seconds since its oldest quote was fetched."""
+        return max(0.0, time.time() - self.refreshed_at)
+
+    @property
+    def refreshed_label(self):
+        return datetime.fromtimestamp(self.refreshed_at).strftime('%Y-%m-%d %H:%M:%S')
+
+
+class _Job:
+    def __init__(self, manager, symbols, interval, always_open=False):
+        self.manager = manager
+        self.symbols = list(symbols)
+        self.interval = interval
+        self.always_open = always_open
+        self.last_error = None
+        self.force = False
+        self.wake = threading.Event()
+        self.last_duration = None
+
+
+class QuoteRefresher:
+    """
+    Keeps the latest snapshot of every tracked asset class up to date on background threads.
+
+    Each asset class refreshes on its own interval, taken from the `refresh_intervals` config
+    ({"stocks": 60, "crypto": 30}) and defaulting to `refresh_rate`. Readers only pick up the
+    current Snapshot, so they never wait on the network once the first refresh is done.
+
+    Stock symbols go through a RefreshScheduler, so symbols whose market is closed are skipped and
+    carried over from the previous snapshot. Crypto trades around the clock and is always fetched.
+
+    With a SnapshotStore (the `snapshot_store` config, e.g. "data/snapshot.db") every snapshot is
+    saved, and the last one saved is served as a stale snapshot right after a restart, until the
+    first refresh replaces it.
+
+    Every refresh that fetched something is timed as the "refresh_<kind>" stage of Metrics, and
+    last_duration keeps the latest one per asset class.
+    """
+
+    def __init__(self, config, stocks_manager, crypto_manager, stock_symbols, crypto_symbols, clock=time.time,
+                 scheduler=None, store=None, metrics=None):
+        self.clock = clock
+        self.metrics = metrics or Metrics.shared()
+        default_interval = Utils.as_float(config.get('refresh_rate', 60), 60)
+        intervals = config.get('refresh_intervals', {})
+        intervals = intervals if isinstance(intervals, dict) else {}
+        self.jobs = {
+            "stocks": _Job(stocks_manager, stock_symbols,
+                           Utils.as_float(intervals.get('stocks'), default_interval)),
+            "crypto": _Job(crypto_manager, crypto_symbols,
+                           Utils.as_float(intervals.get('crypto'), default_interval), always_open=True),
+        }
+        if scheduler is None:
+            holidays = config.get('market_holidays', {})
+            scheduler = RefreshScheduler(Market(Utils(), holidays if isinstance(holidays, dict) else {}),
+                                         closed_interval=Utils.as_float(config.get('closed_market_refresh', 3600), 3600),
+                                         clock=clock)
+        self.scheduler = scheduler
+        self._snapshots = {}
+        self._version = 0
+        self._condition = threading.Condition()
+        self._stop = threading.Event()
+        self._threads = []
+        self._running = None
+        self._listeners = []
+        store_path = config.get('snapshot_store', None)
+        if store is None and isinstance(store_path, str):
+            try:
+                store = SnapshotStore(store_path)
+            except (OSError, sqlite3.Error):
+                # Without a usable file the refresher just starts cold
+                store = None
+        self.store = store
+        if store is not None:
+            self._restore()
+
+    def _restore(self):
+        for kind, job in self.jobs.items():
+            stored = self.store.load(kind)
+            if stored is None or not job.symbols:
+                continue
+            symbols, quotes, refreshed_at, symbol_refreshed_at = stored
+            # Only a snapshot that covers the whole watchlist can answer for it
+            by_symbol = dict(zip(symbols, quotes))
+            if any(symbol not in by_symbol for symbol in job.symbols):
+                continue
+            self._snapshots[kind] = Snapshot(job.symbols, [by_symbol[symbol] for symbol in job.symbols], refreshed_at,
+                                             {symbol: symbol_refreshed_at[symbol] for symbol in job.symbols},
+                                             formatter=job.manager, stale=True, metrics=self.metrics)
+
+    def add_listener(self, listener):
+        """Call listener(kind, snapshot) on the refresh thread after every new snapshot of any asset class."""
+        self._listeners.append(listener)
+
+    @property
+    def version(self):
+        """Counter bumped on every new snapshot, for readers that redraw on change."""
+        return self._version
+
+    def start(self):
+        self._stop.clear()
+        self._running = set()
+        for kind, job in self.jobs.items():
+            if job.symbols:
+                self._start_thread(kind)
+
+    def _start_thread(self, kind):
+        thread = threading.Thread(target=self._run, args=(kind,), name=f"mstocks-refresh-{kind}", daemon=True)
+        thread.start()
+        self._threads.append(thread)
+        self._running.add(kind)
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        for job in self.jobs.values():
+            job.wake.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        self._running = None
+
+    def _run(self, kind):
+        job = self.jobs[kind]
+        while not self._stop.is_set():
+            started = time.monotonic()
+            job.wake.clear()
+            force, job.force = job.force, False
+            self.refresh(kind, force=force)
+            job.wake.wait(max(0.0, job.interval - (time.monotonic() - started)))
+
+    def wake(self, kind=None, force=False):
+        """
+        Refresh kind, or every asset class, on its thread now instead of at the next interval.
+        With force every symbol is fetched again, e.g. after the investments changed.
+        """
+        for name, job in self.jobs.items():
+            if kind is None or name == kind:
+                job.force = job.force or force
+                job.wake.set()
+
+    def set_symbols(self, kind, symbols):
+        """Replace the tracked symbols of kind, e.g. after the watchlist in the config changed."""
+        job = self.jobs[kind]
+        job.symbols = list(symbols)
+        if job.symbols and self._running is not None and kind not in self._running and not self._stop.is_set():
+            # A watchlist that was empty at start has no thread yet
+            self._start_thread(kind)
+        self.wake(kind)
+
+    def refresh(self, kind, force=False):
+        """
+        Fetch the due symbols of one asset class and publish the merged result as its latest snapshot.
+        Returns the new Snapshot, or None when nothing was due or the fetch failed.
+        """
+        job = self.jobs[kind]
+        # The watchlist may be replaced while this runs, so one refresh works on one list
+        symbols = job.symbols
+        previous = self._snapshots.get(kind)
+        refreshed_at = previous.symbol_refreshed_at if previous is not None else {}
+        due = symbols if force else self.scheduler.due_symbols(symbols, refreshed_at, always_open=job.always_open)
+        # A watchlist that only lost symbols is republished without fetching anything
+        if not due and (previous is None or previous.symbols == tuple(symbols)):
+            return None
+        started = time.perf_counter()
+        try:
+            quotes = job.manager.fetch_quotes(";".join(due)) if due else []
+        except Exception as e:
+            # Keep serving the previous snapshot; its age tells clients how old it is
+            job.last_error = e
+            return None
+        finally:
+            if due:
+                job.last_duration = time.perf_counter() - started
+                self.metrics.observe(f"refresh_{kind}", job.last_duration)
+        job.last_error = None
+
+        now = self.clock()
+        quote_map = dict(zip(previous.symbols, previous.quotes)) if previous is not None else {}
+        symbol_refreshed_at = {symbol: refreshed_at[symbol] for symbol in symbols if symbol in refreshed_at}
+        for symbol, quote in zip(due, quotes):
+            kept = quote_map.get(symbol)
+            if quote.error in Quote.TRANSIENT and kept is not None and not kept.error:
+                # Throttled or unreachable upstream: keep serving the last good quote, and keep its
+                # fetch time so the symbol stays due
+                continue
+            quote_map[symbol] = quote
+            symbol_refreshed_at[symbol] = now
+        # Quotes carried over keep their own fetch time and staleness, so a snapshot is only as fresh as its oldest quote
+        oldest = min((symbol_refreshed_at[symbol] for symbol in symbols if symbol in symbol_refreshed_at), default=now)
+        stale_symbols = [symbol for symbol in previous.stale_symbols
+                         if symbol in symbols and symbol_refreshed_at.get(symbol) != now] if previous is not None else ()
+        snapshot = Snapshot(symbols, [quote_map[symbol] for symbol in symbols], oldest, symbol_refreshed_at,
+                            formatter=job.manager, metrics=self.metrics, stale_symbols=stale_symbols)
+        with self._condition:
+            self._snapshots[kind] = snapshot
+            self._version += 1
+            self._condition.notify_all()
+        if self.store is not None:
+            try:
+                self.store.save(kind, snapshot, due if previous is not None and not previous.stale else None)
+            except Exception as e:
+                # A full disk must not stop the refreshes
+                job.last_error = e
+        for listener in list(self._listeners):
+            try:
+                listener(kind, snapshot)
+            except Exception:
+                # A broken listener must not stop the refresh loop
+                pass
+        return snapshot
+
+    def snapshot(self, kind):
+        """Return the latest Snapshot for kind, or None before its first refresh."""
+        return self._snapshots.get(kind)
+
+    def tracks(self, kind, symbols):
+        return set(symbols) <= set(self.jobs[kind].symbols)
+
+    def wait_ready(self, kind, timeout=None):
+        """Block until kind has its first snapshot. Returns the snapshot, or None on timeout."""
+        with self._condition:
+            self._condition.wait_for(lambda: kind in self._snapshots, timeout)
+            return self._snapshots.get(kind)
+
+    def wait_for_update(self, version, timeout=None):
+        """Block until a snapshot newer than version is published, returning the current version."""
+        with self._condition:
+            self._condition.wait_for(lambda: self._version != version, timeout)
+            return self._version
@@ -0,0 +1,116 @@
+import shutil
+import sys
+from .utils import Utils
+
+
+class TerminalRenderer:
+    """
+    Redraws the console dashboard by rewriting only the cells that changed since the previous frame.
+
+    A frame is a list of screen lines, and every line is a tuple of (column, text) segments: a table
+    row has one segment per cell, a plain text line has a single one. The first frame, and any frame
+    whose layout moved, is drawn in full after clearing the screen. Later frames move the cursor to
+    each changed segment and overwrite it in place.
+
+    Column widths are kept per table across frames and only grow when a value no longer fits, so a
+    price ticking from 99.50 to 100.10 rewrites one cell instead of shifting the whole table. Frames
+    taller than the terminal are always drawn in full, because rows scrolled off screen cannot be
+    addressed.
+    """
+
+    CLEAR = "\033[H\033[J"
+    SEPARATOR = " | "
+
+    def __init__(self, stream=None, height=None):
+        """
+        :param stream: Where to write, defaults to sys.stdout.
+        :param height: Terminal height in lines, read from the terminal when not given.
+        """
+        self.stream = stream or sys.stdout
+        self.height = height
+        self.bytes_written = 0
+        self._widths = {}
+        self._previous = None
+
+    @staticmethod
+    def text(text):
+        """Return a plain text line."""
+        return ((0, text),)
+
+    def table(self, name, headers, rows):
+        """
+        Return the lines of one table: the bold header, a separator and one line per row.
+
+        :param name: Key the column widths are cached under.
+        :param headers: Column headers.
+        :param rows: Rows of cell values; cells past the header count are dropped.
+        """
+        cells, widths = Utils.table_cells(rows, headers)
+        widths = self._fit(name, widths)
+        offsets = [sum(widths[:i]) + len(self.SEPARATOR) * i for i in range(len(widths))]
+
+        lines = [self._row([(header, len(header)) for header in headers], widths, offsets),
+                 self.text('-' * (offsets[-1] + widths[-1]))]
+        lines.extend(self._row(row, widths, offsets) for row in cells)
+        return lines
+
+    def _fit(self, name, widths):
+        # Widths only grow, so shorter values keep every column where it was
+        cached = self._widths.get(name)
+        if cached is not None and len(cached) == len(widths):
+            widths = [max(old, new) for old, new in zip(cached, widths)]
+        self._widths[name] = widths
+        return widths
+
+    def _row(self, cells, widths, offsets):
+        segments = []
+        for i, (display, width) in enumerate(cells):
+            separator = self.SEPARATOR if i < len(cells) - 1 else ''
+            segments.append((offsets[i], f"{Utils.BOLD}{display}{' ' * (widths[i] - width)}{Utils.ENDC}{separator}"))
+        return tuple(segments)
+
+    def render(self, lines):
+        """Draw a frame, writing only what differs from the previous one."""
+        height = self.height or shutil.get_terminal_size().lines
+        previous = self._previous
+        if previous is None or len(lines) >= height or not self._same_layout(previous, lines):
+            output = self.CLEAR + "\n".join(''.join(text for _, text in line) for line in lines) + "\n"
+        else:
+            output = self._diff(previous, lines)
+        self._previous = list(lines)
+        self._write(output)
+
+    def reset(self):
+        """Forget the previous frame, so the next one is drawn in full."""
+        self._previous = None
+
+    @staticmethod
+    def _same_layout(previous, lines):
+        # Lines present in both frames must keep their segment positions to be patched in place
+        for old, new in zip(previous, lines):
+            if any(old_column != new_column for (old_column, _), (new_column, _) in zip(old, new)):
+                return False
+        return True
+
+    def _diff(self, previous, lines):
+        parts = []
+        for row, line in enumerate(lines):
+            old = previous[row] if row < len(previous) else ()
+            for i, (column, text) in enumerate(line):
+                # A line that lost segments, e.g. an error row, has its last segment redrawn to erase the rest
+                last = i == len(line) - 1
+                if i < len(old) and old[i][1] == text and not (last and len(old) > len(line)):
+                    continue
+                # The last segment of a line may be shorter than what it replaces
+                erase = "\033[K" if last else ""
+                parts.append(f"\033[{row + 1};{column + 1}H{text}{erase}")
+        if len(lines) < len(previous):
+            parts.append(f"\033[{len(lines) + 1};1H\033[J")
+        # Leave the cursor below the frame, where a full redraw would have left it
+        parts.append(f"\033[{len(lines) + 1};1H")
+        return ''.join(parts)
+
+    def _write(self, output):
+        self.bytes_written += len(output.encode('utf-8'))
+        self.stream.write(output)
+        self.stream.flush()
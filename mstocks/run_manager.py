@@ -1,17 +1,27 @@
 # RunManager.py
+import sys
 import time
 from datetime import datetime
+from mstocks.config import Config
 from mstocks.stocks import StocksManager
 from mstocks.crypto import CryptoManager
 from mstocks.utils import Utils
+from mstocks.refresher import QuoteRefresher
+from mstocks.render import TerminalRenderer
+from mstocks.metrics import Metrics
+from mstocks.profiler import RefreshProfiler
 
 class RunManager:
     def __init__(self, config):
         self.config = config
         crypto_str = self.config.get('crypto', 'False')  # Default to 'False' if not found
         self.crypto_enabled = True if crypto_str == "True" else False
-        self.stocks_manager = StocksManager(config)
-        self.crypto_manager = CryptoManager(config) 
+        self.metrics = Metrics.shared()
+        self.stocks_manager = StocksManager(config, metrics=self.metrics)
+        self.crypto_manager = CryptoManager(config, metrics=self.metrics)
+        # Symbols entered at the prompt, kept on top of the configured watchlists when those change
+        self.stock_symbols_input = []
+        self.crypto_symbols_input = []
 
     def run(self, stock_symbols_input=None, crypto_symbols_input=None):
         default_stocks = self.config.get('default_stocks', [])
@@ -23,6 +33,7 @@ class RunManager:
         crypto_symbols = crypto_symbols_input if crypto_symbols_input else Utils._collect_symbols("Enter cryptocurrency symbols separated by semicolon (;), or press Enter to use default cryptocurrencies: ") if self.crypto_enabled else []
         combined_crypto_symbols = list(set(default_cryptos + crypto_symbols))
         sorted_crypto_symbols = sorted(combined_crypto_symbols)
+        self.stock_symbols_input, self.crypto_symbols_input = list(stock_symbols), list(crypto_symbols)
 
         self._display_loop(sorted_stock_symbols, sorted_crypto_symbols)
     
@@ -33,20 +44,99 @@ class RunManager:
         default_cryptos = self.config.get('default_cryptos', [])
         sorted_crypto_symbols = sorted(default_cryptos)
 
-        self._display_loop(sorted_stock_symbols, sorted_crypto_symbols)
+        # Logs get one metrics line per refresh, to size refresh rates and spot failing symbols
+        self._display_loop(sorted_stock_symbols, sorted_crypto_symbols, summary=True)
+
+    def run_profile(self, cycles=3, profile_path=None):
+        """Run cycles refreshes of the configured watchlists and print where their time went."""
+        stock_symbols = sorted(set(self.config.get('default_stocks', [])))
+        crypto_symbols = sorted(set(self.config.get('default_cryptos', []))) if self.crypto_enabled else []
+        profiler = RefreshProfiler(self, stock_symbols, crypto_symbols, cycles=cycles, profile_path=profile_path)
+        print(f"Profiling {profiler.cycles} refresh cycles...")
+        try:
+            print(profiler.run())
+        finally:
+            self.stocks_manager.close()
+            self.crypto_manager.close()
+        return profiler
+
+    def _display_loop(self, sorted_stock_symbols, sorted_crypto_symbols, summary=False):
+        refresher = QuoteRefresher(self.config, self.stocks_manager, self.crypto_manager,
+                                   sorted_stock_symbols, sorted_crypto_symbols if self.crypto_enabled else [],
+                                   metrics=self.metrics)
+        refresher.start()
+        self._follow_config(refresher)
+        # On a terminal only the changed cells are redrawn; logs (e.g. docker) get the full tables
+        renderer = TerminalRenderer() if sys.stdout.isatty() else None
+        print("Refreshing...")
+        version = 0
+        try:
+            while True:
+                # Redraw whenever the background refresher publishes a new snapshot
+                version = refresher.wait_for_update(version, timeout=Utils.as_float(self.config.get('refresh_rate', 60), 60))
+                with self.metrics.timer("render"):
+                    if renderer is not None:
+                        lines = self._frame(renderer, refresher)
+                        if summary:
+                            lines.extend([renderer.text(""), renderer.text(self.metrics.summary())])
+                        renderer.render(lines)
+                    else:
+                        print("\033[H\033[J", end="")  # Clear screen
+                        self._display_snapshots(refresher)
+                if summary and renderer is None:
+                    print(self.metrics.summary())
+        finally:
+            refresher.stop(timeout=0)
+            self.stocks_manager.close()
+            self.crypto_manager.close()
+
+    def _follow_config(self, refresher):
+        # Edits to config.json apply without a restart: new watchlists are tracked and changed
+        # investments or currencies are fetched and valued again
+        if not isinstance(self.config, Config):
+            return
+
+        def on_change(changed):
+            if 'default_stocks' in changed:
+                refresher.set_symbols("stocks", sorted(set(self.config.get('default_stocks', []) + self.stock_symbols_input)))
+            if 'default_cryptos' in changed and self.crypto_enabled:
+                refresher.set_symbols("crypto", sorted(set(self.config.get('default_cryptos', []) + self.crypto_symbols_input)))
+            if changed & {'investments', 'currency_map'}:
+                refresher.wake(force=True)
+
+        self.config.add_listener(on_change)
+        self.config.watch(Utils.as_float(self.config.get('config_watch_interval', 2), 2))
+
+    def _display_snapshots(self, refresher):
+        stocks = refresher.snapshot("stocks")
+        if stocks is not None and stocks.symbols:
+            self.stocks_manager._display_stock_prices(stocks.rows, self._snapshot_label(stocks))
+
+        crypto = refresher.snapshot("crypto")
+        if self.crypto_enabled and crypto is not None and crypto.symbols:
+            self.crypto_manager._display_crypto_prices(crypto.rows, self._snapshot_label(crypto))
+
+    def _frame(self, renderer, refresher):
+        # Same layout as _display_snapshots, as lines for the renderer
+        lines = []
+        stocks = refresher.snapshot("stocks")
+        if stocks is not None and stocks.symbols:
+            lines.append(renderer.text("Stock Prices as of " + self._snapshot_label(stocks)))
+            lines.extend(renderer.table("stocks", Utils.table_headers(), stocks.rows))
+
+        crypto = refresher.snapshot("crypto")
+        if self.crypto_enabled and crypto is not None and crypto.symbols:
+            if crypto.rows:
+                lines.extend([renderer.text(""), renderer.text("-" * 50), renderer.text("")])
+            lines.append(renderer.text("Cryptocurrency Prices as of " + self._snapshot_label(crypto)))
+            lines.extend(renderer.table("crypto", Utils.table_headers(False), crypto.rows))
+        return lines
 
-    def _display_loop(self, sorted_stock_symbols, sorted_crypto_symbols):
-        while True:
-            print("Refreshing...")
-            now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            print("\033[H\033[J", end="")  # Clear screen
-            if sorted_stock_symbols:
-                self.stocks_manager._display_stock_prices(sorted_stock_symbols, now)
-            
-            if self.crypto_enabled and sorted_crypto_symbols:
-                self.crypto_manager._display_crypto_prices(sorted_crypto_symbols, now)
-
-            time.sleep(self.config.get('refresh_rate', 60))  # Refresh rate
+    @staticmethod
+    def _snapshot_label(snapshot):
+        if snapshot.stale:
+            return f"{snapshot.refreshed_label} ({snapshot.age:.0f}s ago, from the last run, refreshing...)"
+        return f"{snapshot.refreshed_label} ({snapshot.age:.0f}s ago)"
 
     def _collect_stock_symbols(self):
         # Collects stock symbols from the user or uses default ones from config
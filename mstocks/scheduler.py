@@ -0,0 +1,41 @@
+import time
+
+
+class RefreshScheduler:
+    """
+    Decides which symbols a refresh tick should actually fetch, based on the market calendar.
+
+    Symbols whose exchange is in its regular session are fetched on every tick. Once a session ends
+    each symbol is fetched one more time to pick up its closing price, and after that only every
+    `closed_interval` seconds (never when it is 0) until the next session opens. Always-open asset
+    classes such as crypto are fetched on every tick.
+    """
+
+    def __init__(self, market, closed_interval=3600, clock=time.time):
+        self.market = market
+        self.closed_interval = closed_interval
+        self.clock = clock
+
+    def is_due(self, symbol, last_refreshed, now=None, always_open=False):
+        """
+        :param symbol: Ticker symbol.
+        :param last_refreshed: Epoch seconds of the symbol's last successful fetch, or None.
+        :param now: Epoch seconds to evaluate at, defaults to the clock.
+        :param always_open: True for assets that trade around the clock.
+        """
+        if last_refreshed is None or always_open:
+            return True
+        now = self.clock() if now is None else now
+        status = self.market.status(symbol, now)
+        if status.is_open:
+            return True
+
+        if status.last_close is not None and last_refreshed < status.last_close:
+            return True
+        return bool(self.closed_interval) and now - last_refreshed >= self.closed_interval
+
+    def due_symbols(self, symbols, refreshed_at, now=None, always_open=False):
+        """Return the subset of symbols to fetch now, given {symbol: last refresh epoch}."""
+        now = self.clock() if now is None else now
+        return [symbol for symbol in symbols
+                if self.is_due(symbol, refreshed_at.get(symbol), now, always_open)]
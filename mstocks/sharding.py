@@ -0,0 +1,160 @@
+import multiprocessing
+import os
+import threading
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from .metrics import Metrics
+from .models import Quote
+from .utils import Utils
+
+# State of a shard worker process: how to build its manager, the manager and its Metrics
+_worker = {}
+
+
+def _start_worker(kind, config, provider_factory):
+    _worker.update(args=(kind, config, provider_factory))
+    try:
+        _build_manager()
+    except Exception:
+        # Raised again by the first fetch, as error quotes, instead of breaking the pool
+        pass
+
+
+def _build_manager():
+    from .crypto import CryptoManager
+    from .stocks import StocksManager
+    kind, config, provider_factory = _worker['args']
+    # The process only serves one shard, so the process-wide registry is the worker's own
+    metrics = Metrics.shared()
+    provider = provider_factory() if provider_factory is not None else None
+    manager_class = StocksManager if kind == "stocks" else CryptoManager
+    _worker.update(manager=manager_class(config, provider=provider, metrics=metrics), metrics=metrics)
+
+
+def _price_quotes(symbol_list, config=None):
+    # Runs in the shard worker: download the bars of its symbols and build their quotes
+    if 'manager' not in _worker:
+        _build_manager()
+    manager = _worker['manager']
+    if config is not None:
+        # The coordinator's config was reloaded; the manager reads it on its next use
+        manager.config = config
+    quotes = manager.price_quotes(symbol_list, manager.history.histories(symbol_list))
+    return quotes, _worker['metrics'].drain()
+
+
+class ShardPool:
+    """
+    Worker processes that each fetch a fixed share of the symbols of one asset class.
+
+    A symbol always goes to the same worker, picked by a stable hash of its name, so every worker
+    keeps its own manager, bar history, company names and upstream state for its share, warm across
+    refreshes. fetch() sends every worker its symbols at the same time and puts the quotes back in
+    the requested order. The quotes come back with prices but without positions: the coordinating
+    manager values the whole portfolio in one pass.
+
+    The upstream rate limit of the config is divided among the workers, so sharding does not
+    multiply the traffic. Files of the config are shared where each worker only touches its own
+    symbols (history_store) and split per worker otherwise (metadata_cache). Stage timings of the
+    workers are merged into the coordinator's Metrics.
+    """
+
+    def __init__(self, kind, config, processes, metrics=None, provider_factory=None):
+        """
+        :param kind: "stocks" or "crypto".
+        :param config: Config or dict the workers build their managers from.
+        :param processes: Number of worker processes.
+        :param provider_factory: Picklable callable returning the QuoteProvider of a worker, the live one when None.
+        """
+        self.kind = kind
+        self.config = config
+        self.processes = max(1, int(processes))
+        self.metrics = metrics or Metrics.shared()
+        self.provider_factory = provider_factory
+        # Spawned rather than forked, so a worker never inherits a lock held by a refresh thread
+        self._context = multiprocessing.get_context("spawn")
+        self._executors = [None] * self.processes
+        self._sent = [None] * self.processes
+        self._lock = threading.Lock()
+
+    def shard_of(self, symbol):
+        # crc32, unlike hash(), is the same in every process and run
+        return zlib.crc32(symbol.encode()) % self.processes
+
+    def worker_config(self, index):
+        """Return the config of worker index: unsharded, with its share of the rate limit and its own metadata file."""
+        data = self._config_data()
+        config = dict(data)
+        config['refresh_processes'] = 1
+        config['upstream_rate'] = Utils.as_float(data.get('upstream_rate', 5), 5) / self.processes
+        config['upstream_burst'] = max(1.0, Utils.as_float(data.get('upstream_burst', 10), 10) / self.processes)
+        metadata_path = data.get('metadata_cache')
+        if isinstance(metadata_path, str):
+            root, extension = os.path.splitext(metadata_path)
+            config['metadata_cache'] = f"{root}.{index}{extension}"
+        return config
+
+    def _config_data(self):
+        return self.config.config_data if hasattr(self.config, 'config_data') else self.config
+
+    def _executor(self, index):
+        with self._lock:
+            executor = self._executors[index]
+            if executor is None:
+                executor = self._executors[index] = ProcessPoolExecutor(
+                    max_workers=1, mp_context=self._context, initializer=_start_worker,
+                    initargs=(self.kind, self.worker_config(index), self.provider_factory))
+                self._sent[index] = self._config_data()
+            return executor
+
+    def fetch(self, symbol_list):
+        """Return the quotes of symbol_list, without positions, fetched by the workers side by side."""
+        shards = {}
+        for symbol in symbol_list:
+            shards.setdefault(self.shard_of(symbol), []).append(symbol)
+
+        futures = {}
+        for index, symbols in shards.items():
+            try:
+                executor = self._executor(index)
+                futures[index] = executor.submit(_price_quotes, symbols, self._changed_config(index))
+            except (BrokenProcessPool, RuntimeError) as e:
+                futures[index] = e
+
+        by_symbol = {}
+        for index, symbols in shards.items():
+            try:
+                future = futures[index]
+                if isinstance(future, Exception):
+                    raise future
+                quotes, (stages, calls) = future.result()
+                self.metrics.merge(stages, calls)
+                by_symbol.update(zip(symbols, quotes))
+            except Exception as e:
+                if isinstance(e, BrokenProcessPool):
+                    # The worker died, e.g. killed for memory; the next refresh starts a new one
+                    self._reset(index)
+                now = time.time()
+                by_symbol.update((symbol, Quote.failed(symbol, e, now)) for symbol in symbols)
+        return [by_symbol[symbol] for symbol in symbol_list]
+
+    def _changed_config(self, index):
+        # A reloaded config replaces config_data, so an identity check tells whether the worker has it
+        data = self._config_data()
+        if self._sent[index] is data:
+            return None
+        self._sent[index] = data
+        return self.worker_config(index)
+
+    def _reset(self, index):
+        with self._lock:
+            executor, self._executors[index] = self._executors[index], None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def close(self):
+        for index in range(self.processes):
+            self._reset(index)
@@ -0,0 +1,341 @@
+import json
+import mmap
+import multiprocessing
+import os
+import shutil
+import struct
+import tempfile
+import threading
+import time
+
+# File layout: MAGIC, the length of the json index, the index, then the encoded rows it points into
+MAGIC = b"MSNP"
+HEADER = struct.Struct("<4sI")
+
+
+class SharedSnapshot:
+    """
+    The latest json rows of every asset class in a memory-mapped file, written by one process and read by many.
+
+    The refresher process encodes every row once and writes the file anew after each refresh: the
+    rows of an asset class are stored back to back as one json array, with an index of where each
+    row starts. The file is replaced with a rename, so a reader never sees a half-written one, and a
+    generation counter in shared memory tells readers when to map the new file. On Linux the file
+    lives in /dev/shm, so nothing goes to disk.
+
+    Readers answer from the mapping: the whole watchlist is one slice of it and a subset is a join of
+    row slices, so workers neither decode the rows nor keep copies of them.
+    """
+
+    FILENAME = "snapshot.bin"
+
+    def __init__(self, directory=None):
+        """
+        :param directory: Where the file is kept; a new temporary directory, in /dev/shm when available, by default.
+        """
+        if directory is None:
+            directory = tempfile.mkdtemp(prefix="mstocks-", dir="/dev/shm" if os.path.isdir("/dev/shm") else None)
+            self._owned = True
+        else:
+            os.makedirs(directory, exist_ok=True)
+            self._owned = False
+        self.directory = directory
+        self.path = os.path.join(directory, self.FILENAME)
+        # Created before the workers fork, so all of them see the same counter
+        self.generation = multiprocessing.get_context("fork").RawValue('Q', 0)
+        self._sections = {}
+        self._metrics = b""
+        self._write_lock = threading.Lock()
+        self._view = None
+        self._view_lock = threading.Lock()
+
+    def publish(self, kind, snapshot, metrics_text=None):
+        """Store the json rows of a refresher Snapshot of kind, and the metrics text when given, for the readers."""
+        rows = [json.dumps(row).encode() for row in snapshot.json_rows]
+        with self._write_lock:
+            self._restore()
+            # Counts the publishes of kind; its refreshed_at stays put while the oldest quote is carried over
+            version = self._sections[kind][4] + 1 if kind in self._sections else 1
+            self._sections[kind] = (list(snapshot.symbols), rows, snapshot.refreshed_at, snapshot.stale, version)
+            if metrics_text is not None:
+                self._metrics = metrics_text.encode()
+            self._write()
+
+    def publish_metrics(self, metrics_text):
+        """Replace the metrics text only, e.g. to keep the snapshot ages in it current between refreshes."""
+        with self._write_lock:
+            self._restore()
+            self._metrics = metrics_text.encode()
+            self._write()
+
+    def _restore(self):
+        # A writer that replaces a dead one starts from the file, so readers keep every asset class meanwhile
+        if self._sections or self.generation.value == 0:
+            return
+        view = self.view()
+        for kind in view.kinds():
+            self._sections[kind] = (view.symbols(kind), view.encoded_rows(kind), view.refreshed_at(kind), view.stale(kind),
+                                    view.version(kind))
+        self._metrics = view.metrics().encode()
+
+    def _write(self):
+        # Called with the write lock held. Offsets in the index count from the end of the index
+        index = {"kinds": {}}
+        chunks, offset = [], 0
+        for kind, (symbols, rows, refreshed_at, stale, version) in self._sections.items():
+            start, positions = offset, []
+            chunks.append(b"[")
+            offset += 1
+            for i, row in enumerate(rows):
+                if i:
+                    chunks.append(b", ")
+                    offset += 2
+                positions.append([offset, len(row)])
+                chunks.append(row)
+                offset += len(row)
+            chunks.append(b"]")
+            offset += 1
+            index["kinds"][kind] = {"symbols": symbols, "rows": positions, "all": [start, offset - start],
+                                    "refreshed_at": refreshed_at, "stale": stale, "version": version}
+        index["metrics"] = [offset, len(self._metrics)]
+        chunks.append(self._metrics)
+
+        encoded_index = json.dumps(index).encode()
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'wb') as file:
+            file.write(HEADER.pack(MAGIC, len(encoded_index)))
+            file.write(encoded_index)
+            file.writelines(chunks)
+        os.replace(tmp_path, self.path)
+        self.generation.value += 1
+
+    def view(self):
+        """Return the SnapshotView of the latest file, or None before the first publish."""
+        generation = self.generation.value
+        view = self._view
+        if view is not None and view.generation == generation:
+            return view
+        if generation == 0:
+            return None
+        with self._view_lock:
+            if self._view is None or self._view.generation != generation:
+                # The writer may already have replaced the file again; the view then tells its own generation
+                self._view = SnapshotView.open(self.path, generation)
+            return self._view
+
+    def close(self):
+        """Remove the file, and the directory when it was created here. Only the owning process calls it."""
+        if self._owned:
+            shutil.rmtree(self.directory, ignore_errors=True)
+        else:
+            for path in (self.path, f"{self.path}.tmp"):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+
+class SnapshotView:
+    """One published SharedSnapshot file, mapped read-only."""
+
+    def __init__(self, data, index, base, generation):
+        """
+        :param data: The mapped file.
+        :param index: Its json index.
+        :param base: Where the rows start in data.
+        """
+        self.data = data
+        self.generation = generation
+        self._kinds = index["kinds"]
+        self._metrics = index["metrics"]
+        self._base = base
+        self._positions = {kind: dict(zip(section["symbols"], section["rows"])) for kind, section in self._kinds.items()}
+
+    @classmethod
+    def open(cls, path, generation):
+        with open(path, 'rb') as file:
+            data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, length = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a snapshot file")
+        index = json.loads(data[HEADER.size:HEADER.size + length])
+        return cls(data, index, HEADER.size + length, generation)
+
+    def kinds(self):
+        return list(self._kinds)
+
+    def symbols(self, kind):
+        section = self._kinds.get(kind)
+        return list(section["symbols"]) if section is not None else []
+
+    def refreshed_at(self, kind):
+        return self._kinds[kind]["refreshed_at"]
+
+    def age(self, kind):
+        return max(0.0, time.time() - self._kinds[kind]["refreshed_at"])
+
+    def stale(self, kind):
+        return self._kinds[kind]["stale"]
+
+    def version(self, kind):
+        """Number of snapshots of kind published so far."""
+        return self._kinds[kind]["version"]
+
+    def _slice(self, position):
+        start = self._base + position[0]
+        return self.data[start:start + position[1]]
+
+    def encoded(self, kind, symbols=None):
+        """
+        Return the json array of the rows of symbols, in that order, as bytes; the whole watchlist when None.
+        Symbols the snapshot does not hold raise KeyError.
+        """
+        if symbols is None:
+            return self._slice(self._kinds[kind]["all"])
+        positions = self._positions[kind]
+        return b"[" + b", ".join(self._slice(positions[symbol]) for symbol in symbols) + b"]"
+
+    def encoded_rows(self, kind):
+        """Return the json rows of kind, encoded, in watchlist order."""
+        return [self._slice(position) for position in self._kinds[kind]["rows"]]
+
+    def rows(self, kind):
+        """Return {symbol: json row}, decoded; only for clients that need the values, e.g. streams."""
+        positions = self._positions.get(kind, {})
+        return {symbol: json.loads(self._slice(position)) for symbol, position in positions.items()}
+
+    def metrics(self):
+        return self._slice(self._metrics).decode()
+
+
+class SharedSection:
+    """The rows of one asset class in a SnapshotView, read like a refresher Snapshot."""
+
+    def __init__(self, view, kind):
+        self.view = view
+        self.kind = kind
+        self.symbols = tuple(view.symbols(kind))
+        self.refreshed_at = view.refreshed_at(kind)
+        self.stale = view.stale(kind)
+        self._by_symbol = None
+
+    @property
+    def age(self):
+        return max(0.0, time.time() - self.refreshed_at)
+
+    @property
+    def by_symbol(self):
+        # Decoded on first use only, by workers that stream the rows
+        if self._by_symbol is None:
+            self._by_symbol = self.view.rows(self.kind)
+        return self._by_symbol
+
+    def encoded(self, symbols=None):
+        return self.view.encoded(self.kind, symbols)
+
+
+class _Watchlist:
+    def __init__(self, symbols):
+        self.symbols = symbols
+        self.last_error = None
+        self.last_duration = None
+
+
+class SnapshotReader:
+    """
+    Stands in for the QuoteRefresher of an API worker: serves the snapshots that the refresher of
+    another process publishes to a SharedSnapshot, and fetches nothing itself.
+
+    A thread checks the generation of the SharedSnapshot every interval seconds and calls the
+    listeners with every asset class that was refreshed since. Before the first publish the
+    watchlists of the config count as tracked, so requests for them wait for the first snapshot
+    instead of each worker fetching them on its own.
+    """
+
+    WATCHLISTS = {"stocks": 'default_stocks', "crypto": 'default_cryptos'}
+
+    def __init__(self, shared, config, interval=0.5):
+        """
+        :param shared: SharedSnapshot the refresher process publishes to.
+        :param config: Config or dict with the watchlists tracked before the first publish.
+        :param interval: Seconds between checks for a new generation.
+        """
+        self.shared = shared
+        self.config = config
+        self.interval = interval
+        self._listeners = []
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def jobs(self):
+        view = self.shared.view()
+        jobs = {}
+        for kind, key in self.WATCHLISTS.items():
+            if view is not None and kind in view.kinds():
+                jobs[kind] = _Watchlist(view.symbols(kind))
+            else:
+                jobs[kind] = _Watchlist(list(self.config.get(key, [])))
+        return jobs
+
+    def snapshot(self, kind):
+        """Return the latest SharedSection of kind, or None before its first publish."""
+        view = self.shared.view()
+        if view is None or kind not in view.kinds():
+            return None
+        return SharedSection(view, kind)
+
+    def tracks(self, kind, symbols):
+        return set(symbols) <= set(self.jobs[kind].symbols)
+
+    def wait_ready(self, kind, timeout=None):
+        """Poll until kind has its first snapshot. Returns the SharedSection, or None on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            section = self.snapshot(kind)
+            if section is not None:
+                return section
+            remaining = self.interval if deadline is None else min(self.interval, deadline - time.monotonic())
+            if remaining <= 0 or self._stop.wait(remaining):
+                return None
+
+    def add_listener(self, listener):
+        """Call listener(kind, section) on the polling thread after every new snapshot of any asset class."""
+        self._listeners.append(listener)
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="mstocks-snapshot-reader", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        generation, versions = 0, {}
+        while not self._stop.wait(self.interval):
+            if self.shared.generation.value == generation:
+                continue
+            view = self.shared.view()
+            generation = view.generation
+            for kind in view.kinds():
+                # A new generation may only carry new metrics, which listeners do not care about
+                if versions.get(kind) == view.version(kind):
+                    continue
+                versions[kind] = view.version(kind)
+                section = SharedSection(view, kind)
+                for listener in list(self._listeners):
+                    try:
+                        listener(kind, section)
+                    except Exception:
+                        pass
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def set_symbols(self, kind, symbols):
+        # The refresher process follows the config itself; its next publish carries the new watchlist
+        pass
+
+    def wake(self, kind=None, force=False):
+        pass
@@ -0,0 +1,84 @@
+import json
+import os
+import sqlite3
+import threading
+
+from .models import Quote
+
+
+class SnapshotStore:
+    """
+    SQLite file keeping the latest quote snapshot of every asset class across restarts.
+
+    One row per quote, so a refresh only writes the quotes it fetched, plus one row per asset class
+    with its symbols and refresh time. Every save is one transaction, so a crash leaves either the
+    previous or the new snapshot on disk. The refresher loads it on startup and serves it, marked
+    stale, until its first refresh.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS snapshots (kind TEXT PRIMARY KEY, symbols TEXT NOT NULL, refreshed_at REAL NOT NULL);
+        CREATE TABLE IF NOT EXISTS quotes (kind TEXT NOT NULL, symbol TEXT NOT NULL, quote TEXT NOT NULL,
+                                           refreshed_at REAL NOT NULL, PRIMARY KEY (kind, symbol));
+    """
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        # Every asset class refreshes on its own thread; the lock keeps them off the connection at the same time
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.executescript(self.SCHEMA)
+
+    def load(self, kind):
+        """
+        Return (symbols, quotes, refreshed_at, {symbol: refreshed_at}) of the stored snapshot of kind,
+        or None when there is none or it cannot be read.
+        """
+        try:
+            with self._lock:
+                row = self._connection.execute("SELECT symbols, refreshed_at FROM snapshots WHERE kind = ?",
+                                               (kind,)).fetchone()
+                if row is None:
+                    return None
+                stored = {symbol: (quote, refreshed_at) for symbol, quote, refreshed_at in self._connection.execute(
+                    "SELECT symbol, quote, refreshed_at FROM quotes WHERE kind = ?", (kind,))}
+            symbols = json.loads(row[0])
+            if any(symbol not in stored for symbol in symbols):
+                return None
+            quotes = [Quote.from_record(json.loads(stored[symbol][0])) for symbol in symbols]
+        except (sqlite3.Error, ValueError, TypeError, KeyError):
+            return None
+        return symbols, quotes, row[1], {symbol: stored[symbol][1] for symbol in symbols}
+
+    def save(self, kind, snapshot, fetched=None):
+        """
+        Store snapshot as the latest of kind.
+
+        :param fetched: Symbols whose quotes changed since the last save, all of them when None.
+        """
+        fetched = snapshot.symbols if fetched is None else fetched
+        by_symbol = dict(zip(snapshot.symbols, snapshot.quotes))
+        rows = [(kind, symbol, json.dumps(by_symbol[symbol].as_record()), snapshot.symbol_refreshed_at.get(symbol, 0.0))
+                for symbol in fetched if symbol in by_symbol]
+        with self._lock:
+            connection = self._connection
+            connection.execute("BEGIN")
+            try:
+                connection.executemany("INSERT OR REPLACE INTO quotes VALUES (?, ?, ?, ?)", rows)
+                connection.execute("INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?)",
+                                   (kind, json.dumps(list(snapshot.symbols)), snapshot.refreshed_at))
+                # Symbols that left the watchlist
+                connection.execute("DELETE FROM quotes WHERE kind = ? AND symbol NOT IN (SELECT value FROM "
+                                   "json_each((SELECT symbols FROM snapshots WHERE kind = ?)))", (kind, kind))
+                connection.execute("COMMIT")
+            except sqlite3.Error:
+                connection.execute("ROLLBACK")
+                raise
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
@@ -1,147 +1,209 @@
-import yfinance as yf
 import time
 from datetime import datetime
 from .market import Market
 from .config import Config
 from .utils import Utils
+from .batch import BatchFetcher
+from .providers import YFinanceProvider
+from .upstream import Upstream, CircuitOpenError
+from .executor import FetchExecutor
+from .metadata import MetadataCache
+from .history import HistoryStore
+from .portfolio import Portfolio
+from .suffix import SuffixResolver
+from .models import Quote
+from .metrics import Metrics
+from .sharding import ShardPool
 
 class StocksManager:
-    def __init__(self, config):
+    def __init__(self, config, fetcher=None, executor=None, metadata=None, history=None, upstream=None,
+                 provider=None, metrics=None, shards=None):
         self.config = config
+        # Latency of every stage and the failing symbols, served on /metrics
+        self.metrics = metrics or Metrics.shared()
         self.utils = Utils()
         self.market = Market(self.utils)
-        self.currency_map = config.get('currency_map', {"": "USD"})
+        self.executor = executor or FetchExecutor(max_workers=Utils.as_int(config.get('fetch_workers', 8), 8),
+                                                  timeout=Utils.as_float(config.get('fetch_timeout', 10), 10))
+        # Every yfinance call of every manager shares one rate limit and circuit breaker
+        self.upstream = upstream or Upstream.from_config(config)
+        # Live Yahoo Finance unless another QuoteProvider, e.g. a ReplayProvider, is given
+        self.provider = provider or YFinanceProvider(self.upstream, metrics=self.metrics)
+        self.fetcher = fetcher or BatchFetcher(self.provider,
+                                               batch_size=Utils.as_int(config.get('batch_size', 100), 100),
+                                               executor=self.executor)
+        history_path = config.get('history_store', None)  # e.g. "data/history", memory only when unset
+        self.history = history or HistoryStore(self.fetcher, path=history_path if isinstance(history_path, str) else None)
+        metadata_path = config.get('metadata_cache', None)  # e.g. "data/metadata.json", memory only when unset
+        self.metadata = metadata or MetadataCache(path=metadata_path if isinstance(metadata_path, str) else None,
+                                                  ttl=Utils.as_float(config.get('metadata_ttl', 604800), 604800))
+        self._portfolio = None
+        self._portfolio_investments = None
+        self._currency_resolver = None
+        self._currency_resolver_map = None
+        # With refresh_processes > 1 the symbols are fetched by a pool of worker processes
+        processes = Utils.as_int(config.get('refresh_processes', 1), 1)
+        self.shards = shards or (ShardPool("stocks", config, processes, metrics=self.metrics) if processes > 1 else None)
 
 
     # This method fetches the stock prices for the given symbols
     # it returns a list of lists containing the stock prices in formatted way to be displayed in table for console
     def get_stock_prices(self, symbols):
-        prices = []
-        for symbol in symbols.split(';'):
-            symbol = symbol.strip()
-            stock = yf.Ticker(symbol)
-            hist = stock.history(period="2d")
-            currency = self.utils.get_currency(symbol, self.currency_map)
-
-            try:
-                company_name = stock.info.get('longName', 'N/A')
-                if len(hist) > 1:
-                    last_close = hist['Close'].iloc[-1]
-                    prev_close = hist['Close'].iloc[-2]
-                    price_change = float(last_close - prev_close)
-                    percent_change = (price_change / prev_close) * 100
-
-                    trend = Utils._format_value(price_change, currency, percent_change)
-                else:
-                    last_close = hist['Close'].iloc[-1] if len(hist) == 1 else "Not available"
-                    trend = "—"
-                
-                earnings, invested, percent_earned, buy_price, quantity = self.calculate_earnings(symbol, last_close if isinstance(last_close, float) else 0)
-                earnings_str = Utils._format_value(earnings, currency, percent_earned) if earnings is not None else "—"
-                invested_str = f"{invested:.2f} {currency} [{buy_price:.2f}]" if invested is not None else "—"
-
-                market_status_symbol, last_refreshed_in_tz = self.market.is_market_open(symbol)
-                formatted_price = f"{last_close:.2f} {currency}" if isinstance(last_close, float) else last_close
-                
-                prices.append([f"{market_status_symbol} ({last_refreshed_in_tz})", f"[{symbol}]", company_name, formatted_price, trend, invested_str, earnings_str])
-            except IndexError:
-                current_time = datetime.now().strftime('%H:%M:%S')
-                prices.append(["Error", f"[{symbol}]", "N/A", "Not found", current_time, "—"])
-
-        return prices
-    
+        quotes = self.fetch_quotes(symbols)
+        with self.metrics.timer("format", [quote.symbol for quote in quotes]):
+            return [self.quote_row(quote) for quote in quotes]
+
     # Thisn method fetches the stock prices for the given symbols
     # it returns a list of lists containing the stock prices in array format
     def get_stock_prices_json(self, symbols):
-        prices = []
-        for symbol in symbols.split(';'):
-            symbol = symbol.strip()
-            try:
-                stock = yf.Ticker(symbol)
-                hist = stock.history(period="2d")
-                currency = self.utils.get_currency(symbol, self.currency_map)
-
-                company_name = stock.info.get('longName', 'N/A')
-                if len(hist) > 1:
-                    last_close = hist['Close'].iloc[-1]
-                    prev_close = hist['Close'].iloc[-2]
-                    price_change = float(last_close - prev_close)
-                    percent_change = (price_change / prev_close) * 100
-
-                    trend = {
-                        "price_change": price_change,
-                        "currency": currency,
-                        "percent_change": percent_change
-                    }
-                else:
-                    last_close = hist['Close'].iloc[-1] if len(hist) == 1 else "Not available"
-                    trend = "—"
-
-                earnings, invested, percent_earned, buy_price, quantity = self.calculate_earnings(
-                    symbol, last_close if isinstance(last_close, float) else 0
-                )
-                earnings_info = {
-                    "earnings": earnings,
-                    "currency": currency,
-                    "percent_earned": percent_earned
-                } if earnings is not None else "—"
-                invested_info = {
-                    "invested": f"{invested:.2f}",
-                    "currency": currency,
-                    "quantity": f"{quantity:.2f}",
-                    "buy_price": f"{buy_price:.2f}"
-                } if invested is not None else "—"
-
-                formatted_price = f"{last_close:.2f} {currency}" if isinstance(last_close, float) else last_close
-
-                prices.append({
-                    "symbol": symbol,
-                    "company_name": company_name,
-                    "last_close_price": formatted_price,
-                    "trend": trend,
-                    "invested": invested_info,
-                    "earnings": earnings_info
-                })
-            except ValueError as e:
-                # Handling the case where the symbol is invalid or data could not be fetched.
-                prices.append(["Error", f"[{symbol}]", "N/A", "Invalid Symbol or Data Not Found", "—", "—", "—"])
-            except Exception as e:
-                # General error handling, could be network error, etc.
-                prices.append(["Error", f"[{symbol}]", "N/A", "Error Fetching Data", "—", "—", "—"])
-                
-        return prices
+        quotes = self.fetch_quotes(symbols)
+        with self.metrics.timer("format", [quote.symbol for quote in quotes]):
+            return [self.quote_json(quote) for quote in quotes]
+
+    # This method fetches the given symbols once and returns their quotes,
+    # which is what the background refresher keeps in its snapshot
+    def fetch_quotes(self, symbols):
+        symbol_list = self._split_symbols(symbols)
+        if self.shards is not None:
+            # Downloads and per-symbol pandas work run in the worker processes, the valuation here
+            return self.value_quotes(self.shards.fetch(symbol_list))
+        return self.quotes(symbol_list, self.history.histories(symbol_list))
+
+    # Builds the json rows from histories that were already downloaded, e.g. by the async server
+    def json_rows(self, symbol_list, histories):
+        quotes = self.quotes(symbol_list, histories)
+        with self.metrics.timer("format", [quote.symbol for quote in quotes]):
+            return [self.quote_json(quote) for quote in quotes]
+
+    def quotes(self, symbol_list, histories):
+        return self.value_quotes(self.price_quotes(symbol_list, histories))
+
+    # Quotes with prices and names but no positions yet, which is what a shard worker returns
+    def price_quotes(self, symbol_list, histories):
+        quotes = self.executor.map(lambda symbol: self._quote(symbol, histories), symbol_list,
+                                   lambda symbol, error: Quote.failed(symbol, error, time.time()))
+        self.metadata.flush()
+        return quotes
+
+    def value_quotes(self, quotes):
+        # The whole portfolio is valued in one pass, not symbol by symbol
+        with self.metrics.timer("earnings", [quote.symbol for quote in quotes]):
+            positions = self.portfolio.positions({quote.symbol: quote.price for quote in quotes if not quote.error})
+        for quote in quotes:
+            quote.position = positions.get(quote.symbol)
+            if quote.error:
+                self.metrics.count_error("stocks", quote.symbol, quote.error)
+        return quotes
+
+    def _quote(self, symbol, histories):
+        hist = HistoryStore.history_for(histories, symbol)
+        closes = hist['Close']
+        price = float(closes.iloc[-1]) if len(closes) > 0 else None
+        previous_close = float(closes.iloc[-2]) if len(closes) > 1 else None
+        return Quote(symbol, self.currency_resolver.resolve(symbol), price, previous_close,
+                     name=self.metadata.get_company_name(symbol, self._fetch_company_name), fetched_at=time.time())
+
+    # Console row of a quote
+    def quote_row(self, quote):
+        if quote.error:
+            # Row for a symbol whose fetch failed or ran past its deadline, so the rest of the table still renders
+            fetched_at = datetime.fromtimestamp(quote.fetched_at) if quote.fetched_at else datetime.now()
+            return [f"Error ({fetched_at.strftime('%H:%M:%S')})", f"[{quote.symbol}]", "N/A", quote.error_message,
+                    "—", "—", "—"]
+
+        currency, position = quote.currency, quote.position
+        change = quote.change
+        trend = Utils.value_cell(change, currency, quote.percent_change) if change is not None else "—"
+        earnings_str = Utils.value_cell(position.earnings, currency, position.percent) if position.earnings is not None else "—"
+        invested_str = f"{position.invested:.2f} {currency} [{position.average_price:.2f}]"
+
+        market_status_symbol, last_refreshed_in_tz = self.market.is_market_open(quote.symbol, quote.fetched_at)
+        formatted_price = f"{quote.price:.2f} {currency}" if quote.price is not None else "Not available"
+
+        return [f"{market_status_symbol} ({last_refreshed_in_tz})", f"[{quote.symbol}]", quote.name, formatted_price, trend, invested_str, earnings_str]
+
+    # Json row of a quote, as served by the API; failed fetches are error lists like the console rows
+    @staticmethod
+    def quote_json(quote):
+        if quote.error:
+            return ["Error", f"[{quote.symbol}]", "N/A", quote.error_message, "—", "—", "—"]
+
+        currency, position = quote.currency, quote.position
+        change = quote.change
+        trend = {
+            "price_change": change,
+            "currency": currency,
+            "percent_change": quote.percent_change
+        } if change is not None else "—"
+        earnings_info = {
+            "earnings": position.earnings,
+            "currency": currency,
+            "percent_earned": position.percent
+        } if position is not None and position.earnings is not None else "—"
+        invested_info = {
+            "invested": f"{position.invested:.2f}",
+            "currency": currency,
+            "quantity": f"{position.quantity:.2f}",
+            "buy_price": f"{position.average_price:.2f}"
+        } if position is not None else "—"
+
+        formatted_price = f"{quote.price:.2f} {currency}" if quote.price is not None else "Not available"
+
+        return {
+            "symbol": quote.symbol,
+            "company_name": quote.name,
+            "last_close_price": formatted_price,
+            "trend": trend,
+            "invested": invested_info,
+            "earnings": earnings_info
+        }
+
+    def _fetch_company_name(self, symbol):
+        # stock.info is a heavy scrape, so it only runs for symbols the metadata cache does not know yet
+        try:
+            return self.provider.company_name(symbol)
+        except CircuitOpenError:
+            # The price is still worth showing; a missing name is only cached briefly
+            return 'N/A'
+
+    @staticmethod
+    def _split_symbols(symbols):
+        return [symbol.strip() for symbol in symbols.split(';')]
 
     
+    @property
+    def currency_map(self):
+        # Read on every use, so a reloaded config applies to the next refresh
+        return self.config.get('currency_map', {"": "USD"})
+
+    @property
+    def currency_resolver(self):
+        # Compiled once per currency_map object, like the portfolio
+        currency_map = self.currency_map
+        if self._currency_resolver is None or self._currency_resolver_map is not currency_map:
+            self._currency_resolver = SuffixResolver(currency_map if isinstance(currency_map, dict) else {},
+                                                     default="USD")
+            self._currency_resolver_map = currency_map
+        return self._currency_resolver
+
+    @property
+    def portfolio(self):
+        # Lots are parsed once per investments object; a config reload only replaces it when the lots changed
+        investments = self.config.get('investments', {})
+        if self._portfolio is None or self._portfolio_investments is not investments:
+            self._portfolio = Portfolio.from_config(self.config, "stocks")
+            self._portfolio_investments = investments
+        return self._portfolio
+
+    def close(self):
+        # Stops the shard worker processes, if any
+        if self.shards is not None:
+            self.shards.close()
+
     def calculate_earnings(self, symbol, current_price):
-        investments = self.config.get('investments', {}).get("stocks", {})
-        total_invested = 0.0
-        total_earnings = 0.0
-        percentage_earned = 0.0
-        buy_price = 0.0
-        amount = 0
-        fee = 0.0
-
-        if symbol in investments:
-            transactions = investments[symbol]
-            for transaction in transactions:
-                buy_price = transaction.get('buy_price', 0)
-                quantity = transaction.get('quantity', 1)  # Default quantity to 1 if not specified
-                fee = transaction.get('fee', 0.0)  # Default fee to 0.0 if not specified
-                invested = (buy_price * quantity) + fee
-                total_invested += invested
-                earnings = (current_price - buy_price) * quantity
-                total_earnings += earnings
-                amount += quantity
-        
-            # Avoid division by zero
-            if total_invested > 0:
-                percentage_earned = (total_earnings / total_invested) * 100
-
-        average_buy_price = total_invested / amount if amount > 0 else 0
-
-        return total_earnings, total_invested, percentage_earned, average_buy_price, amount
-
-    def _display_stock_prices(self, symbols, now):
-        stock_prices = self.get_stock_prices(";".join(symbols))
+        with self.metrics.timer("earnings", (symbol,)):
+            return self.portfolio.position(symbol, current_price)
+
+    def _display_stock_prices(self, stock_prices, now):
         print("Stock Prices as of " + now)
         Utils.print_table_with_fixed_width(stock_prices)
\ No newline at end of file
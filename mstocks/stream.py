@@ -0,0 +1,117 @@
+import json
+import threading
+
+
+class Subscription:
+    """
+    One client's interest in a set of symbols of an asset class.
+
+    Changed rows are merged into a pending set, newest row per symbol, so a client that reads slower
+    than the refresh rate gets the latest state of every changed symbol instead of a growing backlog.
+    """
+
+    def __init__(self, stream, kind, symbols, notify):
+        """
+        :param notify: Called without arguments whenever new rows are pending; must not block.
+        """
+        self.stream = stream
+        self.kind = kind
+        self.symbols = frozenset(symbols)
+        self._notify = notify
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def _offer(self, encoded):
+        # encoded: {symbol: json text} of the rows that changed in one publish
+        if len(encoded) < len(self.symbols):
+            matched = [symbol for symbol in encoded if symbol in self.symbols]
+        else:
+            matched = [symbol for symbol in self.symbols if symbol in encoded]
+        if not matched:
+            return
+        with self._lock:
+            for symbol in matched:
+                self._pending[symbol] = encoded[symbol]
+        self._notify()
+
+    def take(self):
+        """Return the pending rows as one json payload and clear them, or None when nothing is pending."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        return self.stream.payload(self.kind, pending.values()) if pending else None
+
+    def close(self):
+        self.stream.unsubscribe(self)
+
+
+class QuoteStream:
+    """
+    Fans refreshed quotes out to streaming clients as deltas.
+
+    Every publish compares the new json rows of an asset class with the previous ones and encodes
+    the changed rows once. Each subscriber then only picks the encoded rows of its own symbols, so a
+    refresh costs one diff and one json encoding per changed symbol however many clients listen.
+    The fetch time of a row does not count as a change.
+    """
+
+    IGNORED_KEYS = ("fetched_at",)
+
+    def __init__(self):
+        self._latest = {}
+        self._subscriptions = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, kind, symbols, notify):
+        """Register a Subscription for symbols of kind; notify() is called when it has rows pending."""
+        subscription = Subscription(self, kind, symbols, notify)
+        with self._lock:
+            self._subscriptions.setdefault(kind, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.get(subscription.kind, set()).discard(subscription)
+
+    def subscriber_count(self, kind=None):
+        with self._lock:
+            if kind is not None:
+                return len(self._subscriptions.get(kind, ()))
+            return sum(len(subscriptions) for subscriptions in self._subscriptions.values())
+
+    def publish(self, kind, rows):
+        """
+        Hand the changed rows of kind to its subscribers.
+
+        :param rows: {symbol: json row} with the latest rows, e.g. Snapshot.by_symbol.
+        :return: The symbols whose rows changed.
+        """
+        with self._lock:
+            previous = self._latest.get(kind, {})
+            encoded = {symbol: json.dumps(row) for symbol, row in rows.items()
+                       if self._comparable(previous.get(symbol, (None, None))[0]) != self._comparable(row)}
+            latest = dict(previous)
+            latest.update((symbol, (row, encoded.get(symbol) or previous[symbol][1])) for symbol, row in rows.items())
+            self._latest[kind] = latest
+            subscriptions = list(self._subscriptions.get(kind, ()))
+        if encoded:
+            for subscription in subscriptions:
+                subscription._offer(encoded)
+        return list(encoded)
+
+    def current(self, kind, symbols):
+        """Return the json payload with the latest known rows of symbols, or None when none is known yet."""
+        with self._lock:
+            latest = self._latest.get(kind, {})
+            encoded = [latest[symbol][1] for symbol in dict.fromkeys(symbols) if symbol in latest]
+        return self.payload(kind, encoded) if encoded else None
+
+    @staticmethod
+    def payload(kind, encoded_rows):
+        # Rows are already encoded, so the message is put together without encoding them again
+        return '{"kind": %s, "quotes": [%s]}' % (json.dumps(kind), ", ".join(encoded_rows))
+
+    @classmethod
+    def _comparable(cls, row):
+        if not isinstance(row, dict):
+            return row
+        return {key: value for key, value in row.items() if key not in cls.IGNORED_KEYS}
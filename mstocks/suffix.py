@@ -0,0 +1,44 @@
+class SuffixResolver:
+    """
+    Maps ticker symbols to a value by their longest matching suffix, e.g. ".WA" -> "PLN".
+
+    The table is compiled once: suffixes are grouped by length and tried longest first, so a
+    lookup costs one dict probe per distinct suffix length instead of an endswith per entry, and
+    the order of the source mapping does not matter (a "" catch-all never shadows ".WA").
+    Resolved symbols are memoized, so a watchlist of thousands of tickers pays the probes once.
+    """
+
+    def __init__(self, mapping, default=None, memo_size=65536):
+        """
+        :param mapping: {suffix: value}. An empty suffix matches every symbol.
+        :param default: Value of symbols no suffix matches.
+        :param memo_size: Most symbols remembered; the memo starts over when it is full.
+        """
+        self.mapping = dict(mapping)
+        self.default = default
+        self.memo_size = memo_size
+        by_length = {}
+        for suffix, value in self.mapping.items():
+            by_length.setdefault(len(suffix), {})[suffix] = value
+        self._tables = sorted(by_length.items(), reverse=True)
+        self._memo = {}
+
+    def resolve(self, symbol):
+        try:
+            return self._memo[symbol]
+        except KeyError:
+            pass
+        value = self.default
+        for length, table in self._tables:
+            if length > len(symbol):
+                continue
+            suffix = symbol[len(symbol) - length:]
+            if suffix in table:
+                value = table[suffix]
+                break
+        if len(self._memo) >= self.memo_size:
+            self._memo = {}
+        self._memo[symbol] = value
+        return value
+
+    __call__ = resolve
@@ -0,0 +1,199 @@
+import random
+import threading
+import time
+
+from .utils import Utils
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling upstream while the circuit breaker is open."""
+
+
+class UpstreamError(Exception):
+    """Raised by a provider when upstream reported a failure, e.g. throttling, instead of raising it."""
+
+
+class TokenBucket:
+    """
+    Rate limiter allowing `rate` calls per second on average and bursts of up to `burst` calls.
+    """
+
+    def __init__(self, rate, burst, clock=time.monotonic, sleep=time.sleep):
+        self.rate = float(rate)
+        self.burst = max(1.0, float(burst))
+        self.clock = clock
+        self.sleep = sleep
+        self._tokens = self.burst
+        self._updated = clock()
+        self._lock = threading.Lock()
+        self.waited = 0.0
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    @property
+    def tokens(self):
+        with self._lock:
+            self._refill(self.clock())
+            return self._tokens
+
+    def acquire(self):
+        """Take one token, sleeping until one is available. Returns the seconds waited."""
+        if self.rate <= 0:
+            return 0.0
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill(self.clock())
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    self.waited += waited
+                    return waited
+                delay = (1.0 - self._tokens) / self.rate
+            self.sleep(delay)
+            waited += delay
+
+
+class CircuitBreaker:
+    """
+    Stops calling upstream after `threshold` failed calls in a row.
+
+    While open every call is rejected with CircuitOpenError. After `reset_timeout` seconds one trial
+    call is let through (half open): its success closes the circuit, its failure opens it again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, threshold=5, reset_timeout=30, clock=time.monotonic):
+        self.threshold = max(1, int(threshold))
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.trips = 0
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        with self._lock:
+            if self.state == self.OPEN:
+                if self.clock() - self.opened_at < self.reset_timeout:
+                    raise CircuitOpenError(f"Upstream paused after {self.failures} failures in a row")
+                self.state = self.HALF_OPEN
+            elif self.state == self.HALF_OPEN:
+                # Only the trial call goes through until it has an outcome
+                raise CircuitOpenError("Upstream paused, trial call in progress")
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.threshold:
+                if self.state != self.OPEN:
+                    self.trips += 1
+                self.state = self.OPEN
+                self.opened_at = self.clock()
+
+
+class Upstream:
+    """
+    Access layer every yfinance call goes through: rate limited, retried, and cut off when upstream keeps failing.
+
+    Each call first takes a token from the shared TokenBucket. Failures that may be transient
+    (network errors, throttling) are retried up to `retries` times after an exponential backoff with
+    full jitter, so concurrent workers do not retry in lockstep. Answers that say the request itself is
+    bad (ValueError, KeyError, IndexError, TypeError) are raised at once and count as upstream working.
+    A call that still fails counts towards the CircuitBreaker; while it is open calls fail fast with
+    CircuitOpenError and the refresher keeps serving the last good quotes.
+    """
+
+    PERMANENT_ERRORS = (ValueError, KeyError, IndexError, TypeError)
+
+    _shared = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, rate=5, burst=10, retries=2, backoff=0.5, max_backoff=4, failure_threshold=5,
+                 reset_timeout=30, clock=time.monotonic, sleep=time.sleep, jitter=random.random):
+        self.limiter = TokenBucket(rate, burst, clock=clock, sleep=sleep)
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout, clock=clock)
+        self.retries = max(0, int(retries))
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.sleep = sleep
+        self.jitter = jitter
+        self.calls = 0
+        self.retried = 0
+        self.failed = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        """Return the process-wide Upstream for the limits in config, shared by every manager using them."""
+        settings = (Utils.as_float(config.get('upstream_rate', 5), 5),
+                    Utils.as_float(config.get('upstream_burst', 10), 10),
+                    Utils.as_int(config.get('upstream_retries', 2), 2),
+                    Utils.as_int(config.get('breaker_threshold', 5), 5),
+                    Utils.as_float(config.get('breaker_reset', 30), 30))
+        with cls._shared_lock:
+            upstream = cls._shared.get(settings)
+            if upstream is None:
+                rate, burst, retries, threshold, reset = settings
+                upstream = cls._shared[settings] = cls(rate, burst, retries, failure_threshold=threshold,
+                                                       reset_timeout=reset)
+            return upstream
+
+    def call(self, func, *args, **kwargs):
+        """Return func(*args, **kwargs), going through the limiter, retries and breaker."""
+        try:
+            self.breaker.before_call()
+        except CircuitOpenError:
+            self._count('rejected')
+            raise
+        attempt = 0
+        while True:
+            self.limiter.acquire()
+            self._count('calls')
+            try:
+                result = func(*args, **kwargs)
+            except self.PERMANENT_ERRORS:
+                self.breaker.record_success()
+                raise
+            except Exception:
+                if attempt >= self.retries:
+                    self._count('failed')
+                    self.breaker.record_failure()
+                    raise
+                attempt += 1
+                self._count('retried')
+                self.sleep(self.jitter() * min(self.max_backoff, self.backoff * 2 ** (attempt - 1)))
+                continue
+            self.breaker.record_success()
+            return result
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def state(self):
+        """Return the limiter and breaker state and the call counters, e.g. for metrics."""
+        return {
+            "limiter_rate": self.limiter.rate,
+            "limiter_tokens": self.limiter.tokens,
+            "limiter_wait_seconds": self.limiter.waited,
+            "breaker_state": self.breaker.state,
+            "breaker_failures": self.breaker.failures,
+            "breaker_trips": self.breaker.trips,
+            "calls": self.calls,
+            "retries": self.retried,
+            "failures": self.failed,
+            "rejected": self.rejected,
+        }
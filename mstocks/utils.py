@@ -1,4 +1,22 @@
 import re
+from .suffix import SuffixResolver
+
+
+class Cell(str):
+    """
+    Table cell whose display text comes with the number it was formatted from.
+
+    The text has no color codes, so its length is its width on screen, and the table colors it by
+    the sign of value instead of parsing the text back. Being a str, it still works anywhere the
+    plain formatted string did.
+    """
+
+    def __new__(cls, text, value=None):
+        cell = super().__new__(cls, text)
+        cell.value = value
+        return cell
+
+
 class Utils:
     GREEN = "\033[92m"
     RED = "\033[91m"
@@ -13,88 +31,119 @@ class Utils:
     BOLD = '\033[1m'
     UNDERLINE = '\033[4m'
 
-    @staticmethod
-    def get_currency(symbol, currency_map):
-        for key in currency_map:
-            if symbol.endswith(key):
-                return currency_map[key]
-        return "USD"  # Default to USD if not found
+    ANSI_ESCAPE = re.compile(r'(?:\x1b\[|\x9b)[0-?]*[ -\/]*[@-~]')
+
+    # Compiled SuffixResolvers by the contents of their currency map; starts over when full
+    _currency_resolvers = {}
+    CURRENCY_RESOLVERS_SIZE = 32
+
+    @classmethod
+    def get_currency(cls, symbol, currency_map):
+        """
+        Return the currency of the longest suffix of symbol in currency_map, USD when none matches.
+        The resolver of each distinct currency_map is compiled once and reused by later calls.
+        """
+        key = tuple(currency_map.items())
+        resolver = cls._currency_resolvers.get(key)
+        if resolver is None:
+            resolver = SuffixResolver(currency_map, default="USD")
+            if len(cls._currency_resolvers) >= cls.CURRENCY_RESOLVERS_SIZE:
+                cls._currency_resolvers = {}
+            cls._currency_resolvers[key] = resolver
+        return resolver.resolve(symbol)
     
+    @staticmethod
+    def as_int(value, default):
+        """
+        Converts a config value to int, falling back to the default when it is missing or malformed.
+        """
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return default
+
+    @staticmethod
+    def as_float(value, default):
+        """
+        Converts a config value to float, falling back to the default when it is missing or malformed.
+        """
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return default
+
     @staticmethod
     def strip_ansi_codes(text):
         """
         Removes ANSI color/style sequences from a string.
         """
-        ansi_escape = re.compile(r'(?:\x1b\[|\x9b)[0-?]*[ -\/]*[@-~]')
-        return ansi_escape.sub('', text)
+        return Utils.ANSI_ESCAPE.sub('', text)
 
     @staticmethod
-    def print_table_with_fixed_width(prices, include_market_status=True):
-        # Define colors for positive and negative earnings
-        POSITIVE_EARNINGS = Utils.OKGREEN
-        NEGATIVE_EARNINGS = Utils.FAIL
-        
+    def table_headers(include_market_status=True):
         # Adjust headers based on whether to include market status
         if include_market_status:
             headers = ['Market status', 'Symbol', 'Name', 'Price', 'Trend', 'Invested', 'Earnings']
         else:
             headers = ['Symbol', 'Name', 'Price', 'Trend', 'Invested', 'Earnings']
         # Strip extra spaces from the headers
-        headers = [header.strip() for header in headers]
-
-        max_widths = [0] * len(headers)
-        for row in prices:
-            for i, item in enumerate(row):
-                if i >= len(headers):  # Ensure we do not exceed the header count
-                    break  # Skip any extra items in the row beyond the number of headers
-                length = len(Utils.strip_ansi_codes(str(item)))
-                if length > max_widths[i]:
-                    max_widths[i] = length
-
-        # Now ensure that max_widths accommodates the headers as well
-        for i, header in enumerate(headers):
-            length = len(header)
-            if length > max_widths[i]:
-                max_widths[i] = length
+        return [header.strip() for header in headers]
+
+    @staticmethod
+    def table_cell(item):
+        """
+        Returns (display string, width on screen) of one table cell.
+
+        A Cell is colored green or red by the sign of its value. Any other value is shown as it is,
+        keeping whatever color codes it already has, which do not count towards its width.
+        """
+        if type(item) is Cell or isinstance(item, Cell):
+            value = item.value
+            if value is not None and value > 0:
+                return Utils.OKGREEN + item + Utils.ENDC, len(item)
+            if value is not None and value < 0:
+                return Utils.FAIL + item + Utils.ENDC, len(item)
+            return str(item), len(item)
+        item_str = item if type(item) is str else str(item)
+        if '\x1b' in item_str or '\x9b' in item_str:
+            return item_str, len(Utils.strip_ansi_codes(item_str))
+        return item_str, len(item_str)
+
+    @staticmethod
+    def table_cells(rows, headers):
+        """
+        Returns every row as a list of (display string, width) cells, cut to the header count, and the column widths.
+        """
+        count = len(headers)
+        widths = [len(header) for header in headers]
+        table_cell = Utils.table_cell
+        table = []
+        for row in rows:
+            cells = [table_cell(item) for item in row[:count]]
+            for i, (_, width) in enumerate(cells):
+                if width > widths[i]:
+                    widths[i] = width
+            table.append(cells)
+        return table, widths
+
+    @staticmethod
+    def print_table_with_fixed_width(prices, include_market_status=True):
+        headers = Utils.table_headers(include_market_status)
+        cells, max_widths = Utils.table_cells(prices, headers)
 
         # Create a horizontal separator
         horizontal_sep = '-' * (sum(max_widths) + (3 * (len(max_widths) - 1)))
 
         # Print headers with bold style
         format_str = ' | '.join(f"{Utils.BOLD}{{:<{w}}}{Utils.ENDC}" for w in max_widths)
-        print(format_str.format(*headers))
-        print(horizontal_sep)
-
-        # Print each row
-        for row in prices:
-            formatted_row = []
-            for i, item in enumerate(row):
-                if i >= len(headers):  # Ensure we do not exceed the header count
-                    break  # Skip any extra items in the row beyond the number of headers
-                item_str = str(item)
-
-                # Apply color coding to Trend column (assuming it's the second to last column)
-                if '↑' in item_str:
-                    item_str = Utils.OKGREEN + item_str + Utils.ENDC
-                elif '↓' in item_str:
-                    item_str = Utils.FAIL + item_str + Utils.ENDC
-                
-                # Apply color coding to Earnings column (assuming it's the last column)
-                if i == len(row) - 1:
-                    if item_str != '—':  # Check if earnings is not the placeholder
-                        # Apply strip_ansi_codes here
-                        item_str_clean = Utils.strip_ansi_codes(item_str)
-                        earnings_value = float(item_str_clean.split()[0])
-                        if earnings_value > 0:
-                            item_str = POSITIVE_EARNINGS + item_str + Utils.ENDC
-                        elif earnings_value < 0:
-                            item_str = NEGATIVE_EARNINGS + item_str + Utils.ENDC
-
-                formatted_row.append(item_str)
-
-            # Print the row with the dynamic format string
-            # Use list slicing to ensure the row length matches header count
-            print(format_str.format(*formatted_row[:len(headers)]))
+        lines = [format_str.format(*headers), horizontal_sep]
+
+        # Cells are padded by their on-screen width, which color codes do not count towards
+        bold, end = Utils.BOLD, Utils.ENDC
+        for row in cells:
+            lines.append(' | '.join([f"{bold}{display}{' ' * (max_widths[i] - width)}{end}"
+                                     for i, (display, width) in enumerate(row)]))
+        print('\n'.join(lines))
 
     @staticmethod
     def _format_value(value, currency, percent_change=None):
@@ -107,26 +156,33 @@ class Utils:
         :param percent_change: Optional. The percent change as a float. When provided, it's included in the formatted output.
         :return: A string formatted with value, currency, optional percent change, and directional arrows, all color-coded.
         """
-        # Color and direction are determined by the value.
+        # Color is determined by the value.
         color = Utils.GREEN if value > 0 else Utils.RED if value < 0 else ""
+        cell = Utils.value_cell(value, currency, percent_change)
+        # Reset the color at the end.
+        return f"{color}{cell}{Utils.RESET}" if color else str(cell)
+
+    @staticmethod
+    def value_cell(value, currency, percent_change=None):
+        """
+        Same text as _format_value, without color codes, as a Cell that keeps the value for coloring.
+        """
+        # Direction is determined by the value.
         direction = "↑" if value > 0 else "↓" if value < 0 else ""
-        
+
         # Format the basic string with value and currency.
-        formatted_str = f"{color}{value:+.2f} {currency}"
-        
+        formatted_str = f"{value:+.2f} {currency}"
+
         # If there's a percent change, append it.
         if percent_change is not None:
             formatted_str += f" ({abs(percent_change):.2f}%)"
-        
+
         # Add the direction symbol if the value is not zero.
         if value != 0:
             formatted_str += f" {direction}"
-        
-        # Reset the color at the end.
-        formatted_str += f"{Utils.RESET}" if color else ""
-        
-        return formatted_str    
-    
+
+        return Cell(formatted_str, value)
+
     @staticmethod
     def _collect_symbols(text):
         inpt = input(text)
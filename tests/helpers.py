@@ -0,0 +1,21 @@
+from unittest.mock import MagicMock
+
+import pandas as pd
+
+
+def daily_bars(symbols, closes):
+    # Frame shaped like yf.download(group_by='ticker'): one column block of daily closes per symbol
+    index = pd.date_range('2024-03-06', periods=len(closes), freq='D')
+    return pd.concat({symbol: pd.DataFrame({'Close': closes}, index=index) for symbol in symbols}, axis=1)
+
+
+def bulk_download(closes):
+    # Stand-in for yf.download returning the same daily closes for every requested symbol
+    return lambda symbols, **kwargs: daily_bars(symbols, closes)
+
+
+def bulk_source(closes=(100.0, 110.0)):
+    # Stand-in download source for a BatchFetcher, recording every request
+    source = MagicMock()
+    source.download.side_effect = bulk_download(list(closes))
+    return source
@@ -0,0 +1,138 @@
+import asyncio
+import json
+import unittest
+from unittest.mock import patch
+
+import pandas as pd
+from aiohttp.test_utils import TestClient, TestServer
+from mstocks import async_server, endpoints
+from mstocks.async_server import AsyncApiServices, create_app
+from mstocks.crypto import CryptoManager
+from mstocks.endpoints import ApiServices, app
+from mstocks.fx import FxRateProvider
+from mstocks.metrics import Metrics
+from mstocks.providers import ReplayProvider
+from mstocks.stocks import StocksManager
+from mstocks.upstream import Upstream
+
+
+def replay_provider(closes, upstream, metrics):
+    index = pd.date_range('2024-03-06', periods=2, freq='D')
+    bars = {symbol: pd.DataFrame({'Close': values}, index=index) for symbol, values in closes.items()}
+    return ReplayProvider(bars, {symbol: f"{symbol} Inc." for symbol in closes}, {"USD": {"PLN": 4.0, "USD": 1.0}},
+                          upstream=upstream, metrics=metrics)
+
+
+class TestAsyncServer(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.metrics = Metrics()
+        self.upstream = Upstream(rate=0)
+        self.provider = replay_provider({'AAPL': [100.0, 110.0], 'MSFT': [200.0, 190.0], 'TSLA': [50.0, 55.0],
+                                         'BTC-USD': [60000.0, 61000.0]}, self.upstream, self.metrics)
+        config = {'refresh_rate': 60, 'default_stocks': ['MSFT', 'AAPL'], 'default_cryptos': ['BTC-USD'],
+                  'crypto_currency': 'USD', 'currency_map': {"": "USD"},
+                  'investments': {'stocks': {'AAPL': [{'buy_price': 100, 'quantity': 2}]}}}
+        self.api = ApiServices(config, metrics=self.metrics,
+                               stocks_manager=StocksManager(config, provider=self.provider, upstream=self.upstream,
+                                                            metrics=self.metrics),
+                               crypto_manager=CryptoManager(config, provider=self.provider, upstream=self.upstream,
+                                                            fx_provider=FxRateProvider(source=self.provider),
+                                                            metrics=self.metrics))
+        self.services = AsyncApiServices(config, services=self.api)
+        self.client = TestClient(TestServer(create_app(services=self.services)))
+        await self.client.start_server()
+
+    async def asyncTearDown(self):
+        await self.client.close()
+
+    async def test_json_matches_flask_route(self):
+        response = await self.client.get('/api/stocks/AAPL;TSLA')
+        self.assertEqual(response.status, 200)
+        self.assertIn('X-Data-Age', response.headers)
+        rows = await response.json()
+
+        endpoints._services = self.api
+        try:
+            flask_rows = app.test_client().get('/api/stocks/AAPL;TSLA').get_json()
+        finally:
+            endpoints._services = None
+        self.assertEqual(rows, flask_rows)
+        self.assertEqual([row["symbol"] for row in rows], ["AAPL", "TSLA"])
+
+    async def test_fetches_go_through_provider_upstream_and_metrics(self):
+        await self.services.stock_prices(['TSLA'])
+
+        self.assertGreater(self.upstream.calls, 0)
+        self.assertGreater(self.provider.calls, 0)
+        self.assertGreater(self.metrics.stage("history").count, 0)
+        self.assertIn(("history", "ok"), self.metrics.calls())
+
+    async def test_default_routes_served_from_refresher(self):
+        stocks = await (await self.client.get('/api/stocks')).json()
+        crypto = await (await self.client.get('/api/crypto')).json()
+        self.assertEqual([row["symbol"] for row in stocks], ["MSFT", "AAPL"])
+        self.assertEqual(crypto[0]["symbol"], "BTC-USD")
+        self.assertIsNotNone(self.api.refresher.snapshot("stocks"))
+
+    async def test_unknown_symbol_gets_error_row(self):
+        rows = await (await self.client.get('/api/stocks/AAPL;NOPE')).json()
+        self.assertEqual(rows[0]["symbol"], "AAPL")
+        self.assertEqual(rows[1]["symbol"], "NOPE")
+
+    async def test_blank_symbols_not_fetched(self):
+        with patch.object(self.api.stocks_manager, 'get_stock_prices_json') as fetch:
+            rows = await (await self.client.get('/api/stocks/ ; ')).json()
+        self.assertEqual(rows, [])
+        fetch.assert_not_called()
+
+    async def test_concurrent_clients_share_one_fetch(self):
+        fetch = self.api.stocks_manager.get_stock_prices_json
+        with patch.object(self.api.stocks_manager, 'get_stock_prices_json', wraps=fetch) as counted:
+            responses = await asyncio.gather(*(self.client.get('/api/stocks/TSLA;AAPL') for _ in range(200)))
+        self.assertTrue(all(response.status == 200 for response in responses))
+        self.assertEqual(counted.call_count, 1)
+
+    async def test_event_stream_sends_watchlist_rows(self):
+        response = await self.client.get('/api/stream/stocks/AAPL')
+        self.assertEqual(response.headers['Content-Type'], 'text/event-stream')
+        while True:
+            event = await asyncio.wait_for(response.content.readuntil(b"\n\n"), 5)
+            if event.startswith(b"event: quotes"):
+                break
+        payload = json.loads(event.split(b"data: ")[1])
+        self.assertEqual([row["symbol"] for row in payload["quotes"]], ["AAPL"])
+        response.close()
+
+    async def test_websocket_sends_watchlist_rows(self):
+        ws = await self.client.ws_connect('/api/ws/crypto')
+        payload = await ws.receive_json(timeout=5)
+        self.assertEqual(payload["kind"], "crypto")
+        self.assertEqual([row["symbol"] for row in payload["quotes"]], ["BTC-USD"])
+        await ws.close()
+
+    async def test_stream_of_untracked_symbol_is_not_found(self):
+        response = await self.client.get('/api/stream/stocks/TSLA')
+        self.assertEqual(response.status, 404)
+
+    async def test_metrics_route(self):
+        await self.services.stock_prices(['TSLA'])
+        response = await self.client.get('/metrics')
+        self.assertEqual(response.status, 200)
+        self.assertIn('mstocks_upstream_calls_total{operation="history",outcome="ok"}', await response.text())
+
+
+class TestRun(unittest.TestCase):
+
+    @patch('mstocks.async_server.create_app')
+    @patch('mstocks.async_server.web.run_app')
+    def test_listens_on_api_host(self, run_app, create_app):
+        async_server.run({}, port=5002)
+        self.assertEqual(run_app.call_args.kwargs, {"host": "127.0.0.1", "port": 5002})
+
+        async_server.run({'api_host': "0.0.0.0"})
+        self.assertEqual(run_app.call_args.kwargs["host"], "0.0.0.0")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import unittest
+from unittest.mock import patch
+
+import pandas as pd
+from mstocks.batch import BatchFetcher
+from mstocks.providers import YFinanceProvider
+
+
+class CountingSource:
+    # Stand-in for the bulk download that records how many upstream requests were made
+    def __init__(self, fail=False):
+        self.calls = []
+        self.fail = fail
+
+    def download(self, symbols, period="2d"):
+        self.calls.append(list(symbols))
+        if self.fail:
+            raise ConnectionError("upstream down")
+        return pd.concat({symbol: pd.DataFrame({'Close': [10.0, 11.0]}) for symbol in symbols}, axis=1)
+
+
+class TestBatchFetcher(unittest.TestCase):
+
+    def test_calls_grow_with_batches_not_symbols(self):
+        source = CountingSource()
+        fetcher = BatchFetcher(source, batch_size=100)
+        symbols = [f"SYM{i}" for i in range(250)]
+
+        histories = fetcher.fetch_history(symbols)
+
+        self.assertEqual(len(source.calls), 3)
+        self.assertEqual([len(batch) for batch in source.calls], [100, 100, 50])
+        self.assertEqual(len(histories), 250)
+        self.assertEqual(histories["SYM249"]['Close'].iloc[-1], 11.0)
+
+    def test_blank_and_duplicate_symbols_are_not_requested(self):
+        source = CountingSource()
+        fetcher = BatchFetcher(source, batch_size=10)
+        fetcher.fetch_history(["AAPL", "", "AAPL", "MSFT"])
+        self.assertEqual(source.calls, [["AAPL", "MSFT"]])
+
+    def test_failed_batch_maps_symbols_to_exception(self):
+        fetcher = BatchFetcher(CountingSource(fail=True), batch_size=10)
+        histories = fetcher.fetch_history(["AAPL", "MSFT"])
+        self.assertIsInstance(histories["AAPL"], ConnectionError)
+        self.assertIsInstance(histories["MSFT"], ConnectionError)
+
+    def test_split_frame_drops_days_symbol_did_not_trade(self):
+        frame = pd.concat({
+            "AAPL": pd.DataFrame({'Close': [1.0, 2.0, 3.0]}),
+            "CDR.WA": pd.DataFrame({'Close': [5.0, None, 6.0]}),
+        }, axis=1)
+        histories = BatchFetcher.split_frame(frame, ["AAPL", "CDR.WA", "MISSING"])
+        self.assertEqual(len(histories["AAPL"]), 3)
+        self.assertEqual(list(histories["CDR.WA"]['Close']), [5.0, 6.0])
+        self.assertTrue(histories["MISSING"].empty)
+
+    def test_split_frame_flat_single_symbol(self):
+        frame = pd.DataFrame({'Close': [1.0, 2.0]})
+        histories = BatchFetcher.split_frame(frame, ["AAPL"])
+        self.assertEqual(list(histories["AAPL"]['Close']), [1.0, 2.0])
+
+    @patch('mstocks.providers.yf.download')
+    def test_yfinance_source_requests_all_symbols_at_once(self, mock_download):
+        YFinanceProvider().download(["AAPL", "MSFT"], period="2d")
+        mock_download.assert_called_once()
+        self.assertEqual(mock_download.call_args[0][0], ["AAPL", "MSFT"])
+        self.assertEqual(mock_download.call_args[1]['group_by'], "ticker")
+
+if __name__ == '__main__':
+    unittest.main()
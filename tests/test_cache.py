@@ -0,0 +1,116 @@
+import threading
+import time
+import unittest
+
+from mstocks.cache import TTLCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTTLCache(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = TTLCache(ttl=60, clock=self.clock)
+
+    def test_value_is_reused_within_ttl(self):
+        calls = []
+        loader = lambda: calls.append(1) or len(calls)
+        self.assertEqual(self.cache.get_or_load("USD", loader), 1)
+        self.clock.now = 59
+        self.assertEqual(self.cache.get_or_load("USD", loader), 1)
+        self.assertEqual(len(calls), 1)
+
+    def test_value_is_reloaded_after_ttl(self):
+        calls = []
+        loader = lambda: calls.append(1) or len(calls)
+        self.cache.get_or_load("USD", loader)
+        self.clock.now = 61
+        self.assertEqual(self.cache.get_or_load("USD", loader), 2)
+
+    def test_stale_value_served_when_reload_fails(self):
+        self.cache.get_or_load("USD", lambda: "old")
+        self.clock.now = 500
+
+        def failing():
+            raise ConnectionError("down")
+
+        self.assertEqual(self.cache.get_or_load("USD", failing), "old")
+
+    def test_max_stale_limits_fallback(self):
+        cache = TTLCache(ttl=60, max_stale=30, clock=self.clock)
+        cache.get_or_load("USD", lambda: "old")
+        self.clock.now = 100
+
+        def failing():
+            raise ConnectionError("down")
+
+        with self.assertRaises(ConnectionError):
+            cache.get_or_load("USD", failing)
+
+    def test_error_without_cached_value_is_raised(self):
+        def failing():
+            raise ConnectionError("down")
+
+        with self.assertRaises(ConnectionError):
+            self.cache.get_or_load("USD", failing)
+
+    def test_invalidate(self):
+        self.cache.set("a", 1)
+        self.cache.set("b", 2)
+        self.cache.invalidate("a")
+        self.assertIsNone(self.cache.get("a"))
+        self.assertEqual(self.cache.get("b"), 2)
+        self.cache.invalidate()
+        self.assertIsNone(self.cache.get("b"))
+
+    def test_concurrent_loads_share_one_call(self):
+        cache = TTLCache(ttl=60)
+        calls = []
+        release = threading.Event()
+
+        def slow_loader():
+            calls.append(1)
+            release.wait(2)
+            return "rates"
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get_or_load("USD", slow_loader)))
+                   for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.1)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ["rates"] * 10)
+
+    def test_max_entries_drops_oldest(self):
+        cache = TTLCache(ttl=60, clock=self.clock, max_entries=2)
+        for i, key in enumerate("abc"):
+            self.clock.now = i
+            cache.get_or_load(key, lambda: key)
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.get("c"), "c")
+
+    def test_max_entries_drops_entries_past_max_stale_first(self):
+        cache = TTLCache(ttl=10, max_stale=10, clock=self.clock, max_entries=2)
+        cache.set("old", 1)
+        self.clock.now = 5
+        cache.set("fresh", 2)
+        self.clock.now = 21
+        cache.set("new", 3)
+        self.assertIsNone(cache.get_stale("old"))
+        self.assertEqual(cache.get_stale("fresh"), 2)
+
+if __name__ == '__main__':
+    unittest.main()
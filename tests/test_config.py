@@ -1,7 +1,11 @@
+import os
+import tempfile
+import time
 import unittest
 from unittest.mock import patch, mock_open
 import json
 from mstocks.config import Config
+from mstocks.stocks import StocksManager
 
 class TestConfig(unittest.TestCase):
 
@@ -53,5 +57,92 @@ class TestConfig(unittest.TestCase):
         # Check if None is returned
         self.assertIsNone(non_existing)
 
+
+class TestConfigReload(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'config.json')
+        self.write({"default_stocks": ["AAPL"], "investments": {"AAPL": [{"buy_price": 100}]}, "refresh_rate": 60})
+        self.config = Config(self.path)
+
+    def tearDown(self):
+        self.config.stop_watching()
+        self.directory.cleanup()
+
+    def write(self, data):
+        with open(self.path, 'w') as file:
+            file.write(data if isinstance(data, str) else json.dumps(data))
+        # Make every write visible to the mtime check, however coarse the file system clock is
+        stamp = time.time_ns() + getattr(self, 'writes', 0) * 10 ** 9
+        self.writes = getattr(self, 'writes', 0) + 1
+        os.utime(self.path, ns=(stamp, stamp))
+
+    def test_unchanged_file_is_not_parsed_again(self):
+        with patch.object(self.config, 'load_config') as load:
+            self.assertEqual(self.config.reload(), set())
+        load.assert_not_called()
+
+    def test_reload_swaps_in_changed_keys(self):
+        investments = self.config.get('investments')
+        self.write({"default_stocks": ["AAPL", "MSFT"], "investments": {"AAPL": [{"buy_price": 100}]}, "refresh_rate": 60})
+        self.assertEqual(self.config.reload(), {"default_stocks"})
+        self.assertEqual(self.config.get('default_stocks'), ["AAPL", "MSFT"])
+        # Unchanged values keep their identity, so caches built from them stay valid
+        self.assertIs(self.config.get('investments'), investments)
+        self.assertEqual(self.config.version, 1)
+
+    def test_invalid_file_keeps_current_snapshot(self):
+        self.write('{"default_stocks": [')
+        self.assertEqual(self.config.reload(), set())
+        self.assertIsInstance(self.config.last_error, ValueError)
+        self.write({"default_stocks": "AAPL"})
+        self.assertEqual(self.config.reload(), set())
+        self.assertEqual(self.config.get('default_stocks'), ["AAPL"])
+
+    def test_invalid_investment_lot_keeps_current_snapshot(self):
+        for investments in ({"AAPL": [{"buy_price": "100"}]},
+                            {"stocks": {"AAPL": [{"buy_price": 100, "quantity": None}]}},
+                            {"cryptos": {"BTC-USD": [{"buy_price": 100, "fee": -1}]}},
+                            {"stocks": {"AAPL": {"buy_price": 100}}},
+                            {"stocks": ["AAPL"]}):
+            self.write({"default_stocks": ["AAPL"], "investments": investments, "refresh_rate": 60})
+            self.assertEqual(self.config.reload(), set())
+            self.assertIsInstance(self.config.last_error, ValueError)
+            self.assertEqual(self.config.get('investments'), {"AAPL": [{"buy_price": 100}]})
+
+        self.write({"default_stocks": ["AAPL"], "refresh_rate": 60,
+                    "investments": {"stocks": {"AAPL": [{"buy_price": 100.5, "quantity": 2, "fee": 0}]}}})
+        self.assertEqual(self.config.reload(), {"investments"})
+        self.assertIsNone(self.config.last_error)
+
+    def test_listeners_get_changed_keys(self):
+        changes = []
+        self.config.add_listener(changes.append)
+        self.write({"default_stocks": ["AAPL"], "investments": {}, "refresh_rate": 30})
+        self.config.reload()
+        self.assertEqual(changes, [{"investments", "refresh_rate"}])
+
+    def test_portfolio_rebuilt_only_when_investments_change(self):
+        manager = StocksManager(self.config)
+        portfolio = manager.portfolio
+        self.write({"default_stocks": ["MSFT"], "investments": {"AAPL": [{"buy_price": 100}]}, "refresh_rate": 60})
+        self.config.reload()
+        self.assertIs(manager.portfolio, portfolio)
+        self.write({"default_stocks": ["MSFT"], "investments": {"AAPL": [{"buy_price": 90}]}, "refresh_rate": 60})
+        self.config.reload()
+        self.assertIsNot(manager.portfolio, portfolio)
+        self.assertEqual(manager.portfolio.position('AAPL', 100).earnings, 10.0)
+
+    def test_watch_picks_up_changes(self):
+        changes = []
+        self.config.add_listener(changes.append)
+        self.config.watch(interval=0.01)
+        self.write({"default_stocks": ["TSLA"], "investments": {"AAPL": [{"buy_price": 100}]}, "refresh_rate": 60})
+        deadline = time.monotonic() + 2
+        while not changes and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(changes, [{"default_stocks"}])
+
 if __name__ == '__main__':
     unittest.main()
@@ -4,14 +4,16 @@ from unittest.mock import patch, MagicMock
 import pandas as pd
 from mstocks.config import Config
 from mstocks.crypto import CryptoManager
+from mstocks.fx import FxRateError
+from tests.helpers import bulk_download
 
 class TestCryptoManager(unittest.TestCase):
     
     def setUp(self):
         self.crypto_manager = CryptoManager(Config())
 
-    @patch('mstocks.stocks.yf.Ticker')
-    def test_empty_symbol_string_for_crypto(self, mock_ticker):
+    @patch('mstocks.providers.yf.download', return_value=pd.DataFrame())
+    def test_empty_symbol_string_for_crypto(self, mock_download):
         # Assuming your StocksManager is initialized here
         stocks_manager = CryptoManager(Config())
         result = stocks_manager.get_crypto_prices('BTC-USD')
@@ -27,16 +29,10 @@ class TestCryptoManager(unittest.TestCase):
         self.assertTrue(stocks_manager.crypto_enabled)
         self.assertEqual(stocks_manager.currency_map, {"BTC": "USD"})
 
-    @patch('mstocks.stocks.yf.Ticker')
-    def test_get_crypto_prices(self, mock_ticker):
-        # Setup a mock DataFrame response
-        data = {
-            'Close': [50000, 51000],
-        }
-        mock_hist = pd.DataFrame(data)
-
-        # Mock the history method to return our mock DataFrame
-        mock_ticker.return_value.history.return_value = mock_hist
+    @patch('mstocks.providers.yf.download')
+    def test_get_crypto_prices(self, mock_download):
+        # Mock the bulk download to return our mock closes
+        mock_download.side_effect = bulk_download([50000, 51000])
 
         # Assuming your StocksManager initialization is properly set up
         config = {"currency_map": {"BTC-USD": "USD"}, 'default_stocks': [], 'refresh_rate': 60}
@@ -116,13 +112,11 @@ class TestCryptoManager(unittest.TestCase):
         self.assertEqual(buy_price, 41671.666666666664)
         self.assertEqual(quantity, 3)
 
-    @patch('mstocks.stocks.yf.Ticker')
+    @patch('mstocks.providers.yf.download')
     @patch('mstocks.stocks.Config')
-    def test_correct_json_structure(self, mock_config, mock_ticker):
+    def test_correct_json_structure(self, mock_config, mock_download):
         # Mocking responses
-        mock_stock_instance = mock_ticker.return_value
-        mock_stock_instance.history.return_value = MagicMock(Close={'2022-03-08': 150, '2022-03-09': 155})
-        mock_stock_instance.info.return_value = {'symbol': 'BTC-USD'}
+        mock_download.side_effect = bulk_download([150.0, 155.0])
 
         crypto = CryptoManager(mock_config.return_value)
         result = crypto.get_crypto_prices_json('BTC-USD')
@@ -132,5 +126,56 @@ class TestCryptoManager(unittest.TestCase):
         expected_keys = ["symbol", "last_close_price", "trend", "invested", "earnings"]
         self.assertTrue(all(key in result[0] for key in expected_keys))
 
+    @patch('mstocks.providers.yf.download')
+    def test_prices_converted_with_shared_rate_lookup(self, mock_download):
+        mock_download.side_effect = bulk_download([100.0, 110.0])
+        fx = MagicMock()
+        fx.convert.side_effect = lambda amount, base, target: amount * 4.0
+        manager = CryptoManager({'crypto_currency': 'PLN'}, fx_provider=fx)
+
+        result = manager.get_crypto_prices('BTC-USD;ETH-USD')
+
+        self.assertEqual(result[0][2], "440.0000 PLN")
+        self.assertEqual(fx.convert.call_args[0][1:], ("USD", "PLN"))
+
+    @patch('mstocks.providers.yf.download')
+    def test_unavailable_rate_shows_placeholder(self, mock_download):
+        mock_download.side_effect = bulk_download([100.0, 110.0])
+        fx = MagicMock()
+        fx.convert.side_effect = FxRateError("down")
+        manager = CryptoManager({'crypto_currency': 'EUR'}, fx_provider=fx)
+
+        result = manager.get_crypto_prices('BTC-USD')
+
+        self.assertEqual(result[0][2], "N/A")
+        self.assertEqual(result[0][5], "—")
+
+    @patch('mstocks.providers.yf.download')
+    def test_json_rows_keep_their_published_shape(self, mock_download):
+        mock_download.side_effect = bulk_download([100.0, 110.0])
+        fx = MagicMock()
+        fx.convert.side_effect = lambda amount, base, target: amount * 4.0
+        config = {'crypto_currency': 'PLN', 'investments': {'cryptos': {'BTC-USD': [{'buy_price': 400, 'quantity': 2}]}}}
+        manager = CryptoManager(config, fx_provider=fx)
+
+        result = manager.get_crypto_prices_json('BTC-USD')
+
+        self.assertEqual(result[0]["last_close_price"], "110.00 USD")
+        self.assertEqual(result[0]["invested"], {"invested": "800.00", "quantity": "2.00", "average_buy_price": "400.00"})
+        self.assertEqual(sorted(result[0]), ["earnings", "invested", "last_close_price", "symbol", "trend"])
+
+    @patch('mstocks.providers.yf.download')
+    def test_only_new_bars_downloaded_after_first_refresh(self, mock_download):
+        mock_download.side_effect = bulk_download([100.0, 110.0])
+        fx = MagicMock()
+        fx.convert.side_effect = lambda amount, base, target: amount
+        manager = CryptoManager({'crypto_currency': 'USD'}, fx_provider=fx)
+
+        manager.get_crypto_prices('BTC-USD')
+        manager.get_crypto_prices_json('BTC-USD')
+
+        self.assertEqual(mock_download.call_args_list[0][1].get('period'), '1mo')
+        self.assertEqual(mock_download.call_args_list[1][1].get('start'), '2024-03-07')
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
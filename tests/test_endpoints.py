@@ -0,0 +1,183 @@
+import json
+import threading
+import time
+import unittest
+
+from mstocks import endpoints
+from mstocks.endpoints import ApiServices, app
+from mstocks.models import Quote
+from mstocks.refresher import QuoteRefresher, Snapshot
+
+
+class CountingManager:
+    # Stand-in manager that records every upstream fetch
+    def __init__(self, delay=0.0):
+        self.calls = []
+        self.delay = delay
+        self.prices = {}
+        self.lock = threading.Lock()
+
+    def fetch(self, symbols):
+        with self.lock:
+            self.calls.append(symbols)
+        time.sleep(self.delay)
+        return [{"symbol": symbol} for symbol in symbols.split(';')]
+
+    def fetch_quotes(self, symbols):
+        return [Quote(row["symbol"], price=self.prices.get(row["symbol"])) for row in self.fetch(symbols)]
+
+    @staticmethod
+    def quote_row(quote):
+        return [quote.symbol]
+
+    @staticmethod
+    def quote_json(quote):
+        row = {"symbol": quote.symbol}
+        if quote.price is not None:
+            row["price"] = quote.price
+        return row
+
+    get_stock_prices_json = fetch
+    get_crypto_prices_json = fetch
+
+
+class TestEndpoints(unittest.TestCase):
+
+    def setUp(self):
+        self.stocks = CountingManager(delay=0.2)
+        self.crypto = CountingManager()
+        config = {"refresh_rate": 60, "default_stocks": ["MSFT", "AAPL"], "default_cryptos": ["BTC-USD"]}
+        self.refresher = QuoteRefresher(config, self.stocks, self.crypto,
+                                        config["default_stocks"], config["default_cryptos"])
+        endpoints._services = ApiServices(config, stocks_manager=self.stocks, crypto_manager=self.crypto,
+                                          refresher=self.refresher)
+        self.client = app.test_client()
+
+    def tearDown(self):
+        endpoints._services = None
+
+    def test_default_stocks_served_from_snapshot(self):
+        self.refresher.refresh("stocks")
+        self.stocks.calls.clear()
+
+        response = self.client.get('/api/stocks')
+
+        self.assertEqual(response.get_json(), [{"symbol": "MSFT"}, {"symbol": "AAPL"}])
+        self.assertIn('X-Data-Age', response.headers)
+        self.assertEqual(self.stocks.calls, [])
+
+    def test_restored_snapshot_marked_stale(self):
+        self.refresher._snapshots["stocks"] = Snapshot(["MSFT", "AAPL"], [Quote("MSFT"), Quote("AAPL")],
+                                                       time.time() - 600, formatter=self.stocks, stale=True)
+
+        response = self.client.get('/api/stocks')
+
+        self.assertEqual(response.get_json(), [{"symbol": "MSFT"}, {"symbol": "AAPL"}])
+        self.assertEqual(response.headers['X-Data-Stale'], "true")
+        self.assertEqual(self.stocks.calls, [])
+        # Forced, since whether the restored quotes are due depends on the market hours right now
+        self.refresher.refresh("stocks", force=True)
+        self.assertNotIn('X-Data-Stale', self.client.get('/api/stocks').headers)
+
+    def test_tracked_subset_served_from_snapshot(self):
+        self.refresher.refresh("stocks")
+        self.stocks.calls.clear()
+        response = self.client.get('/api/stocks/AAPL')
+        self.assertEqual(response.get_json(), [{"symbol": "AAPL"}])
+        self.assertEqual(self.stocks.calls, [])
+
+    def test_first_request_waits_for_first_snapshot(self):
+        threading.Timer(0.05, self.refresher.refresh, args=("crypto",)).start()
+        response = self.client.get('/api/crypto')
+        self.assertEqual(response.get_json(), [{"symbol": "BTC-USD"}])
+
+    def test_no_snapshot_falls_back_to_on_demand_fetch(self):
+        # The refresher never publishes, e.g. because every background fetch fails
+        endpoints._services.ready_timeout = 0.05
+        response = self.client.get('/api/crypto')
+        self.assertEqual(response.get_json(), [{"symbol": "BTC-USD"}])
+        self.assertEqual(self.crypto.calls, ["BTC-USD"])
+
+    def test_blank_symbols_not_fetched(self):
+        response = self.client.get('/api/stocks/ ; ')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json(), [])
+        self.assertEqual(self.stocks.calls, [])
+
+    def test_symbol_order_kept_but_cache_shared(self):
+        first = self.client.get('/api/stocks/TSLA;AAPL').get_json()
+        second = self.client.get('/api/stocks/AAPL;TSLA').get_json()
+        self.assertEqual([row["symbol"] for row in first], ["TSLA", "AAPL"])
+        self.assertEqual([row["symbol"] for row in second], ["AAPL", "TSLA"])
+        self.assertEqual(self.stocks.calls, ["AAPL;TSLA"])
+
+    def test_crypto_routes_cached_separately(self):
+        self.client.get('/api/crypto/ETH-USD')
+        self.client.get('/api/crypto/ETH-USD')
+        self.client.get('/api/stocks/ETH-USD')
+        self.assertEqual(self.crypto.calls, ["ETH-USD"])
+        self.assertEqual(self.stocks.calls, ["ETH-USD"])
+
+    def test_concurrent_clients_share_one_upstream_fetch(self):
+        statuses = []
+
+        def client():
+            statuses.append(app.test_client().get('/api/stocks/TSLA;NVDA').status_code)
+
+        threads = [threading.Thread(target=client) for _ in range(100)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(statuses, [200] * 100)
+        self.assertEqual(len(self.stocks.calls), 1)
+
+    def test_refetch_after_ttl(self):
+        endpoints._services.responses.ttl = 0
+        self.client.get('/api/stocks/TSLA')
+        time.sleep(0.01)
+        self.client.get('/api/stocks/TSLA')
+        self.assertEqual(len(self.stocks.calls), 2)
+
+    def test_stream_sends_current_rows_then_changes(self):
+        self.stocks.prices = {"MSFT": 300.0, "AAPL": 150.0}
+        self.refresher.refresh("stocks")
+        response = self.client.get('/api/stream/stocks', buffered=False)
+        self.assertEqual(response.mimetype, 'text/event-stream')
+        events = iter(response.response)
+        try:
+            first = next(events)
+            self.assertTrue(first.startswith(b"event: quotes\ndata: "))
+            self.assertEqual([row["symbol"] for row in json.loads(first.split(b"data: ")[1])["quotes"]],
+                             ["MSFT", "AAPL"])
+
+            self.stocks.prices = {"MSFT": 300.0, "AAPL": 151.0}
+            self.refresher.refresh("stocks", force=True)
+            second = json.loads(next(events).split(b"data: ")[1])
+            self.assertEqual(second, {"kind": "stocks", "quotes": [{"symbol": "AAPL", "price": 151.0}]})
+        finally:
+            response.close()
+        self.assertEqual(endpoints._services.stream.subscriber_count(), 0)
+
+    def test_stream_of_untracked_symbol_is_not_found(self):
+        response = self.client.get('/api/stream/stocks/TSLA')
+        self.assertEqual(response.status_code, 404)
+
+    def test_metrics_route(self):
+        self.refresher.refresh("stocks")
+        self.client.get('/api/crypto/ETH-USD')
+
+        response = self.client.get('/metrics')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.mimetype.startswith('text/plain'))
+        text = response.get_data(as_text=True)
+        self.assertIn('mstocks_stage_seconds_count{stage="refresh_stocks"}', text)
+        self.assertIn('mstocks_snapshot_age_seconds{kind="stocks"}', text)
+        self.assertIn('mstocks_refresh_failing{kind="crypto"} 0.0', text)
+        self.assertIn('mstocks_cache_misses_total{cache="responses"} 1.0', text)
+
+if __name__ == '__main__':
+    unittest.main()
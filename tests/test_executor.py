@@ -0,0 +1,90 @@
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+from mstocks.batch import BatchFetcher
+from mstocks.crypto import CryptoManager
+from mstocks.executor import FetchExecutor, FetchTimeout
+from tests.helpers import daily_bars
+
+
+class TestFetchExecutor(unittest.TestCase):
+
+    def setUp(self):
+        self.executor = FetchExecutor(max_workers=4, timeout=0.5)
+
+    def tearDown(self):
+        self.executor.shutdown()
+
+    def test_results_keep_input_order(self):
+        delays = {"A": 0.2, "B": 0.0, "C": 0.1}
+
+        def fetch(symbol):
+            time.sleep(delays[symbol])
+            return symbol.lower()
+
+        self.assertEqual(self.executor.map(fetch, ["A", "B", "C"], lambda s, e: None), ["a", "b", "c"])
+
+    def test_wall_time_close_to_slowest_symbol(self):
+        symbols = [f"S{i}" for i in range(4)]
+        start = time.monotonic()
+        self.executor.map(lambda s: time.sleep(0.2), symbols, lambda s, e: None)
+        self.assertLess(time.monotonic() - start, 0.2 * len(symbols) / 2)
+
+    def test_slow_symbol_reported_as_timeout(self):
+        release = threading.Event()
+
+        def fetch(symbol):
+            if symbol == "SLOW":
+                release.wait(5)
+            return symbol
+
+        start = time.monotonic()
+        results = self.executor.map(fetch, ["FAST", "SLOW", "OTHER"], lambda s, e: type(e).__name__)
+        elapsed = time.monotonic() - start
+        release.set()
+
+        self.assertEqual(results, ["FAST", "FetchTimeout", "OTHER"])
+        self.assertLess(elapsed, 1.5)
+
+    def test_exception_turned_into_error_result(self):
+        def fetch(symbol):
+            raise ValueError(symbol)
+
+        results = self.executor.map(fetch, ["X"], lambda s, e: f"{s}:{e}")
+        self.assertEqual(results, ["X:X"])
+
+    def test_queued_symbols_get_their_own_deadline(self):
+        executor = FetchExecutor(max_workers=1, timeout=0.3)
+        results = executor.map(lambda s: time.sleep(0.2) or s, ["A", "B", "C"], lambda s, e: None)
+        executor.shutdown()
+        self.assertEqual(results, ["A", "B", "C"])
+
+    def test_empty_input(self):
+        self.assertEqual(self.executor.map(lambda s: s, [], lambda s, e: None), [])
+
+    def test_crypto_manager_returns_error_row_for_hanging_symbol(self):
+        release = threading.Event()
+
+        def download(symbols, **kwargs):
+            if symbols == ["HANG-USD"]:
+                release.wait(5)
+            return daily_bars(symbols, [1.0, 2.0])
+
+        source = MagicMock()
+        source.download.side_effect = download
+        # One symbol per request, so each symbol gets its own deadline
+        manager = CryptoManager({'crypto_currency': 'USD'}, executor=self.executor,
+                                fetcher=BatchFetcher(source, batch_size=1, executor=self.executor))
+        with patch.object(manager, 'convert_price', side_effect=lambda price: float(price)):
+            rows = manager.get_crypto_prices("BTC-USD;HANG-USD;ETH-USD")
+        release.set()
+
+        self.assertEqual(rows[0][0], "[BTC-USD]")
+        self.assertEqual(rows[1], ["[HANG-USD]", "Error", "Timed out", "—", "—", "—"])
+        self.assertEqual(len(rows[1]), len(rows[0]))
+        self.assertEqual(rows[2][0], "[ETH-USD]")
+
+if __name__ == '__main__':
+    unittest.main()
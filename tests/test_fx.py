@@ -0,0 +1,101 @@
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from mstocks.fx import FxRateProvider, FxRateError
+
+
+class FakeRatesHandler(BaseHTTPRequestHandler):
+    # Local stand-in for api.exchangerate-api.com
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        if self.server.failing:
+            self.send_response(503)
+            self.end_headers()
+            return
+        base = self.path.rsplit('/', 1)[-1]
+        body = json.dumps({"base": base, "rates": {base: 1, "PLN": 4.0, "EUR": 0.9}}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestFxRateProvider(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), FakeRatesHandler)
+        self.server.requests = []
+        self.server.failing = False
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}/v4/latest/{{base}}"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_convert_to_any_target_currency(self):
+        provider = FxRateProvider(url=self.url)
+        self.assertEqual(provider.convert(10, "USD", "PLN"), 40.0)
+        self.assertAlmostEqual(provider.convert(10, "USD", "eur"), 9.0)
+        self.assertEqual(provider.convert(10, "USD", "USD"), 10)
+
+    def test_rates_fetched_once_per_ttl(self):
+        provider = FxRateProvider(url=self.url, ttl=3600)
+        for _ in range(20):
+            provider.get_rate("USD", "PLN")
+        self.assertEqual(self.server.requests, ["/v4/latest/USD"])
+
+    def test_each_base_currency_cached_separately(self):
+        provider = FxRateProvider(url=self.url)
+        provider.get_rate("USD", "PLN")
+        provider.get_rate("EUR", "PLN")
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_concurrent_requests_share_one_fetch(self):
+        provider = FxRateProvider(url=self.url)
+        threads = [threading.Thread(target=provider.get_rate, args=("USD", "PLN")) for _ in range(25)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_stale_rates_served_when_upstream_fails(self):
+        provider = FxRateProvider(url=self.url, ttl=0)
+        provider.get_rate("USD", "PLN")
+        self.server.failing = True
+        self.assertEqual(provider.get_rate("USD", "PLN"), 4.0)
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_error_raised_without_any_cached_rates(self):
+        self.server.failing = True
+        provider = FxRateProvider(url=self.url)
+        with self.assertRaises(FxRateError):
+            provider.get_rate("USD", "PLN")
+
+    def test_unknown_target_currency(self):
+        provider = FxRateProvider(url=self.url)
+        with self.assertRaises(FxRateError):
+            provider.get_rate("USD", "XYZ")
+
+    def test_stored_rates_are_used_without_fetching(self):
+        provider = FxRateProvider(url=self.url)
+        self.assertFalse(provider.has_rates("usd"))
+        provider.store_rates("usd", {"EUR": 0.9})
+        self.assertTrue(provider.has_rates("USD"))
+        self.assertEqual(provider.get_rate("USD", "EUR"), 0.9)
+        self.assertEqual(self.server.requests, [])
+
+    def test_shared_provider_per_ttl(self):
+        self.assertIs(FxRateProvider.shared(ttl=120), FxRateProvider.shared(ttl=120))
+        self.assertIsNot(FxRateProvider.shared(ttl=120), FxRateProvider.shared(ttl=60))
+        self.assertEqual(FxRateProvider.shared(ttl=60).cache.ttl, 60)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+from mstocks.batch import BatchFetcher
+from mstocks.history import HistoryStore
+
+
+class RecordingSource:
+    # Serves bars from a fixed daily series and records what each request asked for
+    def __init__(self, closes, first_day='2024-03-01'):
+        self.series = pd.Series(closes, index=pd.date_range(first_day, periods=len(closes), freq='D'))
+        self.requests = []
+        self.rows_sent = 0
+
+    def download(self, symbols, period=None, start=None):
+        self.requests.append({'symbols': list(symbols), 'period': period, 'start': start})
+        series = self.series if start is None else self.series[start:]
+        self.rows_sent += len(series) * len(symbols)
+        return pd.concat({symbol: pd.DataFrame({'Close': series.values}, index=series.index)
+                          for symbol in symbols}, axis=1)
+
+
+class TestHistoryStore(unittest.TestCase):
+
+    def setUp(self):
+        self.source = RecordingSource([10.0, 11.0, 12.0, 13.0])
+        self.store = HistoryStore(BatchFetcher(self.source))
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_new_symbols_seeded_with_initial_period(self):
+        self.store.update(["AAPL", "MSFT"])
+        self.assertEqual(self.source.requests, [{'symbols': ["AAPL", "MSFT"], 'period': "1mo", 'start': None}])
+        self.assertEqual(list(self.store.bars("AAPL")['close']), [10.0, 11.0, 12.0, 13.0])
+
+    def test_later_updates_only_fetch_from_newest_bar(self):
+        self.store.update(["AAPL"])
+        self.source.rows_sent = 0
+        self.store.update(["AAPL"])
+        self.assertEqual(self.source.requests[-1]['start'], '2024-03-04')
+        self.assertEqual(self.source.rows_sent, 1)
+        self.assertEqual(len(self.store.bars("AAPL")), 4)
+
+    def test_newest_bar_replaced_and_new_bars_appended(self):
+        self.store.update(["AAPL"])
+        self.source.series = pd.Series([13.5, 14.0], index=pd.date_range('2024-03-04', periods=2, freq='D'))
+        self.store.update(["AAPL"])
+        self.assertEqual(list(self.store.bars("AAPL")['close']), [10.0, 11.0, 12.0, 13.5, 14.0])
+
+    def test_histories_returns_last_bars_as_frames(self):
+        histories = self.store.histories(["AAPL"])
+        self.assertEqual(list(histories["AAPL"]['Close']), [12.0, 13.0])
+
+    def test_failed_download_reported_per_symbol(self):
+        class FailingSource:
+            def download(self, symbols, period=None, start=None):
+                raise ConnectionError("down")
+
+        store = HistoryStore(BatchFetcher(FailingSource()))
+        histories = store.histories(["AAPL"])
+        self.assertIsInstance(histories["AAPL"], ConnectionError)
+        with self.assertRaises(ConnectionError):
+            HistoryStore.history_for(histories, "AAPL")
+
+    def test_multi_day_change_from_stored_bars(self):
+        self.store.update(["AAPL"])
+        change, percent = self.store.change("AAPL", 3)
+        self.assertEqual(change, 3.0)
+        self.assertAlmostEqual(percent, 30.0)
+        self.assertIsNone(self.store.change("AAPL", 10))
+
+    def test_bars_persisted_and_memory_mapped_on_restart(self):
+        path = os.path.join(self.tmp_dir.name, "history")
+        HistoryStore(BatchFetcher(self.source), path=path).update(["CDR.WA", "^GSPC"])
+        self.assertTrue(os.path.exists(os.path.join(path, "CDR.WA.npy")))
+        self.assertTrue(os.path.exists(os.path.join(path, "_GSPC.npy")))
+
+        restarted = HistoryStore(BatchFetcher(self.source), path=path)
+        bars = restarted.bars("CDR.WA")
+        self.assertIsInstance(bars, np.memmap)
+        self.assertEqual(list(bars['close']), [10.0, 11.0, 12.0, 13.0])
+        restarted.update(["CDR.WA"])
+        self.assertEqual(self.source.requests[-1]['start'], '2024-03-04')
+
+    def test_max_bars_caps_storage(self):
+        store = HistoryStore(BatchFetcher(self.source), max_bars=2)
+        store.update(["AAPL"])
+        self.assertEqual(list(store.bars("AAPL")['close']), [12.0, 13.0])
+
+if __name__ == '__main__':
+    unittest.main()
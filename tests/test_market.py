@@ -5,47 +5,80 @@ import pytz
 from mstocks.market import Market
 from mstocks.utils import Utils
 
+EASTERN = pytz.timezone('US/Eastern')
+WARSAW = pytz.timezone('Europe/Warsaw')
+
+
+def at(tz, year, month, day, hour, minute=0):
+    return tz.localize(datetime(year, month, day, hour, minute)).timestamp()
+
 
 class TestMarket(unittest.TestCase):
     def setUp(self):
         self.utils = Utils()
         self.market = Market(self.utils)
         
-    @patch('mstocks.market.datetime')
-    def test_market_open_us(self, mock_datetime):
-        # Create a mock datetime object
-        mock_now = datetime(2024, 3, 7, 10, 0, 0, tzinfo=pytz.timezone('US/Eastern'))
-        mock_datetime.now.return_value = mock_now
-
-        status, _ = self.market.is_market_open("AAPL")  # Use a US market symbol
+    def test_market_open_us(self):
+        status, _ = self.market.is_market_open("AAPL", at(EASTERN, 2024, 3, 7, 10))  # Use a US market symbol
         self.assertIn(self.utils.GREEN, status)
 
-    @patch('mstocks.market.datetime')
-    def test_market_closed_us(self, mock_datetime):
-        # Create a mock datetime object
-        mock_now = datetime(2024, 3, 7, 5, 0, 0, tzinfo=pytz.timezone('US/Eastern'))
-        mock_datetime.now.return_value = mock_now
+    def test_market_closed_us(self):
+        status, _ = self.market.is_market_open("AAPL", at(EASTERN, 2024, 3, 7, 5))  # Use a US market symbol
+        self.assertIn(self.utils.RED, status)
+
+    def test_market_open_warsaw(self):
+        status, _ = self.market.is_market_open("CDR.WA", at(WARSAW, 2024, 3, 7, 12))  # Use a Warsaw symbol
+        self.assertIn(self.utils.GREEN, status)
 
-        status, _ = self.market.is_market_open("AAPL")  # Use a US market symbol
+    def test_market_closed_warsaw(self):
+        status, _ = self.market.is_market_open("CDR.WA", at(WARSAW, 2024, 3, 7, 18))  # Use a Warsaw symbol
         self.assertIn(self.utils.RED, status)
 
-    @patch('mstocks.market.datetime')
-    def test_market_open_warsaw(self, mock_datetime):
-        # Create a mock datetime object
-        mock_now = datetime(2024, 3, 7, 12, 0, 0, tzinfo=pytz.timezone('Europe/Warsaw'))
-        mock_datetime.now.return_value = mock_now
+    def test_time_shown_in_exchange_time_zone(self):
+        _, local = self.market.is_market_open("CDR.WA", at(WARSAW, 2024, 3, 7, 12, 30))
+        self.assertEqual(local, "12:30:00")
 
-        status, _ = self.market.is_market_open("CDR.WA")  # Use a US market symbol
-        self.assertIn(self.utils.GREEN, status)
+    def test_exchanges_by_suffix(self):
+        expected = {"AAPL": "US", "CDR.WA": "WA", "VOD.L": "LSE", "SAP.DE": "XETRA", "MC.PA": "EURONEXT",
+                    "NESN.SW": "SIX", "7203.T": "TSE", "0700.HK": "HKEX", "RY.TO": "TSX", "BHP.AX": "ASX"}
+        for symbol, code in expected.items():
+            self.assertEqual(self.market.market_for(symbol), code, symbol)
 
-    @patch('mstocks.market.datetime')
-    def test_market_closed_warsaw(self, mock_datetime):
-        # Create a mock datetime object
-        mock_now = datetime(2024, 3, 7, 18, 0, 0, tzinfo=pytz.timezone('Europe/Warsaw'))
-        mock_datetime.now.return_value = mock_now
+    def test_status_phases(self):
+        tokyo = pytz.timezone('Asia/Tokyo')
+        self.assertEqual(self.market.status("7203.T", at(tokyo, 2024, 3, 7, 8, 30)).phase, Market.PRE_MARKET)
+        self.assertEqual(self.market.status("7203.T", at(tokyo, 2024, 3, 7, 10)).phase, Market.OPEN)
+        self.assertEqual(self.market.status("7203.T", at(tokyo, 2024, 3, 7, 12)).phase, Market.BREAK)
+        self.assertEqual(self.market.status("7203.T", at(tokyo, 2024, 3, 7, 13)).phase, Market.OPEN)
+        self.assertEqual(self.market.status("7203.T", at(tokyo, 2024, 3, 7, 16)).phase, Market.CLOSED)
+        self.assertEqual(self.market.status("7203.T", at(tokyo, 2024, 1, 2, 10)).phase, Market.CLOSED)
 
-        status, _ = self.market.is_market_open("CDR.WA")  # Use a US market symbol
-        self.assertIn(self.utils.RED, status)
+    def test_status_edges_are_epoch_seconds(self):
+        london = pytz.timezone('Europe/London')
+        status = self.market.status("VOD.L", at(london, 2024, 3, 8, 12))  # Friday
+        self.assertTrue(status.is_open)
+        self.assertEqual(status.until, at(london, 2024, 3, 8, 16, 30))
+        self.assertEqual(status.next_close, at(london, 2024, 3, 8, 16, 30))
+        self.assertEqual(status.next_open, at(london, 2024, 3, 11, 8))
+        self.assertEqual(status.last_close, at(london, 2024, 3, 7, 16, 30))
+        self.assertEqual(status.as_json()["status"], "open")
+
+    def test_status_reused_within_a_phase(self):
+        first = self.market.status("AAPL", at(EASTERN, 2024, 3, 7, 10))
+        with patch.object(self.market, '_status') as compute:
+            self.assertIs(self.market.status("AAPL", at(EASTERN, 2024, 3, 7, 15, 59)), first)
+        compute.assert_not_called()
+
+    def test_phase_across_daylight_saving_change(self):
+        # US clocks moved on 2024-03-10, Europe on 2024-03-31
+        self.assertEqual(self.market.session("AAPL", EASTERN.localize(datetime(2024, 3, 11, 9, 35))), Market.OPEN)
+        self.assertEqual(self.market.session("CDR.WA", WARSAW.localize(datetime(2024, 4, 2, 9, 5))), Market.OPEN)
+
+    def test_extra_holidays_by_exchange_code(self):
+        market = Market(self.utils, {"HKEX": ["2024-02-12"]})
+        hong_kong = pytz.timezone('Asia/Hong_Kong')
+        self.assertEqual(market.status("0700.HK", at(hong_kong, 2024, 2, 12, 10)).phase, Market.CLOSED)
+        self.assertEqual(market.status("0700.HK", at(hong_kong, 2024, 2, 13, 10)).phase, Market.OPEN)
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,125 @@
+import json
+import os
+import tempfile
+import threading
+import unittest
+from unittest.mock import MagicMock, patch
+
+import pandas as pd
+from mstocks.metadata import MetadataCache
+from mstocks.stocks import StocksManager
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestMetadataCache(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "metadata.json")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_name_fetched_once_within_ttl(self):
+        cache = MetadataCache(ttl=100, clock=self.clock)
+        fetch = MagicMock(return_value="Apple Inc.")
+        self.clock.now += 99
+        self.assertEqual(cache.get_company_name("AAPL", fetch), "Apple Inc.")
+        self.assertEqual(cache.get_company_name("AAPL", fetch), "Apple Inc.")
+        fetch.assert_called_once_with("AAPL")
+
+    def test_name_refetched_after_ttl(self):
+        cache = MetadataCache(ttl=100, clock=self.clock)
+        fetch = MagicMock(return_value="Apple Inc.")
+        cache.get_company_name("AAPL", fetch)
+        self.clock.now += 101
+        cache.get_company_name("AAPL", fetch)
+        self.assertEqual(fetch.call_count, 2)
+
+    def test_missing_name_uses_short_ttl(self):
+        cache = MetadataCache(ttl=1000, miss_ttl=10, clock=self.clock)
+        fetch = MagicMock(return_value="N/A")
+        cache.get_company_name("XYZ", fetch)
+        self.clock.now += 11
+        cache.get_company_name("XYZ", fetch)
+        self.assertEqual(fetch.call_count, 2)
+
+    def test_failed_fetch_is_not_cached(self):
+        cache = MetadataCache(clock=self.clock)
+        fetch = MagicMock(side_effect=[ValueError("bad symbol"), "Apple Inc."])
+        with self.assertRaises(ValueError):
+            cache.get_company_name("AAPL", fetch)
+        self.assertEqual(cache.get_company_name("AAPL", fetch), "Apple Inc.")
+
+    def test_invalidate_forces_refetch(self):
+        cache = MetadataCache(clock=self.clock)
+        fetch = MagicMock(return_value="Apple Inc.")
+        cache.get_company_name("AAPL", fetch)
+        cache.invalidate("AAPL")
+        cache.get_company_name("AAPL", fetch)
+        self.assertEqual(fetch.call_count, 2)
+
+    def test_warm_restart_skips_fetch(self):
+        cache = MetadataCache(path=self.path, clock=self.clock)
+        cache.get_company_name("AAPL", lambda symbol: "Apple Inc.")
+        cache.flush()
+
+        restarted = MetadataCache(path=self.path, clock=self.clock)
+        fetch = MagicMock()
+        self.assertEqual(restarted.get_company_name("AAPL", fetch), "Apple Inc.")
+        fetch.assert_not_called()
+        with open(self.path) as file:
+            self.assertEqual(json.load(file)["AAPL"]["long_name"], "Apple Inc.")
+
+    def test_concurrent_flushes_leave_a_complete_file(self):
+        cache = MetadataCache(path=self.path, clock=self.clock)
+        errors = []
+
+        def refresh(prefix):
+            try:
+                for i in range(50):
+                    cache.get_company_name(f"{prefix}{i}", lambda symbol: f"{symbol} Inc.")
+                    cache.flush()
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=refresh, args=(prefix,)) for prefix in ("A", "B", "C")]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        with open(self.path) as file:
+            self.assertEqual(len(json.load(file)), 150)
+        self.assertEqual(os.listdir(self.tmp_dir.name), ["metadata.json"])
+
+    def test_corrupt_file_starts_empty(self):
+        with open(self.path, 'w') as file:
+            file.write("{not json")
+        cache = MetadataCache(path=self.path, clock=self.clock)
+        self.assertEqual(cache.get_company_name("AAPL", lambda symbol: "Apple Inc."), "Apple Inc.")
+
+    @patch('mstocks.providers.yf.download', return_value=pd.DataFrame())
+    @patch('mstocks.providers.yf.Ticker')
+    def test_stocks_manager_looks_up_info_once_per_symbol(self, mock_ticker, mock_download):
+        mock_ticker.return_value.info = {'longName': 'Apple Inc.'}
+        manager = StocksManager({'metadata_cache': self.path})
+
+        manager.get_stock_prices('AAPL')
+        result = manager.get_stock_prices_json('AAPL')
+
+        self.assertEqual(mock_ticker.call_count, 1)
+        self.assertEqual(result[0]['company_name'], 'Apple Inc.')
+        self.assertTrue(os.path.exists(self.path))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import unittest
+
+import pandas as pd
+
+from mstocks.metrics import Histogram, Metrics
+from mstocks.providers import ReplayProvider
+from mstocks.stocks import StocksManager
+from mstocks.upstream import Upstream
+
+
+class TestHistogram(unittest.TestCase):
+
+    def test_cumulative_buckets(self):
+        histogram = Histogram(buckets=(0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 3.0):
+            histogram.observe(value)
+        self.assertEqual(histogram.cumulative(), [(0.1, 2), (1.0, 3), (float('inf'), 4)])
+        self.assertEqual(histogram.count, 4)
+        self.assertAlmostEqual(histogram.sum, 3.65)
+
+    def test_quantile(self):
+        histogram = Histogram(buckets=(0.1, 1.0))
+        self.assertEqual(histogram.quantile(0.95), 0.0)
+        for value in [0.05] * 19 + [3.0]:
+            histogram.observe(value)
+        self.assertEqual(histogram.quantile(0.5), 0.1)
+        self.assertEqual(histogram.quantile(1.0), 3.0)
+
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.now = [0.0]
+        self.metrics = Metrics(clock=lambda: self.now[0])
+
+    def test_timer_observes_also_on_error(self):
+        with self.metrics.timer("history"):
+            self.now[0] += 0.2
+        with self.assertRaises(ValueError):
+            with self.metrics.timer("history"):
+                self.now[0] += 0.3
+                raise ValueError()
+        histogram = self.metrics.stage("history")
+        self.assertEqual(histogram.count, 2)
+        self.assertAlmostEqual(histogram.sum, 0.5)
+
+    def test_render_prometheus_text(self):
+        self.metrics.observe("fx", 0.02)
+        self.metrics.count_call("fx", "ok")
+        self.metrics.count_error("stocks", 'BAD"', "not_found")
+        text = self.metrics.render([("snapshot_age_seconds", "gauge", "Age.", [({"kind": "stocks"}, 4)])])
+
+        self.assertIn("# TYPE mstocks_stage_seconds histogram", text)
+        self.assertIn('mstocks_stage_seconds_bucket{stage="fx",le="0.025"} 1', text)
+        self.assertIn('mstocks_stage_seconds_bucket{stage="fx",le="+Inf"} 1', text)
+        self.assertIn('mstocks_stage_seconds_count{stage="fx"} 1', text)
+        self.assertIn('mstocks_upstream_calls_total{operation="fx",outcome="ok"} 1', text)
+        self.assertIn('mstocks_symbol_errors_total{kind="stocks",symbol="BAD\\"",error="not_found"} 1', text)
+        self.assertIn('mstocks_snapshot_age_seconds{kind="stocks"} 4.0', text)
+        self.assertTrue(text.endswith("\n"))
+
+    def test_error_symbols_are_capped(self):
+        self.metrics.MAX_ERROR_SYMBOLS = 2
+        for symbol in ("A", "B", "C", "D", "A"):
+            self.metrics.count_error("stocks", symbol, "failed")
+        self.assertEqual(self.metrics.errors(), {("stocks", "A", "failed"): 2, ("stocks", "B", "failed"): 1,
+                                                 ("stocks", Metrics.OTHER, "failed"): 2})
+
+    def test_summary(self):
+        self.metrics.observe("history", 0.4)
+        self.metrics.count_call("history", "ok")
+        self.metrics.count_call("info", "error")
+        self.metrics.count_error("stocks", "BAD", "not_found")
+        summary = self.metrics.summary()
+        self.assertIn("history 400ms avg", summary)
+        self.assertIn("upstream calls 2 (1 failed)", summary)
+        self.assertIn("BAD x1", summary)
+
+
+class TestInstrumentation(unittest.TestCase):
+
+    def setUp(self):
+        self.metrics = Metrics()
+        index = pd.date_range('2024-03-05', periods=2, freq='B')
+        self.provider = ReplayProvider({"AAPL": pd.DataFrame({'Close': [100.0, 110.0]}, index=index)},
+                                       names={"AAPL": "Apple Inc."}, failing=["BAD"], metrics=self.metrics,
+                                       upstream=Upstream(rate=0, retries=0))
+
+    def test_provider_calls_are_timed_and_counted(self):
+        self.provider.download(["AAPL"])
+        with self.assertRaises(ConnectionError):
+            self.provider.company_name("BAD")
+        self.assertEqual(self.metrics.stage("history").count, 1)
+        self.assertEqual(self.metrics.stage("info").count, 1)
+        self.assertEqual(self.metrics.calls(), {("history", "ok"): 1, ("info", "error"): 1})
+
+    def test_manager_stages_and_symbol_errors(self):
+        manager = StocksManager({'investments': {'AAPL': [{'buy_price': 100, 'quantity': 1}]}, 'batch_size': 1},
+                                provider=self.provider, metrics=self.metrics)
+        manager.get_stock_prices("AAPL;BAD")
+        manager.calculate_earnings("AAPL", 120.0)
+
+        for stage in ("history", "info", "earnings", "format"):
+            self.assertGreater(self.metrics.stage(stage).count, 0, stage)
+        self.assertEqual(self.metrics.errors(), {("stocks", "BAD", "failed"): 1})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import unittest
+
+from mstocks.executor import FetchTimeout
+from mstocks.models import Position, Quote
+from mstocks.upstream import CircuitOpenError
+
+
+class TestPosition(unittest.TestCase):
+
+    def test_unpacks_like_a_tuple(self):
+        earnings, invested, percent, average_price, quantity = Position(10.0, 100.0, 10.0, 50.0, 2.0)
+        self.assertEqual((earnings, invested, percent, average_price, quantity), (10.0, 100.0, 10.0, 50.0, 2.0))
+
+    def test_equality(self):
+        self.assertEqual(Position(1.0, 2.0), Position(1.0, 2.0))
+        self.assertEqual(Position(), (0.0, 0.0, 0.0, 0.0, 0.0))
+        self.assertNotEqual(Position(1.0), Position())
+
+    def test_has_no_instance_dict(self):
+        self.assertFalse(hasattr(Position(), '__dict__'))
+        self.assertFalse(hasattr(Quote("AAPL"), '__dict__'))
+
+
+class TestQuote(unittest.TestCase):
+
+    def test_change(self):
+        quote = Quote("AAPL", "USD", 110.0, 100.0)
+        self.assertEqual(quote.change, 10.0)
+        self.assertEqual(quote.percent_change, 10.0)
+
+    def test_change_unknown_without_previous_close(self):
+        quote = Quote("AAPL", "USD", 110.0)
+        self.assertIsNone(quote.change)
+        self.assertIsNone(quote.percent_change)
+
+    def test_failed_maps_exceptions_to_codes(self):
+        self.assertEqual(Quote.failed("A", FetchTimeout()).error, Quote.TIMED_OUT)
+        self.assertEqual(Quote.failed("A", IndexError()).error, Quote.NOT_FOUND)
+        self.assertEqual(Quote.failed("A", ValueError()).error, Quote.INVALID)
+        self.assertEqual(Quote.failed("A", OSError()).error, Quote.FAILED)
+        self.assertEqual(Quote.failed("A", OSError()).error_message, "Error Fetching Data")
+        self.assertEqual(Quote.failed("A", CircuitOpenError()).error, Quote.UNAVAILABLE)
+
+
+if __name__ == '__main__':
+    unittest.main()
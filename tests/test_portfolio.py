@@ -0,0 +1,79 @@
+import unittest
+
+import numpy as np
+from mstocks.portfolio import Portfolio
+
+
+class TestPortfolio(unittest.TestCase):
+
+    def setUp(self):
+        self.portfolio = Portfolio({
+            'AAPL': [
+                {'buy_price': 100, 'quantity': 0.5, 'fee': 0.95},
+                {'buy_price': 105, 'quantity': 0.3, 'fee': 0.0},
+            ],
+            'MSFT': [{'buy_price': 200, 'quantity': 2}],
+            'PKN.WA': [{'buy_price': 60}],
+        })
+
+    def test_position_matches_per_lot_sums(self):
+        earnings, invested, percent, avg_price, quantity = self.portfolio.position('AAPL', 150)
+        self.assertEqual(earnings, (150 - 100) * 0.5 + (150 - 105) * 0.3)
+        self.assertAlmostEqual(invested, 100 * 0.5 + 0.95 + 105 * 0.3)
+        self.assertAlmostEqual(percent, earnings / invested * 100)
+        self.assertAlmostEqual(avg_price, invested / 0.8)
+        self.assertAlmostEqual(quantity, 0.8)
+
+    def test_quantity_defaults_to_one(self):
+        self.assertEqual(self.portfolio.position('PKN.WA', 66), (6.0, 60.0, 10.0, 60.0, 1.0))
+
+    def test_unknown_symbol_is_all_zero(self):
+        self.assertEqual(self.portfolio.position('GOOG', 150), (0.0, 0.0, 0.0, 0.0, 0.0))
+
+    def test_valuate_matches_position(self):
+        prices = {'AAPL': 150.0, 'MSFT': 190.0, 'PKN.WA': 66.0}
+        valuation = self.portfolio.valuate(prices)
+        for i, symbol in enumerate(self.portfolio.symbols):
+            expected = tuple(self.portfolio.position(symbol, prices[symbol]))
+            self.assertAlmostEqual(valuation['earnings'][i], expected[0])
+            self.assertAlmostEqual(valuation['invested'][i], expected[1])
+            self.assertAlmostEqual(valuation['percent'][i], expected[2])
+            self.assertAlmostEqual(valuation['average_price'][i], expected[3])
+            self.assertAlmostEqual(valuation['quantity'][i], expected[4])
+
+    def test_valuate_leaves_missing_prices_as_nan(self):
+        valuation = self.portfolio.valuate({'MSFT': 210.0})
+        earnings = dict(zip(self.portfolio.symbols, valuation['earnings']))
+        self.assertEqual(earnings['MSFT'], 20.0)
+        self.assertTrue(np.isnan(earnings['AAPL']))
+
+    def test_positions_match_position(self):
+        positions = self.portfolio.positions({'AAPL': 150.0, 'GOOG': 10.0})
+        self.assertEqual(positions['AAPL'], self.portfolio.position('AAPL', 150.0))
+        self.assertEqual(positions['GOOG'], (0.0, 0.0, 0.0, 0.0, 0.0))
+
+    def test_positions_without_price_have_no_earnings(self):
+        positions = self.portfolio.positions({'MSFT': None, 'GOOG': None})
+        self.assertIsNone(positions['MSFT'].earnings)
+        self.assertIsNone(positions['MSFT'].percent)
+        self.assertEqual(positions['MSFT'].invested, 400.0)
+        self.assertIsNone(positions['GOOG'].earnings)
+
+    def test_empty_portfolio(self):
+        portfolio = Portfolio({})
+        self.assertEqual(len(portfolio), 0)
+        self.assertEqual(len(portfolio.valuate({})['earnings']), 0)
+
+    def test_from_config_reads_one_asset_class(self):
+        config = {'investments': {'stocks': {'AAPL': [{'buy_price': 1}]}, 'cryptos': {'BTC-USD': [{'buy_price': 2}]}}}
+        self.assertEqual(Portfolio.from_config(config, 'stocks').symbols, ['AAPL'])
+        self.assertEqual(Portfolio.from_config(config, 'cryptos').symbols, ['BTC-USD'])
+
+    def test_from_config_reads_flat_layout_as_stocks(self):
+        config = {'investments': {'MSFT': [{'buy_price': 285.77, 'quantity': 0.5}]}}
+        self.assertEqual(Portfolio.from_config(config, 'stocks').symbols, ['MSFT'])
+        self.assertEqual(Portfolio.from_config(config, 'cryptos').symbols, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import os
+import pstats
+import tempfile
+import unittest
+
+import pandas as pd
+
+from mstocks.crypto import CryptoManager
+from mstocks.metrics import Metrics
+from mstocks.profiler import RefreshProfiler
+from mstocks.providers import ReplayProvider
+from mstocks.run_manager import RunManager
+from mstocks.stocks import StocksManager
+
+
+class TestRefreshProfiler(unittest.TestCase):
+
+    def setUp(self):
+        index = pd.date_range('2024-03-04', periods=3, freq='B')
+        bars = {symbol: pd.DataFrame({'Close': [1.0, 2.0, 3.0]}, index=index) for symbol in ("AAPL", "MSFT", "BTC-USD")}
+        metrics = Metrics()
+        provider = ReplayProvider(bars, names={"AAPL": "Apple Inc."}, rates={"USD": {"PLN": 4.0}}, failing=["BAD"],
+                                  metrics=metrics)
+        self.config = {'default_stocks': ['MSFT', 'AAPL', 'BAD'], 'default_cryptos': ['BTC-USD'], 'crypto': 'True',
+                       'batch_size': 1, 'snapshot_store': 'unused/snapshot.db'}
+        self.runner = RunManager(self.config)
+        self.runner.metrics = metrics
+        self.runner.stocks_manager = StocksManager(self.config, provider=provider, metrics=self.runner.metrics)
+        self.runner.crypto_manager = CryptoManager(self.config, provider=provider, metrics=self.runner.metrics)
+
+    def test_report_per_stage_and_symbol(self):
+        profiler = RefreshProfiler(self.runner, ["AAPL", "BAD", "MSFT"], ["BTC-USD"], cycles=2)
+        report = profiler.run()
+
+        self.assertEqual(len(profiler.cycle_times), 2)
+        self.assertIn("Profiled 2 refresh cycles of 3 stocks and 1 cryptos", report)
+        for label in ("fetch", "info", "fx", "earnings", "format", "render"):
+            self.assertIn(f"\n{label} ", report)
+        # Every cycle fetches every symbol, one batch each
+        self.assertEqual(self.runner.metrics.stage("history").count, 8)
+        self.assertEqual(self.runner.metrics.stage("render").count, 2)
+        self.assertEqual(set(self.runner.metrics.symbol_times()), {"AAPL", "BAD", "MSFT", "BTC-USD"})
+        self.assertIn("Failed quotes: BAD x2", report)
+        self.assertFalse(self.runner.metrics.per_symbol)
+        self.assertFalse(os.path.exists('unused'))
+
+    def test_writes_cprofile_stats(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "refresh.prof")
+            report = RefreshProfiler(self.runner, ["AAPL"], [], cycles=1, profile_path=path).run()
+            stats = pstats.Stats(path)
+        self.assertTrue(any(function[2] == "refresh" for function in stats.stats))
+        self.assertIn(f"cProfile stats written to {path}", report)
+
+    def test_cprofile_stats_cover_the_fetch_threads(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "refresh.prof")
+            RefreshProfiler(self.runner, ["AAPL", "MSFT"], ["BTC-USD"], cycles=2, profile_path=path).run()
+            stats = pstats.Stats(path)
+        # The downloads and per-symbol quotes run on the mstocks-fetch workers, not the profiling thread
+        calls = {function[2]: stats.stats[function][1] for function in stats.stats}
+        self.assertEqual(calls.get("_download"), 6)
+        self.assertIn("_quote", calls)
+        self.assertIn("refresh", calls)
+
+    def test_top_limits_symbol_rows(self):
+        report = RefreshProfiler(self.runner, ["AAPL", "MSFT"], [], cycles=1, top=1).run()
+        self.assertIn("... and 1 more", report)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+import os
+import tempfile
+import unittest
+
+import pandas as pd
+
+from mstocks.crypto import CryptoManager
+from mstocks.providers import ReplayProvider
+from mstocks.stocks import StocksManager
+from mstocks.upstream import Upstream
+
+
+def bars(*closes):
+    index = pd.date_range('2024-03-04', periods=len(closes), freq='B')
+    return pd.DataFrame({'Open': closes, 'High': closes, 'Low': closes, 'Close': closes, 'Volume': [1000] * len(closes)},
+                        index=index)
+
+
+class TestReplayProvider(unittest.TestCase):
+
+    def setUp(self):
+        self.sleeps = []
+        self.provider = ReplayProvider({"AAPL": bars(100.0, 105.0, 110.0), "BTC-USD": bars(60000.0, 61000.0)},
+                                       names={"AAPL": "Apple Inc."}, rates={"USD": {"PLN": 4.0}},
+                                       sleep=self.sleeps.append)
+
+    def test_download_shape_matches_yfinance(self):
+        frame = self.provider.download(["AAPL", "BTC-USD"], period="2d")
+        self.assertIsInstance(frame.columns, pd.MultiIndex)
+        self.assertEqual(list(frame["AAPL"]["Close"].dropna()), [105.0, 110.0])
+        self.assertEqual(list(frame["BTC-USD"]["Close"].dropna()), [60000.0, 61000.0])
+
+    def test_download_from_start(self):
+        frame = self.provider.download(["AAPL"], start="2024-03-05")
+        self.assertEqual(list(frame["AAPL"]["Close"]), [105.0, 110.0])
+
+    def test_unknown_symbols(self):
+        self.assertTrue(self.provider.download(["NOPE"]).empty)
+        self.assertEqual(self.provider.company_name("NOPE"), "N/A")
+
+    def test_names_and_rates(self):
+        self.assertEqual(self.provider.company_name("AAPL"), "Apple Inc.")
+        self.assertEqual(self.provider.fx_rates("USD"), {"PLN": 4.0})
+
+    def test_latency_injection(self):
+        provider = ReplayProvider(latency=(0.1, 0.2), seed=3, sleep=self.sleeps.append)
+        for _ in range(5):
+            provider.company_name("AAPL")
+        self.assertEqual(len(self.sleeps), 5)
+        self.assertTrue(all(0.1 <= delay <= 0.2 for delay in self.sleeps))
+        # Same seed, same delays
+        again = []
+        replay = ReplayProvider(latency=(0.1, 0.2), seed=3, sleep=again.append)
+        for _ in range(5):
+            replay.company_name("AAPL")
+        self.assertEqual(again, self.sleeps)
+
+    def test_error_injection(self):
+        provider = ReplayProvider(error_rate=0.5, seed=1)
+        outcomes = []
+        for _ in range(20):
+            try:
+                provider.fx_rates("USD")
+                outcomes.append(True)
+            except ConnectionError:
+                outcomes.append(False)
+        self.assertIn(True, outcomes)
+        self.assertIn(False, outcomes)
+
+        failing = ReplayProvider({"AAPL": bars(1.0)}, failing=["AAPL"])
+        with self.assertRaises(ConnectionError):
+            failing.download(["MSFT", "AAPL"])
+
+    def test_record_and_replay_from_directory(self):
+        with tempfile.TemporaryDirectory() as path:
+            ReplayProvider.record(path, ["AAPL", "BTC-USD"], provider=self.provider, period="5d")
+            self.assertTrue(os.path.exists(os.path.join(path, "bars", "AAPL.csv")))
+            replay = ReplayProvider.from_directory(path)
+        self.assertEqual(list(replay.download(["AAPL"], period="2d")["AAPL"]["Close"]), [105.0, 110.0])
+        self.assertEqual(replay.company_name("AAPL"), "Apple Inc.")
+        self.assertEqual(replay.fx_rates("USD"), {"PLN": 4.0})
+
+    def test_calls_go_through_upstream(self):
+        upstream = Upstream(rate=0, retries=1, sleep=lambda seconds: None)
+        provider = ReplayProvider(failing=["AAPL"], upstream=upstream)
+        with self.assertRaises(ConnectionError):
+            provider.company_name("AAPL")
+        self.assertEqual(upstream.state()["retries"], 1)
+
+
+class TestManagersOnReplay(unittest.TestCase):
+    # The whole fetch pipeline runs offline, without patching yfinance
+
+    def setUp(self):
+        self.provider = ReplayProvider({"AAPL": bars(100.0, 110.0), "BTC-USD": bars(60000.0, 61000.0)},
+                                       names={"AAPL": "Apple Inc."}, rates={"USD": {"PLN": 4.0}})
+
+    def test_stock_quotes(self):
+        manager = StocksManager({'investments': {'AAPL': [{'buy_price': 100, 'quantity': 2}]}}, provider=self.provider)
+        quote = manager.fetch_quotes("AAPL")[0]
+        self.assertEqual((quote.price, quote.previous_close, quote.name), (110.0, 100.0, "Apple Inc."))
+        self.assertEqual(quote.position.earnings, 20.0)
+
+    def test_crypto_quotes_converted_with_replayed_rates(self):
+        manager = CryptoManager({'crypto_currency': 'PLN'}, provider=self.provider)
+        quote = manager.fetch_quotes("BTC-USD")[0]
+        self.assertEqual(quote.converted_price, 244000.0)
+
+    def test_injected_errors_become_error_rows(self):
+        provider = ReplayProvider(failing=["AAPL"], upstream=Upstream(rate=0, retries=0))
+        manager = StocksManager({}, provider=provider)
+        self.assertEqual(manager.get_stock_prices("AAPL")[0][3], "Error Fetching Data")
+
+if __name__ == '__main__':
+    unittest.main()
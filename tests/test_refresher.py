@@ -0,0 +1,240 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock
+
+from mstocks.models import Quote
+from mstocks.refresher import QuoteRefresher, Snapshot
+from mstocks.snapshot_store import SnapshotStore
+
+
+def make_manager():
+    manager = MagicMock()
+    manager.fetch_quotes.side_effect = lambda symbols: [Quote(symbol, "USD", 1.0) for symbol in symbols.split(';')]
+    manager.quote_row.side_effect = lambda quote: [quote.symbol]
+    manager.quote_json.side_effect = lambda quote: {"symbol": quote.symbol}
+    return manager
+
+
+class TestQuoteRefresher(unittest.TestCase):
+
+    def setUp(self):
+        self.stocks = make_manager()
+        self.crypto = make_manager()
+        self.config = {"refresh_rate": 60, "refresh_intervals": {"crypto": 0.05}}
+        self.refresher = QuoteRefresher(self.config, self.stocks, self.crypto, ["AAPL", "MSFT"], ["BTC-USD"])
+
+    def tearDown(self):
+        self.refresher.stop()
+
+    def test_intervals_per_asset_class(self):
+        self.assertEqual(self.refresher.jobs["stocks"].interval, 60)
+        self.assertEqual(self.refresher.jobs["crypto"].interval, 0.05)
+
+    def test_no_snapshot_before_first_refresh(self):
+        self.assertIsNone(self.refresher.snapshot("stocks"))
+
+    def test_refresh_publishes_snapshot(self):
+        self.refresher.refresh("stocks")
+        snapshot = self.refresher.snapshot("stocks")
+        self.assertEqual(snapshot.rows, [["AAPL"], ["MSFT"]])
+        self.assertEqual(snapshot.by_symbol["MSFT"], {"symbol": "MSFT"})
+        self.assertLess(snapshot.age, 5)
+        self.stocks.fetch_quotes.assert_called_once_with("AAPL;MSFT")
+
+    def test_failed_refresh_keeps_previous_snapshot(self):
+        self.refresher.refresh("stocks")
+        previous = self.refresher.snapshot("stocks")
+        self.stocks.fetch_quotes.side_effect = ConnectionError("down")
+        self.refresher.refresh("stocks", force=True)
+        self.assertIs(self.refresher.snapshot("stocks"), previous)
+        self.assertIsInstance(self.refresher.jobs["stocks"].last_error, ConnectionError)
+
+    def test_transient_errors_keep_the_last_good_quote(self):
+        self.refresher.refresh("stocks")
+        good = self.refresher.snapshot("stocks")
+        self.stocks.fetch_quotes.side_effect = lambda symbols: [Quote("AAPL", error=Quote.UNAVAILABLE),
+                                                                Quote("MSFT", error=Quote.INVALID)]
+        snapshot = self.refresher.refresh("stocks", force=True)
+        self.assertIs(snapshot.quotes[0], good.quotes[0])
+        self.assertEqual(snapshot.symbol_refreshed_at["AAPL"], good.symbol_refreshed_at["AAPL"])
+        self.assertEqual(snapshot.quotes[1].error, Quote.INVALID)
+
+    def test_background_threads_refresh_on_their_own_schedule(self):
+        self.refresher.start()
+        self.refresher.wait_ready("stocks", timeout=2)
+        time.sleep(0.3)
+        self.assertEqual(self.stocks.fetch_quotes.call_count, 1)
+        self.assertGreater(self.crypto.fetch_quotes.call_count, 2)
+
+    def test_reads_do_not_touch_upstream(self):
+        self.refresher.refresh("crypto")
+        for _ in range(1000):
+            self.refresher.snapshot("crypto")
+        self.assertEqual(self.crypto.fetch_quotes.call_count, 1)
+
+    def test_wait_for_update(self):
+        version = self.refresher.version
+        threading.Timer(0.05, self.refresher.refresh, args=("stocks",)).start()
+        self.assertNotEqual(self.refresher.wait_for_update(version, timeout=2), version)
+
+    def test_empty_watchlist_not_started(self):
+        refresher = QuoteRefresher(self.config, self.stocks, self.crypto, ["AAPL"], [])
+        refresher.start()
+        refresher.wait_ready("stocks", timeout=2)
+        refresher.stop()
+        self.crypto.fetch_quotes.assert_not_called()
+
+    def test_carried_over_quote_keeps_snapshot_age(self):
+        clock = MagicMock(side_effect=[1000.0, 1600.0])
+        scheduler = MagicMock()
+        scheduler.due_symbols.side_effect = lambda symbols, refreshed_at, always_open: (
+            symbols if not refreshed_at else ["AAPL"])
+        refresher = QuoteRefresher(self.config, self.stocks, self.crypto, ["AAPL", "CDR.WA"], [],
+                                   clock=clock, scheduler=scheduler)
+        refresher.refresh("stocks")
+
+        snapshot = refresher.refresh("stocks")
+
+        self.assertEqual(snapshot.refreshed_at, 1000.0)
+        self.assertEqual(snapshot.symbol_refreshed_at, {"AAPL": 1600.0, "CDR.WA": 1000.0})
+
+    def test_snapshot_age(self):
+        snapshot = Snapshot(["AAPL"], [Quote("AAPL")], time.time() - 30)
+        self.assertGreaterEqual(snapshot.age, 30)
+
+    def test_closed_market_symbols_carried_over(self):
+        scheduler = MagicMock()
+        scheduler.due_symbols.side_effect = lambda symbols, refreshed_at, always_open: (
+            symbols if not refreshed_at else ["AAPL"])
+        refresher = QuoteRefresher(self.config, self.stocks, self.crypto, ["AAPL", "CDR.WA"], [],
+                                   scheduler=scheduler)
+        refresher.refresh("stocks")
+        first = refresher.snapshot("stocks")
+        refresher.refresh("stocks")
+        second = refresher.snapshot("stocks")
+
+        self.assertEqual(self.stocks.fetch_quotes.call_args[0][0], "AAPL")
+        self.assertEqual(second.rows, [["AAPL"], ["CDR.WA"]])
+        self.assertEqual(second.symbol_refreshed_at["CDR.WA"], first.symbol_refreshed_at["CDR.WA"])
+        # The snapshot is as old as the quote carried over
+        self.assertEqual(second.refreshed_at, first.symbol_refreshed_at["CDR.WA"])
+
+    def test_rows_formatted_once_on_first_read(self):
+        self.refresher.refresh("stocks")
+        snapshot = self.refresher.snapshot("stocks")
+        self.assertEqual(self.stocks.quote_row.call_count, 0)
+        for _ in range(3):
+            self.assertEqual(snapshot.rows, [["AAPL"], ["MSFT"]])
+        self.assertEqual(self.stocks.quote_row.call_count, 2)
+        self.assertIsInstance(snapshot.quotes[0], Quote)
+
+    def test_listeners_called_with_new_snapshot(self):
+        published = []
+        self.refresher.add_listener(lambda kind, snapshot: published.append((kind, snapshot)))
+        self.refresher.add_listener(lambda kind, snapshot: 1 / 0)
+        snapshot = self.refresher.refresh("stocks")
+        self.assertEqual(published, [("stocks", snapshot)])
+        self.assertIs(self.refresher.snapshot("stocks"), snapshot)
+
+    def test_set_symbols_replaces_watchlist(self):
+        self.refresher.refresh("stocks")
+        self.refresher.set_symbols("stocks", ["MSFT", "TSLA"])
+        snapshot = self.refresher.refresh("stocks")
+        self.assertEqual(snapshot.rows, [["MSFT"], ["TSLA"]])
+        self.assertEqual(self.stocks.fetch_quotes.call_args[0][0], "TSLA")
+
+    def test_removed_symbols_republished_without_fetching(self):
+        self.refresher.refresh("stocks")
+        self.stocks.fetch_quotes.reset_mock()
+        self.refresher.set_symbols("stocks", ["MSFT"])
+        snapshot = self.refresher.refresh("stocks")
+        self.assertEqual(snapshot.rows, [["MSFT"]])
+        self.stocks.fetch_quotes.assert_not_called()
+
+    def test_wake_refreshes_before_the_interval(self):
+        self.refresher.start()
+        self.refresher.wait_ready("stocks", timeout=2)
+        version = self.refresher.version
+        self.refresher.wake("stocks", force=True)
+        self.refresher.wait_for_update(version, timeout=2)
+        self.assertEqual(self.stocks.fetch_quotes.call_args_list[-1][0][0], "AAPL;MSFT")
+        self.assertGreaterEqual(self.stocks.fetch_quotes.call_count, 2)
+
+    def test_nothing_due_publishes_nothing(self):
+        scheduler = MagicMock()
+        scheduler.due_symbols.return_value = []
+        refresher = QuoteRefresher(self.config, self.stocks, self.crypto, ["AAPL"], [], scheduler=scheduler)
+        self.assertIsNone(refresher.refresh("stocks"))
+        self.stocks.fetch_quotes.assert_not_called()
+
+class TestWarmStart(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.config = {"refresh_rate": 60, "snapshot_store": os.path.join(self.directory.name, "snapshot.db")}
+        self.stocks = make_manager()
+        self.crypto = make_manager()
+        first = QuoteRefresher(self.config, self.stocks, self.crypto, ["AAPL", "MSFT"], ["BTC-USD"])
+        first.refresh("stocks")
+        first.store.close()
+        self.stocks.fetch_quotes.reset_mock()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def restart(self, stocks):
+        refresher = QuoteRefresher(self.config, self.stocks, self.crypto, stocks, ["BTC-USD"])
+        self.addCleanup(refresher.store.close)
+        return refresher
+
+    def test_restored_snapshot_served_stale_without_fetching(self):
+        refresher = self.restart(["AAPL", "MSFT"])
+        snapshot = refresher.wait_ready("stocks", timeout=0)
+        self.assertTrue(snapshot.stale)
+        self.assertEqual(snapshot.rows, [["AAPL"], ["MSFT"]])
+        self.stocks.fetch_quotes.assert_not_called()
+        # Crypto was never refreshed before the restart
+        self.assertIsNone(refresher.snapshot("crypto"))
+
+    def test_first_refresh_replaces_stale_snapshot(self):
+        refresher = self.restart(["AAPL", "MSFT"])
+        snapshot = refresher.refresh("stocks", force=True)
+        self.assertFalse(snapshot.stale)
+        self.assertIs(refresher.snapshot("stocks"), snapshot)
+
+    def test_stale_snapshot_kept_when_nothing_is_due(self):
+        refresher = self.restart(["AAPL", "MSFT"])
+        restored = refresher.snapshot("stocks")
+        refresher.scheduler = MagicMock()
+        refresher.scheduler.due_symbols.return_value = []
+        self.assertIsNone(refresher.refresh("stocks"))
+        self.assertIs(refresher.snapshot("stocks"), restored)
+        self.assertTrue(restored.stale)
+        self.stocks.fetch_quotes.assert_not_called()
+
+    def test_restored_quotes_carried_over_stay_stale(self):
+        refresher = self.restart(["AAPL", "MSFT"])
+        restored = refresher.snapshot("stocks")
+        refresher.scheduler = MagicMock()
+        refresher.scheduler.due_symbols.return_value = ["AAPL"]
+
+        snapshot = refresher.refresh("stocks")
+
+        self.assertTrue(snapshot.stale)
+        self.assertEqual(snapshot.stale_symbols, {"MSFT"})
+        self.assertEqual(snapshot.refreshed_at, restored.symbol_refreshed_at["MSFT"])
+        self.assertFalse(refresher.refresh("stocks", force=True).stale)
+
+    def test_watchlist_not_covered_starts_cold(self):
+        refresher = self.restart(["AAPL", "TSLA"])
+        self.assertIsNone(refresher.snapshot("stocks"))
+
+    def test_subset_of_stored_watchlist_restored(self):
+        refresher = self.restart(["MSFT"])
+        self.assertEqual(refresher.snapshot("stocks").symbols, ("MSFT",))
+
+if __name__ == '__main__':
+    unittest.main()
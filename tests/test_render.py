@@ -0,0 +1,85 @@
+import io
+import unittest
+
+from mstocks.render import TerminalRenderer
+from mstocks.utils import Utils
+
+
+class TestTerminalRenderer(unittest.TestCase):
+
+    def setUp(self):
+        self.stream = io.StringIO()
+        self.renderer = TerminalRenderer(self.stream, height=100)
+        self.headers = ['Symbol', 'Price', 'Earnings']
+
+    def frame(self, rows, title="Prices"):
+        return [self.renderer.text(title)] + self.renderer.table("stocks", self.headers, rows)
+
+    def render(self, rows, title="Prices"):
+        self.stream.seek(0)
+        self.stream.truncate()
+        self.renderer.render(self.frame(rows, title))
+        return self.stream.getvalue()
+
+    def test_first_frame_is_drawn_in_full(self):
+        output = self.render([['[AAPL]', '150.00 USD', '—'], ['[MSFT]', '300.00 USD', '—']])
+        self.assertTrue(output.startswith(TerminalRenderer.CLEAR))
+        plain = Utils.strip_ansi_codes(output)
+        self.assertIn('Symbol | Price      | Earnings', plain)
+        self.assertIn('[AAPL] | 150.00 USD | —', plain)
+
+    def test_unchanged_frame_writes_only_cursor_move(self):
+        rows = [['[AAPL]', '150.00 USD', '—'], ['[MSFT]', '300.00 USD', '—']]
+        self.render(rows)
+        self.assertEqual(self.render(rows), "\033[6;1H")
+
+    def test_changed_cell_is_rewritten_in_place(self):
+        self.render([['[AAPL]', '150.00 USD', '—'], ['[MSFT]', '300.00 USD', '—']])
+        output = self.render([['[AAPL]', '150.00 USD', '—'], ['[MSFT]', '301.00 USD', '—']])
+
+        self.assertNotIn(TerminalRenderer.CLEAR, output)
+        # Title, header and separator come first, so MSFT is on screen line 5; the price column starts after "[MSFT] | "
+        self.assertIn("\033[5;10H", output)
+        self.assertIn('301.00 USD', output)
+        self.assertNotIn('AAPL', output)
+        self.assertNotIn('MSFT', output)
+
+    def test_column_widths_are_kept_when_content_shrinks(self):
+        self.render([['[AAPL]', '1500.00 USD', '—']])
+        output = self.render([['[AAPL]', '99.00 USD', '—']])
+        self.assertNotIn(TerminalRenderer.CLEAR, output)
+        self.assertIn('99.00 USD  ', output)
+
+    def test_overflowing_cell_redraws_everything(self):
+        self.render([['[AAPL]', '99.00 USD', '—']])
+        output = self.render([['[GOOGL]', '99.00 USD', '—']])
+        self.assertTrue(output.startswith(TerminalRenderer.CLEAR))
+
+    def test_removed_rows_are_erased(self):
+        self.render([['[AAPL]', '150.00 USD', '—'], ['[MSFT]', '300.00 USD', '—']])
+        output = self.render([['[AAPL]', '150.00 USD', '—']])
+        self.assertIn("\033[5;1H\033[J", output)
+
+    def test_shorter_row_erases_old_cells(self):
+        self.render([['[AAPL]', '150.00 USD', '+5.00 USD']])
+        output = self.render([['[AAPL]', '—']])
+        self.assertNotIn(TerminalRenderer.CLEAR, output)
+        self.assertIn('—', output)
+        self.assertIn("\033[K", output)
+
+    def test_frame_taller_than_terminal_is_drawn_in_full(self):
+        renderer = TerminalRenderer(self.stream, height=3)
+        rows = [['[AAPL]', '150.00 USD', '—'], ['[MSFT]', '300.00 USD', '—']]
+        renderer.render(renderer.table("stocks", self.headers, rows))
+        self.stream.seek(0)
+        self.stream.truncate()
+        renderer.render(renderer.table("stocks", self.headers, rows))
+        self.assertTrue(self.stream.getvalue().startswith(TerminalRenderer.CLEAR))
+
+    def test_counts_bytes_written(self):
+        output = self.render([['[AAPL]', '150.00 USD', '—']])
+        self.assertEqual(self.renderer.bytes_written, len(output.encode('utf-8')))
+
+
+if __name__ == '__main__':
+    unittest.main()
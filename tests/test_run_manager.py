@@ -13,7 +13,7 @@ class TestRun(unittest.TestCase):
         mock_config.return_value.get.return_value = []
         stocks_manager = RunManager(mock_config.return_value)
         stocks_manager.run_silent()
-        mock_display_loop.assert_called_once_with(sorted([]), sorted([]))
+        mock_display_loop.assert_called_once_with(sorted([]), sorted([]), summary=True)
         
     @patch('mstocks.run_manager.RunManager._display_loop')
     @patch('mstocks.stocks.Config')
@@ -31,7 +31,7 @@ class TestRun(unittest.TestCase):
         mock_config.return_value.get.return_value = []
         stocks_manager = RunManager(mock_config.return_value)
         stocks_manager.run_silent()
-        mock_display_loop.assert_called_once_with(sorted([]), sorted([]))
+        mock_display_loop.assert_called_once_with(sorted([]), sorted([]), summary=True)
         
     @patch('mstocks.run_manager.RunManager._display_loop')
     @patch('mstocks.stocks.Config')
@@ -0,0 +1,112 @@
+import unittest
+from datetime import datetime, timedelta
+
+import pytz
+from mstocks.market import Market
+from mstocks.scheduler import RefreshScheduler
+from mstocks.utils import Utils
+
+EASTERN = pytz.timezone('US/Eastern')
+
+
+def at(year, month, day, hour, minute=0, tz=EASTERN):
+    return tz.localize(datetime(year, month, day, hour, minute)).timestamp()
+
+
+class TestRefreshScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.scheduler = RefreshScheduler(Market(Utils()), closed_interval=3600)
+
+    def test_new_symbol_always_due(self):
+        self.assertTrue(self.scheduler.is_due("AAPL", None, at(2024, 3, 9, 12)))
+
+    def test_open_market_due_every_tick(self):
+        now = at(2024, 3, 7, 11)
+        self.assertTrue(self.scheduler.is_due("AAPL", now - 5, now))
+
+    def test_closed_market_skipped_until_closed_interval(self):
+        now = at(2024, 3, 9, 12)  # Saturday
+        self.assertFalse(self.scheduler.is_due("AAPL", now - 600, now))
+        self.assertTrue(self.scheduler.is_due("AAPL", now - 3600, now))
+
+    def test_closed_interval_zero_never_refetches(self):
+        scheduler = RefreshScheduler(Market(Utils()), closed_interval=0)
+        now = at(2024, 3, 9, 12)
+        self.assertFalse(scheduler.is_due("AAPL", now - 19 * 3600, now))
+
+    def test_one_fetch_after_session_close(self):
+        last = at(2024, 3, 7, 15, 59)
+        self.assertTrue(self.scheduler.is_due("AAPL", last, at(2024, 3, 7, 16, 1)))
+        self.assertFalse(self.scheduler.is_due("AAPL", at(2024, 3, 7, 16, 1), at(2024, 3, 7, 16, 30)))
+
+    def test_crypto_always_due(self):
+        now = at(2024, 3, 9, 12)
+        self.assertTrue(self.scheduler.is_due("BTC-USD", now - 1, now, always_open=True))
+
+    def test_markets_evaluated_separately(self):
+        # 10:00 in Warsaw is 04:00 in New York
+        now = pytz.timezone('Europe/Warsaw').localize(datetime(2024, 3, 7, 10, 0)).timestamp()
+        due = self.scheduler.due_symbols(["AAPL", "CDR.WA"], {"AAPL": now - 60, "CDR.WA": now - 60}, now)
+        self.assertEqual(due, ["CDR.WA"])
+
+    def test_week_of_polling_cuts_upstream_calls(self):
+        # Simulate a week of 60 second ticks for one US and one Warsaw symbol
+        start = at(2024, 3, 4, 0)
+        ticks = range(0, 7 * 24 * 3600, 60)
+        refreshed = {}
+        fetches = 0
+        for offset in ticks:
+            now = start + offset
+            for symbol in self.scheduler.due_symbols(["AAPL", "CDR.WA"], refreshed, now):
+                refreshed[symbol] = now
+                fetches += 1
+        self.assertLess(fetches, 0.5 * 2 * len(ticks))
+
+
+class TestMarketCalendar(unittest.TestCase):
+
+    def setUp(self):
+        self.market = Market(Utils())
+
+    def test_us_holidays(self):
+        holidays = self.market.holidays(Market.US, 2024)
+        for day in ["2024-01-01", "2024-01-15", "2024-02-19", "2024-03-29", "2024-05-27",
+                    "2024-06-19", "2024-07-04", "2024-09-02", "2024-11-28", "2024-12-25"]:
+            self.assertIn(datetime.fromisoformat(day).date(), holidays)
+
+    def test_us_observed_holidays(self):
+        holidays = self.market.holidays(Market.US, 2021)
+        self.assertIn(datetime(2021, 7, 5).date(), holidays)    # July 4th on a Sunday
+        self.assertIn(datetime(2021, 12, 24).date(), holidays)  # Christmas on a Saturday
+        self.assertNotIn(datetime(2021, 6, 18).date(), holidays)  # Juneteenth not yet observed
+
+    def test_warsaw_holidays(self):
+        holidays = self.market.holidays(Market.WARSAW, 2024)
+        for day in ["2024-01-01", "2024-01-06", "2024-03-29", "2024-04-01", "2024-05-01", "2024-05-03",
+                    "2024-05-30", "2024-08-15", "2024-11-01", "2024-11-11", "2024-12-24", "2024-12-31"]:
+            self.assertIn(datetime.fromisoformat(day).date(), holidays)
+
+    def test_extra_holidays_from_config(self):
+        market = Market(Utils(), {"US": ["2025-01-09"]})
+        self.assertIn(datetime(2025, 1, 9).date(), market.holidays(Market.US, 2025))
+
+    def test_sessions(self):
+        self.assertEqual(self.market.session("AAPL", EASTERN.localize(datetime(2024, 3, 7, 5))), Market.PRE_MARKET)
+        self.assertEqual(self.market.session("AAPL", EASTERN.localize(datetime(2024, 3, 7, 12))), Market.OPEN)
+        self.assertEqual(self.market.session("AAPL", EASTERN.localize(datetime(2024, 3, 7, 18))), Market.POST_MARKET)
+        self.assertEqual(self.market.session("AAPL", EASTERN.localize(datetime(2024, 3, 7, 22))), Market.CLOSED)
+        self.assertEqual(self.market.session("AAPL", EASTERN.localize(datetime(2024, 7, 4, 12))), Market.CLOSED)
+
+    def test_next_open_skips_weekend_and_holiday(self):
+        friday_evening = EASTERN.localize(datetime(2024, 3, 28, 18))  # Good Friday follows
+        self.assertEqual(self.market.next_open("AAPL", friday_evening),
+                         EASTERN.localize(datetime(2024, 4, 1, 9, 30)))
+
+    def test_last_close(self):
+        monday_morning = EASTERN.localize(datetime(2024, 3, 11, 8))
+        self.assertEqual(self.market.last_close("AAPL", monday_morning),
+                         EASTERN.localize(datetime(2024, 3, 8, 16)))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import functools
+import tempfile
+import unittest
+
+import pandas as pd
+
+from mstocks.crypto import CryptoManager
+from mstocks.metrics import Metrics
+from mstocks.models import Quote
+from mstocks.providers import ReplayProvider
+from mstocks.sharding import ShardPool
+from mstocks.stocks import StocksManager
+
+SYMBOLS = ["AAPL", "MSFT", "CDR.WA", "PKO.WA", "NVDA", "TSLA"]
+
+
+def broken_provider():
+    raise RuntimeError("no provider in this worker")
+
+
+class MutableConfig:
+    # Like Config: a reload swaps config_data for a new dict
+    def __init__(self, data):
+        self.config_data = data
+
+    def get(self, key, default=None):
+        return self.config_data.get(key, default)
+
+
+class TestShardPool(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        index = pd.date_range('2024-03-04', periods=2, freq='B')
+        bars = {symbol: pd.DataFrame({'Close': [100.0 + i, 110.0 + i]}, index=index)
+                for i, symbol in enumerate(SYMBOLS + ["BTC-USD"])}
+        recorded = ReplayProvider(bars, names={symbol: f"{symbol} Inc." for symbol in SYMBOLS},
+                                  rates={"USD": {"PLN": 4.0}}, metrics=Metrics())
+        ReplayProvider.record(cls.directory.name, SYMBOLS + ["BTC-USD"], provider=recorded, period="5d")
+        cls.factory = functools.partial(ReplayProvider.from_directory, cls.directory.name)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.directory.cleanup()
+
+    def setUp(self):
+        self.metrics = Metrics()
+        self.config = MutableConfig({'investments': {'AAPL': [{'buy_price': 100, 'quantity': 2}]},
+                                     'currency_map': {".WA": "PLN", "": "USD"}, 'upstream_rate': 6,
+                                     'metadata_cache': 'data/metadata.json', 'refresh_processes': 2})
+        self.pools = []
+
+    def tearDown(self):
+        for pool in self.pools:
+            pool.close()
+
+    def pool(self, kind="stocks", factory=None):
+        pool = ShardPool(kind, self.config, 2, metrics=self.metrics, provider_factory=factory or self.factory)
+        self.pools.append(pool)
+        return pool
+
+    def test_symbols_are_split_by_stable_hash(self):
+        pool = self.pool()
+        shards = {pool.shard_of(symbol) for symbol in SYMBOLS}
+        self.assertEqual(shards, {0, 1})
+        self.assertEqual([pool.shard_of(symbol) for symbol in SYMBOLS],
+                         [ShardPool("stocks", {}, 2).shard_of(symbol) for symbol in SYMBOLS])
+
+    def test_worker_config(self):
+        config = self.pool().worker_config(1)
+        self.assertEqual(config['refresh_processes'], 1)
+        self.assertEqual(config['upstream_rate'], 3.0)
+        self.assertEqual(config['upstream_burst'], 5.0)
+        self.assertEqual(config['metadata_cache'], 'data/metadata.1.json')
+
+    def test_manager_fetches_through_the_shards(self):
+        manager = StocksManager(self.config, metrics=self.metrics, shards=self.pool())
+        quotes = manager.fetch_quotes(";".join(SYMBOLS))
+
+        self.assertEqual([quote.symbol for quote in quotes], SYMBOLS)
+        self.assertEqual([quote.price for quote in quotes], [110.0 + i for i in range(len(SYMBOLS))])
+        self.assertEqual(quotes[2].currency, "PLN")
+        self.assertEqual(quotes[0].name, "AAPL Inc.")
+        # Valued by the coordinating manager
+        self.assertEqual(quotes[0].position.earnings, 20.0)
+        # Stage timings of both workers are merged
+        self.assertEqual(self.metrics.stage("history").count, 2)
+
+    def test_crypto_converted_in_the_workers(self):
+        manager = CryptoManager(dict(self.config.config_data, crypto_currency="PLN"), metrics=self.metrics,
+                                shards=self.pool("crypto"))
+        quote = manager.fetch_quotes("BTC-USD")[0]
+        self.assertEqual(quote.converted_price, 116.0 * 4)
+
+    def test_reloaded_config_reaches_the_workers(self):
+        pool = self.pool()
+        self.assertEqual(pool.fetch(["CDR.WA"])[0].currency, "PLN")
+        self.config.config_data = dict(self.config.config_data, currency_map={".WA": "EUR", "": "USD"})
+        self.assertEqual(pool.fetch(["CDR.WA"])[0].currency, "EUR")
+
+    def test_worker_without_manager_gives_error_quotes(self):
+        pool = self.pool(factory=broken_provider)
+        quotes = pool.fetch(["AAPL", "MSFT"])
+        self.assertEqual([quote.error for quote in quotes], [Quote.FAILED, Quote.FAILED])
+
+if __name__ == '__main__':
+    unittest.main()
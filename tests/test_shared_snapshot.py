@@ -0,0 +1,254 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+import urllib.request
+from unittest.mock import patch
+
+from mstocks import endpoints, prefork
+from mstocks.config import Config
+from mstocks.endpoints import ApiServices, SharedApiServices, app
+from mstocks.models import Quote
+from mstocks.prefork import PreforkServer
+from mstocks.refresher import Snapshot
+from mstocks.shared_snapshot import SharedSnapshot, SnapshotReader
+
+
+class PriceManager:
+    # Stand-in manager that records every upstream fetch
+    def __init__(self, prices=None):
+        self.prices = prices or {}
+        self.calls = []
+
+    def fetch_quotes(self, symbols):
+        self.calls.append(symbols)
+        return [Quote(symbol, price=self.prices.get(symbol)) for symbol in symbols.split(';')]
+
+    def fetch(self, symbols):
+        return [self.quote_json(quote) for quote in self.fetch_quotes(symbols)]
+
+    @staticmethod
+    def quote_row(quote):
+        return [quote.symbol]
+
+    @staticmethod
+    def quote_json(quote):
+        return {"symbol": quote.symbol, "price": quote.price}
+
+    get_stock_prices_json = fetch
+    get_crypto_prices_json = fetch
+
+
+def snapshot(prices, refreshed_at=None, stale=False):
+    quotes = [Quote(symbol, price=price) for symbol, price in prices.items()]
+    return Snapshot(list(prices), quotes, refreshed_at or time.time(), formatter=PriceManager(), stale=stale)
+
+
+class TestSharedSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        self.shared = SharedSnapshot()
+
+    def tearDown(self):
+        self.shared.close()
+
+    def test_no_view_before_first_publish(self):
+        self.assertIsNone(self.shared.view())
+
+    def test_rows_round_trip_in_requested_order(self):
+        self.shared.publish("stocks", snapshot({"MSFT": 1.5, "AAPL": 2.0}), "metrics 1\n")
+
+        view = self.shared.view()
+
+        self.assertEqual(json.loads(view.encoded("stocks")), [{"symbol": "MSFT", "price": 1.5},
+                                                              {"symbol": "AAPL", "price": 2.0}])
+        self.assertEqual(json.loads(view.encoded("stocks", ["AAPL", "MSFT", "AAPL"])),
+                         [{"symbol": "AAPL", "price": 2.0}, {"symbol": "MSFT", "price": 1.5},
+                          {"symbol": "AAPL", "price": 2.0}])
+        self.assertEqual(view.rows("stocks")["AAPL"], {"symbol": "AAPL", "price": 2.0})
+        self.assertEqual(view.metrics(), "metrics 1\n")
+
+    def test_unknown_symbol_raises_key_error(self):
+        self.shared.publish("stocks", snapshot({"MSFT": 1.5}))
+
+        with self.assertRaises(KeyError):
+            self.shared.view().encoded("stocks", ["TSLA"])
+
+    def test_every_publish_is_a_new_generation_keeping_other_kinds(self):
+        self.shared.publish("stocks", snapshot({"MSFT": 1.5}, refreshed_at=100.0, stale=True))
+        first = self.shared.view()
+        self.shared.publish("crypto", snapshot({"BTC-USD": 30000.0}))
+        second = self.shared.view()
+
+        self.assertEqual(second.generation, first.generation + 1)
+        self.assertEqual(sorted(second.kinds()), ["crypto", "stocks"])
+        self.assertEqual(second.refreshed_at("stocks"), 100.0)
+        self.assertTrue(second.stale("stocks"))
+        # A view keeps reading the file it mapped
+        self.assertEqual(first.kinds(), ["stocks"])
+
+    def test_new_writer_starts_from_published_file(self):
+        self.shared.publish("stocks", snapshot({"MSFT": 1.5}), "metrics 1\n")
+        self.shared._sections = {}
+
+        self.shared.publish_metrics("metrics 2\n")
+
+        view = self.shared.view()
+        self.assertEqual(json.loads(view.encoded("stocks")), [{"symbol": "MSFT", "price": 1.5}])
+        self.assertEqual(view.metrics(), "metrics 2\n")
+
+    def test_reader_tracks_config_watchlist_until_first_publish(self):
+        reader = SnapshotReader(self.shared, {"default_stocks": ["MSFT", "AAPL"]}, interval=0.01)
+
+        self.assertTrue(reader.tracks("stocks", ["AAPL"]))
+        self.assertIsNone(reader.wait_ready("stocks", timeout=0.05))
+        self.shared.publish("stocks", snapshot({"MSFT": 1.5}))
+
+        self.assertFalse(reader.tracks("stocks", ["AAPL"]))
+        self.assertEqual(reader.wait_ready("stocks", timeout=0.05).by_symbol["MSFT"]["price"], 1.5)
+
+    def test_reader_calls_listeners_on_new_snapshots_only(self):
+        reader = SnapshotReader(self.shared, {}, interval=0.01)
+        published = []
+        reader.add_listener(lambda kind, section: published.append((kind, dict(section.by_symbol))))
+        reader.start()
+        try:
+            self.shared.publish("stocks", snapshot({"MSFT": 1.5}))
+            deadline = time.time() + 2
+            while not published and time.time() < deadline:
+                time.sleep(0.01)
+            self.shared.publish_metrics("metrics 2\n")
+            time.sleep(0.1)
+        finally:
+            reader.stop()
+
+        self.assertEqual(published, [("stocks", {"MSFT": {"symbol": "MSFT", "price": 1.5}})])
+
+
+class TestSharedApiServices(unittest.TestCase):
+
+    def setUp(self):
+        self.shared = SharedSnapshot()
+        self.stocks = PriceManager({"TSLA": 3.0})
+        self.crypto = PriceManager()
+        config = {"refresh_rate": 60, "fetch_timeout": 0.05, "default_stocks": ["MSFT", "AAPL"], "default_cryptos": []}
+        endpoints._services = SharedApiServices(config, self.shared, stocks_manager=self.stocks,
+                                                crypto_manager=self.crypto, poll_interval=0.01)
+        self.client = app.test_client()
+
+    def tearDown(self):
+        endpoints._services.close()
+        endpoints._services = None
+        self.shared.close()
+
+    def test_watchlist_served_from_shared_snapshot(self):
+        self.shared.publish("stocks", snapshot({"MSFT": 1.5, "AAPL": 2.0}, stale=True))
+
+        response = self.client.get('/api/stocks')
+
+        self.assertEqual(response.get_json(), [{"symbol": "MSFT", "price": 1.5}, {"symbol": "AAPL", "price": 2.0}])
+        self.assertEqual(response.mimetype, "application/json")
+        self.assertEqual(response.headers['X-Data-Stale'], "true")
+        self.assertEqual(self.client.get('/api/stocks/AAPL').get_json(), [{"symbol": "AAPL", "price": 2.0}])
+        self.assertEqual(self.stocks.calls, [])
+
+    def test_untracked_symbols_fetched_on_demand(self):
+        self.shared.publish("stocks", snapshot({"MSFT": 1.5, "AAPL": 2.0}))
+
+        response = self.client.get('/api/stocks/TSLA;MSFT')
+
+        self.assertEqual(response.get_json(), [{"symbol": "TSLA", "price": 3.0}, {"symbol": "MSFT", "price": None}])
+        self.assertEqual(self.stocks.calls, ["MSFT;TSLA"])
+
+    def test_watchlist_fetched_on_demand_when_nothing_is_published(self):
+        response = self.client.get('/api/stocks')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.stocks.calls, ["AAPL;MSFT"])
+
+    def test_metrics_route_serves_published_text(self):
+        self.shared.publish("stocks", snapshot({"MSFT": 1.5}), "mstocks_test 1.0\n")
+
+        self.assertEqual(self.client.get('/metrics').get_data(as_text=True), "mstocks_test 1.0\n")
+
+    def test_stream_starts_from_latest_rows_then_follows_publishes(self):
+        self.shared.publish("stocks", snapshot({"MSFT": 1.5, "AAPL": 2.0}))
+        response = self.client.get('/api/stream/stocks/AAPL', buffered=False)
+        events = iter(response.response)
+        try:
+            first = json.loads(next(events).split(b"data: ")[1])
+            self.assertEqual(first["quotes"], [{"symbol": "AAPL", "price": 2.0}])
+
+            self.shared.publish("stocks", snapshot({"MSFT": 1.5, "AAPL": 2.5}))
+            second = json.loads(next(events).split(b"data: ")[1])
+            self.assertEqual(second["quotes"], [{"symbol": "AAPL", "price": 2.5}])
+        finally:
+            response.close()
+
+
+class TestPreforkServer(unittest.TestCase):
+
+    def test_children_share_the_configured_upstream_budget(self):
+        config = {"upstream_rate": 4, "upstream_burst": 10}
+        for workers in (1, 2, 4):
+            server = PreforkServer(config, port=0, workers=workers)
+            refresher, worker = server.refresher_config(), server.worker_config()
+            self.assertAlmostEqual(refresher['upstream_rate'] + workers * worker['upstream_rate'], 4)
+            self.assertAlmostEqual(refresher['upstream_burst'] + workers * worker['upstream_burst'], 10)
+            self.assertEqual(refresher['upstream_rate'], 2.0)
+        # Unlimited stays unlimited
+        self.assertEqual(PreforkServer({"upstream_rate": 0}, workers=2).worker_config()['upstream_rate'], 0)
+
+    def test_child_config_keeps_its_limits_over_reloads(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'config.json')
+            with open(path, 'w') as file:
+                json.dump({"upstream_rate": 4, "default_stocks": ["AAPL"]}, file)
+            config = Config(path)
+            server = PreforkServer(config, port=0, workers=2)
+
+            self.assertIs(server._child_config(server.worker_config()), config)
+            with open(path, 'w') as file:
+                json.dump({"upstream_rate": 4, "default_stocks": ["MSFT"]}, file)
+
+            self.assertEqual(config.reload(force=True), {"default_stocks"})
+            self.assertEqual(config.get('upstream_rate'), 1.0)
+
+    @patch('mstocks.prefork.make_server')
+    @patch('mstocks.prefork.endpoints.init_services')
+    @patch('mstocks.prefork.multiprocessing.get_all_start_methods', return_value=['spawn'])
+    def test_threaded_server_without_fork(self, start_methods, init_services, make_server):
+        prefork.run({"api_host": "0.0.0.0", "api_workers": 4}, port=5002)
+
+        init_services.assert_called_once()
+        self.assertEqual(make_server.call_args.args[:2], ("0.0.0.0", 5002))
+        self.assertTrue(make_server.call_args.kwargs["threaded"])
+        make_server.return_value.serve_forever.assert_called_once()
+
+    def test_workers_serve_snapshot_of_refresher_process(self):
+        config = {"refresh_rate": 60, "default_stocks": ["MSFT", "AAPL"], "default_cryptos": [], "upstream_rate": 4}
+        managers = lambda config: ApiServices(config, stocks_manager=PriceManager({"MSFT": 1.5, "AAPL": 2.0}),
+                                              crypto_manager=PriceManager())
+        server = PreforkServer(config, host="127.0.0.1", port=0, workers=2, services_factory=managers)
+        server.start()
+        try:
+            rows, deadline = None, time.time() + 20
+            while rows is None and time.time() < deadline:
+                try:
+                    with urllib.request.urlopen(f"http://127.0.0.1:{server.port}/api/stocks", timeout=5) as response:
+                        rows = json.loads(response.read())
+                except OSError:
+                    time.sleep(0.1)
+            with urllib.request.urlopen(f"http://127.0.0.1:{server.port}/metrics", timeout=5) as response:
+                metrics = response.read().decode()
+        finally:
+            server.stop()
+
+        self.assertEqual(rows, [{"symbol": "MSFT", "price": 1.5}, {"symbol": "AAPL", "price": 2.0}])
+        self.assertIn("mstocks_snapshot_age_seconds", metrics)
+        self.assertIsNone(server.shared)
+
+
+if __name__ == '__main__':
+    unittest.main()
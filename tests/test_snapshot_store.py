@@ -0,0 +1,67 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from mstocks.models import Position, Quote
+from mstocks.refresher import Snapshot
+from mstocks.snapshot_store import SnapshotStore
+
+
+class TestSnapshotStore(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "data", "snapshot.db")
+        self.store = SnapshotStore(self.path)
+
+    def tearDown(self):
+        self.store.close()
+        self.directory.cleanup()
+
+    def test_nothing_stored(self):
+        self.assertIsNone(self.store.load("stocks"))
+
+    def test_round_trip(self):
+        quotes = [Quote("AAPL", "USD", 110.0, 100.0, name="Apple", position=Position(20.0, 200.0, 10.0, 100.0, 2.0),
+                        fetched_at=1000.0),
+                  Quote.failed("NOPE", ValueError(), fetched_at=1000.0)]
+        self.store.save("stocks", Snapshot(["AAPL", "NOPE"], quotes, 1000.0))
+
+        symbols, loaded, refreshed_at, symbol_refreshed_at = SnapshotStore(self.path).load("stocks")
+        self.assertEqual(symbols, ["AAPL", "NOPE"])
+        self.assertEqual(refreshed_at, 1000.0)
+        self.assertEqual(symbol_refreshed_at, {"AAPL": 1000.0, "NOPE": 1000.0})
+        self.assertEqual([quote.as_record() for quote in loaded], [quote.as_record() for quote in quotes])
+
+    def test_only_fetched_quotes_written(self):
+        self.store.save("stocks", Snapshot(["AAPL", "MSFT"], [Quote("AAPL", price=1.0), Quote("MSFT", price=2.0)], 10.0))
+        snapshot = Snapshot(["AAPL", "MSFT"], [Quote("AAPL", price=3.0), Quote("MSFT", price=4.0)], 20.0,
+                            {"AAPL": 20.0, "MSFT": 10.0})
+        self.store.save("stocks", snapshot, fetched=["AAPL"])
+        _, quotes, _, symbol_refreshed_at = self.store.load("stocks")
+        self.assertEqual([quote.price for quote in quotes], [3.0, 2.0])
+        self.assertEqual(symbol_refreshed_at, {"AAPL": 20.0, "MSFT": 10.0})
+
+    def test_removed_symbols_deleted(self):
+        self.store.save("stocks", Snapshot(["AAPL", "MSFT"], [Quote("AAPL"), Quote("MSFT")], 10.0))
+        self.store.save("stocks", Snapshot(["AAPL"], [Quote("AAPL")], 20.0), fetched=[])
+        self.assertEqual(self.store.load("stocks")[0], ["AAPL"])
+        count = sqlite3.connect(self.path).execute("SELECT COUNT(*) FROM quotes").fetchone()[0]
+        self.assertEqual(count, 1)
+
+    def test_asset_classes_kept_apart(self):
+        self.store.save("stocks", Snapshot(["AAPL"], [Quote("AAPL")], 10.0))
+        self.store.save("crypto", Snapshot(["BTC-USD"], [Quote("BTC-USD")], 10.0))
+        self.assertEqual(self.store.load("stocks")[0], ["AAPL"])
+        self.assertEqual(self.store.load("crypto")[0], ["BTC-USD"])
+
+    def test_unreadable_quote_ignored(self):
+        self.store.save("stocks", Snapshot(["AAPL"], [Quote("AAPL")], 10.0))
+        connection = sqlite3.connect(self.path)
+        connection.execute("UPDATE quotes SET quote = '{\"unknown\": 1}'")
+        connection.commit()
+        self.assertIsNone(self.store.load("stocks"))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,16 +1,22 @@
+import logging
 import unittest
 from unittest.mock import patch, MagicMock
 
 import pandas as pd
 from mstocks.config import Config
+from mstocks.batch import BatchFetcher
 from mstocks.stocks import StocksManager
 from mstocks.utils import Utils
+from mstocks.models import Quote
+from mstocks.upstream import Upstream
+from tests.helpers import bulk_download, bulk_source
 
 class TestStocksManager(unittest.TestCase):
 
+    @patch('mstocks.providers.yf.download', return_value=pd.DataFrame())
     @patch('mstocks.stocks.Config')
-    @patch('mstocks.stocks.yf.Ticker')
-    def test_get_stock_prices(self, mock_ticker, mock_config):
+    @patch('mstocks.providers.yf.Ticker')
+    def test_get_stock_prices(self, mock_ticker, mock_config, mock_download):
         # Setup mock config and mock ticker
         mock_config_instance = mock_config.return_value
         mock_config_instance.get.return_value = {"": "USD"}
@@ -30,7 +36,7 @@ class TestStocksManager(unittest.TestCase):
         # Check if the result contains the correct entries
         self.assertIsInstance(result, list)
 
-    @patch('mstocks.stocks.yf.Ticker')
+    @patch('mstocks.providers.yf.Ticker')
     def test_empty_symbol_string_for_stocks(self, mock_ticker):
         # Assuming your StocksManager is initialized here
         stocks_manager = StocksManager(Config())
@@ -38,9 +44,9 @@ class TestStocksManager(unittest.TestCase):
         expected_result = [['\x1b[91m●\x1b[0m', any, '[]', 'N/A', 'Not available', '—']]
         self.assertEqual(len(result), len(expected_result))
 
-    @patch('mstocks.stocks.yf.Ticker')
-    def test_ticker_returns_empty_dataframe_for_stocks(self, mock_ticker):
-        mock_ticker.return_value.history.return_value = MagicMock(empty=True)
+    @patch('mstocks.providers.yf.download', return_value=pd.DataFrame())
+    @patch('mstocks.providers.yf.Ticker')
+    def test_ticker_returns_empty_dataframe_for_stocks(self, mock_ticker, mock_download):
         stocks_manager = StocksManager(Config())
         result = stocks_manager.get_stock_prices('AAPL')
         self.assertTrue(any("Not available" in item for item in result))
@@ -122,9 +128,10 @@ class TestStocksManager(unittest.TestCase):
         self.assertEqual(percentage, 0)
         self.assertEqual(buy_price, 0)
 
-    @patch('mstocks.stocks.yf.Ticker')
+    @patch('mstocks.providers.yf.download', return_value=pd.DataFrame())
+    @patch('mstocks.providers.yf.Ticker')
     @patch('mstocks.stocks.Config')
-    def test_correct_json_structure(self, mock_config, mock_ticker):
+    def test_correct_json_structure(self, mock_config, mock_ticker, mock_download):
         # Mocking responses
         mock_stock_instance = mock_ticker.return_value
         mock_stock_instance.history.return_value = MagicMock(Close={'2022-03-08': 150, '2022-03-09': 155})
@@ -138,12 +145,140 @@ class TestStocksManager(unittest.TestCase):
         expected_keys = ["symbol", "company_name", "last_close_price", "trend", "invested", "earnings"]
         self.assertTrue(all(key in result[0] for key in expected_keys))
 
-    @patch('mstocks.stocks.yf.Ticker')
-    def test_incorrect_symbol_handling(self, mock_ticker):
+    @patch('mstocks.providers.yf.download', return_value=pd.DataFrame())
+    @patch('mstocks.providers.yf.Ticker')
+    def test_incorrect_symbol_handling(self, mock_ticker, mock_download):
         mock_ticker.side_effect = ValueError("Invalid symbol")
         stocks_manager = StocksManager(Config())
         result = stocks_manager.get_stock_prices_json('INVALID')
         self.assertTrue(any("Error" in item for item in result))
 
+    @patch('mstocks.providers.yf.Ticker')
+    def test_get_stock_prices_uses_one_download_per_batch(self, mock_ticker):
+        mock_ticker.return_value.info = {'longName': 'Test Company'}
+        source = bulk_source()
+        stocks_manager = StocksManager({'batch_size': 2}, fetcher=BatchFetcher(source, batch_size=2))
+
+        result = stocks_manager.get_stock_prices('AAPL;MSFT;TSLA')
+
+        self.assertEqual(source.download.call_count, 2)
+        self.assertEqual([row[1] for row in result], ['[AAPL]', '[MSFT]', '[TSLA]'])
+        self.assertTrue(all(row[3] == "110.00 USD" for row in result))
+
+    @patch('mstocks.providers.yf.Ticker')
+    def test_portfolio_valued_once_per_refresh(self, mock_ticker):
+        mock_ticker.return_value.info = {'longName': 'Test Company'}
+        source = bulk_source()
+        config = {'investments': {'AAPL': [{'buy_price': 100, 'quantity': 2}], 'MSFT': [{'buy_price': 120}]}}
+        stocks_manager = StocksManager(config, fetcher=BatchFetcher(source))
+
+        with patch.object(stocks_manager.portfolio, 'valuate', wraps=stocks_manager.portfolio.valuate) as valuate:
+            quotes = stocks_manager.fetch_quotes('AAPL;MSFT;TSLA')
+
+        valuate.assert_called_once()
+        self.assertEqual([quote.position.earnings for quote in quotes], [20.0, -10.0, 0.0])
+
+    @patch('mstocks.providers.yf.Ticker')
+    def test_fetch_quotes_builds_rows_and_json_from_one_download(self, mock_ticker):
+        mock_ticker.return_value.info = {'longName': 'Test Company'}
+        source = bulk_source()
+        stocks_manager = StocksManager({}, fetcher=BatchFetcher(source))
+
+        quotes = stocks_manager.fetch_quotes('AAPL')
+
+        source.download.assert_called_once()
+        self.assertEqual((quotes[0].price, quotes[0].previous_close), (110.0, 100.0))
+        self.assertEqual(stocks_manager.quote_row(quotes[0])[1], '[AAPL]')
+        self.assertEqual(stocks_manager.quote_json(quotes[0])['last_close_price'], '110.00 USD')
+
+    @patch('mstocks.providers.yf.Ticker')
+    def test_paused_upstream_keeps_price_without_name(self, mock_ticker):
+        source = bulk_source()
+        upstream = Upstream(rate=0, failure_threshold=1)
+        upstream.breaker.record_failure()
+        stocks_manager = StocksManager({}, fetcher=BatchFetcher(source), upstream=upstream)
+
+        quotes = stocks_manager.fetch_quotes('AAPL')
+
+        mock_ticker.assert_not_called()
+        self.assertEqual((quotes[0].price, quotes[0].name), (110.0, 'N/A'))
+
+    @patch('mstocks.providers.yf.download')
+    def test_failed_downloads_go_through_upstream(self, mock_download):
+        # yf.download logs the tickers it failed to get and returns empty frames for them
+        def throttled(symbols, **kwargs):
+            logger = logging.getLogger('yfinance')
+            logger.error('\n1 Failed download:')
+            logger.error("['AAPL']: YFRateLimitError('Too Many Requests. Rate limited. Try after a while.')")
+            return pd.concat({'AAPL': pd.DataFrame(columns=['Open', 'High', 'Low', 'Close', 'Volume'])}, axis=1)
+
+        mock_download.side_effect = throttled
+        upstream = Upstream(rate=0, retries=1, failure_threshold=1, sleep=lambda seconds: None)
+        stocks_manager = StocksManager({}, upstream=upstream)
+
+        with self.assertLogs('yfinance', level='ERROR'):
+            quotes = stocks_manager.fetch_quotes('AAPL')
+
+        self.assertEqual(mock_download.call_count, 2)
+        self.assertEqual(upstream.retried, 1)
+        self.assertEqual(quotes[0].error, Quote.FAILED)
+        self.assertEqual(upstream.breaker.state, "open")
+
+    @patch('mstocks.providers.yf.download')
+    def test_retried_download_recovers(self, mock_download):
+        good = bulk_download([100.0, 110.0])
+
+        def throttled_once(symbols, **kwargs):
+            if mock_download.call_count == 1:
+                logging.getLogger('yfinance').error("['AAPL']: YFRateLimitError('Too Many Requests.')")
+                return pd.concat({'AAPL': pd.DataFrame(columns=['Close'])}, axis=1)
+            return good(symbols, **kwargs)
+
+        mock_download.side_effect = throttled_once
+        upstream = Upstream(rate=0, retries=1, sleep=lambda seconds: None)
+        stocks_manager = StocksManager({}, upstream=upstream)
+        stocks_manager.metadata.get_company_name = lambda symbol, fetch: 'Test Company'
+
+        with self.assertLogs('yfinance', level='ERROR'):
+            quotes = stocks_manager.fetch_quotes('AAPL')
+
+        self.assertEqual(quotes[0].price, 110.0)
+        self.assertEqual(upstream.breaker.failures, 0)
+
+    @patch('mstocks.providers.yf.download')
+    def test_delisted_symbol_is_not_retried(self, mock_download):
+        def delisted(symbols, **kwargs):
+            logging.getLogger('yfinance').error("['NOPE']: YFPricesMissingError('possibly delisted; no price data found')")
+            return pd.concat({'NOPE': pd.DataFrame(columns=['Close'])}, axis=1)
+
+        mock_download.side_effect = delisted
+        upstream = Upstream(rate=0, retries=1, sleep=lambda seconds: None)
+        stocks_manager = StocksManager({}, upstream=upstream)
+        stocks_manager.metadata.get_company_name = lambda symbol, fetch: 'N/A'
+
+        with self.assertLogs('yfinance', level='ERROR'):
+            quotes = stocks_manager.fetch_quotes('NOPE')
+
+        self.assertEqual(mock_download.call_count, 1)
+        self.assertIsNone(quotes[0].price)
+
+    def test_json_rows_keep_their_published_shape(self):
+        stocks_manager = StocksManager({'investments': {'stocks': {'AAPL': [{'buy_price': 100, 'quantity': 2}]}}},
+                                       fetcher=BatchFetcher(bulk_source()))
+        stocks_manager.metadata.get_company_name = lambda symbol, fetch: 'Test Company'
+
+        rows = stocks_manager.get_stock_prices_json('AAPL')
+        failed = stocks_manager.quote_json(Quote.failed('NOPE', ValueError()))
+
+        self.assertEqual(rows, [{
+            "symbol": "AAPL",
+            "company_name": "Test Company",
+            "last_close_price": "110.00 USD",
+            "trend": {"price_change": 10.0, "currency": "USD", "percent_change": 10.0},
+            "invested": {"invested": "200.00", "currency": "USD", "quantity": "2.00", "buy_price": "100.00"},
+            "earnings": {"earnings": 20.0, "currency": "USD", "percent_earned": 10.0},
+        }])
+        self.assertEqual(failed, ["Error", "[NOPE]", "N/A", "Invalid Symbol or Data Not Found", "—", "—", "—"])
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
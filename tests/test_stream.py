@@ -0,0 +1,84 @@
+import json
+import unittest
+
+from mstocks.stream import QuoteStream
+
+
+def rows(**prices):
+    return {symbol: {"symbol": symbol, "last_close_price": price, "fetched_at": 1.0} for symbol, price in prices.items()}
+
+
+class TestQuoteStream(unittest.TestCase):
+
+    def setUp(self):
+        self.stream = QuoteStream()
+        self.notified = []
+
+    def subscribe(self, symbols, kind="stocks"):
+        return self.stream.subscribe(kind, symbols, lambda: self.notified.append(kind))
+
+    @staticmethod
+    def symbols(payload):
+        return [row["symbol"] for row in json.loads(payload)["quotes"]]
+
+    def test_first_publish_sends_every_subscribed_row(self):
+        subscription = self.subscribe(["AAPL", "MSFT"])
+        self.stream.publish("stocks", rows(AAPL=1.0, MSFT=2.0, TSLA=3.0))
+        payload = json.loads(subscription.take())
+        self.assertEqual(payload["kind"], "stocks")
+        self.assertEqual(sorted(row["symbol"] for row in payload["quotes"]), ["AAPL", "MSFT"])
+
+    def test_only_changed_rows_are_sent(self):
+        subscription = self.subscribe(["AAPL", "MSFT"])
+        self.stream.publish("stocks", rows(AAPL=1.0, MSFT=2.0))
+        subscription.take()
+        changed = self.stream.publish("stocks", rows(AAPL=1.5, MSFT=2.0))
+        self.assertEqual(changed, ["AAPL"])
+        self.assertEqual(self.symbols(subscription.take()), ["AAPL"])
+
+    def test_fetch_time_alone_is_no_change(self):
+        subscription = self.subscribe(["AAPL"])
+        self.stream.publish("stocks", rows(AAPL=1.0))
+        subscription.take()
+        later = rows(AAPL=1.0)
+        later["AAPL"]["fetched_at"] = 2.0
+        self.assertEqual(self.stream.publish("stocks", later), [])
+        self.assertIsNone(subscription.take())
+
+    def test_unrelated_changes_do_not_notify(self):
+        self.subscribe(["AAPL"])
+        self.stream.publish("stocks", rows(MSFT=2.0))
+        self.stream.publish("crypto", rows(AAPL=2.0))
+        self.assertEqual(self.notified, [])
+
+    def test_slow_subscriber_gets_latest_row_once(self):
+        subscription = self.subscribe(["AAPL"])
+        for price in (1.0, 2.0, 3.0):
+            self.stream.publish("stocks", rows(AAPL=price))
+        payload = json.loads(subscription.take())
+        self.assertEqual([row["last_close_price"] for row in payload["quotes"]], [3.0])
+
+    def test_current_rows_for_new_subscribers(self):
+        self.assertIsNone(self.stream.current("stocks", ["AAPL"]))
+        self.stream.publish("stocks", rows(AAPL=1.0, MSFT=2.0))
+        self.stream.publish("stocks", rows(AAPL=1.5, MSFT=2.0))
+        payload = json.loads(self.stream.current("stocks", ["MSFT", "AAPL"]))
+        self.assertEqual([row["last_close_price"] for row in payload["quotes"]], [2.0, 1.5])
+
+    def test_rows_encoded_once_for_all_subscribers(self):
+        subscriptions = [self.subscribe(["AAPL"]) for _ in range(1000)]
+        self.stream.publish("stocks", rows(AAPL=1.0))
+        payloads = {subscription.take() for subscription in subscriptions}
+        self.assertEqual(len(payloads), 1)
+        self.assertEqual(len(self.notified), 1000)
+
+    def test_closed_subscription_gets_nothing(self):
+        subscription = self.subscribe(["AAPL"])
+        subscription.close()
+        self.stream.publish("stocks", rows(AAPL=1.0))
+        self.assertIsNone(subscription.take())
+        self.assertEqual(self.stream.subscriber_count(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,30 @@
+import unittest
+from mstocks.suffix import SuffixResolver
+
+
+class TestSuffixResolver(unittest.TestCase):
+
+    def test_longest_suffix_wins_regardless_of_order(self):
+        resolver = SuffixResolver({"": "USD", ".L": "GBP", ".WA": "PLN", "-USD": "USD"}, default="EUR")
+        self.assertEqual(resolver.resolve("PKN.WA"), "PLN")
+        self.assertEqual(resolver.resolve("VOD.L"), "GBP")
+        self.assertEqual(resolver.resolve("AAPL"), "USD")
+
+    def test_default_when_nothing_matches(self):
+        resolver = SuffixResolver({".WA": "PLN"}, default="USD")
+        self.assertEqual(resolver.resolve("AAPL"), "USD")
+        self.assertEqual(resolver.resolve("WA"), "USD")
+
+    def test_symbol_shorter_than_suffix(self):
+        resolver = SuffixResolver({".TO": "CAD"})
+        self.assertIsNone(resolver.resolve("T"))
+
+    def test_memo_starts_over_when_full(self):
+        resolver = SuffixResolver({".WA": "PLN"}, default="USD", memo_size=2)
+        for symbol in ("A.WA", "B", "C"):
+            resolver.resolve(symbol)
+        self.assertEqual(resolver._memo, {"C": "USD"})
+        self.assertEqual(resolver.resolve("A.WA"), "PLN")
+
+if __name__ == '__main__':
+    unittest.main()
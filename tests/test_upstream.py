@@ -0,0 +1,124 @@
+import unittest
+from unittest.mock import MagicMock
+
+from mstocks.upstream import CircuitBreaker, CircuitOpenError, TokenBucket, Upstream
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class TestTokenBucket(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.bucket = TokenBucket(rate=2, burst=3, clock=self.clock, sleep=self.clock.sleep)
+
+    def test_burst_then_rate(self):
+        waits = [self.bucket.acquire() for _ in range(5)]
+        self.assertEqual(waits[:3], [0.0, 0.0, 0.0])
+        self.assertAlmostEqual(waits[3], 0.5)
+        self.assertAlmostEqual(waits[4], 0.5)
+        self.assertAlmostEqual(self.clock.now, 1.0)
+        self.assertAlmostEqual(self.bucket.waited, 1.0)
+
+    def test_refills_up_to_burst(self):
+        for _ in range(3):
+            self.bucket.acquire()
+        self.clock.now += 100
+        self.assertEqual(self.bucket.tokens, 3)
+
+    def test_zero_rate_is_unlimited(self):
+        bucket = TokenBucket(rate=0, burst=1, clock=self.clock, sleep=self.clock.sleep)
+        self.assertEqual([bucket.acquire() for _ in range(10)], [0.0] * 10)
+
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.breaker = CircuitBreaker(threshold=2, reset_timeout=30, clock=self.clock)
+
+    def test_opens_after_threshold_failures_in_a_row(self):
+        self.breaker.record_failure()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.before_call()
+
+    def test_half_open_trial(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.clock.now += 30
+        self.breaker.before_call()
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+        # Only one trial at a time
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.before_call()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.clock.now += 30
+        self.breaker.before_call()
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.assertEqual(self.breaker.trips, 2)
+
+
+class TestUpstream(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.sleeps = []
+
+        def sleep(seconds):
+            self.sleeps.append(seconds)
+            self.clock.sleep(seconds)
+
+        self.upstream = Upstream(rate=100, burst=100, retries=2, backoff=1, max_backoff=8, failure_threshold=2,
+                                 reset_timeout=30, clock=self.clock, sleep=sleep, jitter=lambda: 0.5)
+
+    def test_transient_errors_retried_with_backoff(self):
+        func = MagicMock(side_effect=[ConnectionError(), ConnectionError(), "bars"])
+        self.assertEqual(self.upstream.call(func, "AAPL"), "bars")
+        func.assert_called_with("AAPL")
+        self.assertEqual(self.sleeps, [0.5, 1.0])
+        self.assertEqual(self.upstream.state()["retries"], 2)
+        self.assertEqual(self.upstream.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_bad_requests_not_retried(self):
+        func = MagicMock(side_effect=ValueError("Invalid symbol"))
+        with self.assertRaises(ValueError):
+            self.upstream.call(func)
+        self.assertEqual(func.call_count, 1)
+        self.assertEqual(self.upstream.breaker.failures, 0)
+
+    def test_sustained_failures_open_the_circuit(self):
+        func = MagicMock(side_effect=ConnectionError())
+        for _ in range(2):
+            with self.assertRaises(ConnectionError):
+                self.upstream.call(func)
+        self.assertEqual(func.call_count, 6)
+        with self.assertRaises(CircuitOpenError):
+            self.upstream.call(func)
+        self.assertEqual(func.call_count, 6)
+        state = self.upstream.state()
+        self.assertEqual(state["breaker_state"], "open")
+        self.assertEqual(state["failures"], 2)
+        self.assertEqual(state["rejected"], 1)
+
+    def test_shared_per_settings(self):
+        self.assertIs(Upstream.from_config({}), Upstream.from_config({'upstream_rate': 5}))
+        self.assertIsNot(Upstream.from_config({}), Upstream.from_config({'upstream_rate': 1}))
+
+if __name__ == '__main__':
+    unittest.main()
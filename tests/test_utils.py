@@ -1,7 +1,8 @@
 import unittest
 from unittest.mock import patch
 from io import StringIO
-from mstocks.utils import Utils
+from mstocks.suffix import SuffixResolver
+from mstocks.utils import Utils, Cell
 
 class TestUtils(unittest.TestCase):
     
@@ -36,6 +37,23 @@ class TestUtils(unittest.TestCase):
         currency = Utils.get_currency(symbol, currency_map)
         self.assertEqual(currency, "JPY")
 
+    def test_get_currency_compiles_each_map_once(self):
+        currency_map = {".WA": "PLN", "": "USD"}
+        Utils._currency_resolvers = {}
+        with patch('mstocks.utils.SuffixResolver', wraps=SuffixResolver) as resolver:
+            currencies = [Utils.get_currency(symbol, currency_map) for symbol in ("PKO.WA", "AAPL", "CDR.WA")]
+            Utils.get_currency("PKO.WA", dict(currency_map))
+            Utils.get_currency("PKO.WA", {".WA": "EUR"})
+
+        self.assertEqual(currencies, ["PLN", "USD", "PLN"])
+        self.assertEqual(resolver.call_count, 2)
+
+    def test_get_currency_longest_suffix_wins(self):
+        # The catch-all comes first, but must not shadow the more specific suffix
+        currency_map = {"": "USD", ".WA": "PLN"}
+        self.assertEqual(Utils.get_currency("PKN.WA", currency_map), "PLN")
+        self.assertEqual(Utils.get_currency("AAPL", currency_map), "USD")
+
     @patch('sys.stdout', new_callable=StringIO)
     def test_print_table_with_fixed_width(self, mock_stdout):
         prices_with_market_status = [
@@ -68,6 +86,40 @@ class TestUtils(unittest.TestCase):
         self.assertIn("100.00 USD", output)  # Check for invested amount
         self.assertIn(Utils.strip_ansi_codes("+1.00 USD (0.67%) ↑"), output) 
 
+    def test_value_cell_keeps_value_without_color_codes(self):
+        cell = Utils.value_cell(-2.0, "USD", 0.8)
+        self.assertEqual(cell, "-2.00 USD (0.80%) ↓")
+        self.assertEqual(cell.value, -2.0)
+        self.assertEqual(Utils._format_value(-2.0, "USD", 0.8), Utils.RED + cell + Utils.RESET)
+
+    def test_table_cells_color_from_values_and_measure_raw_text(self):
+        rows = [["[AAPL]", Cell("+1.00 USD", 1.0), Cell("-3.00 USD", -3.0)],
+                ["[MSFT]", Cell("+0.00 USD", 0.0), "—"]]
+        cells, widths = Utils.table_cells(rows, ["Symbol", "Trend", "Earnings"])
+        self.assertEqual(widths, [6, 9, 9])
+        self.assertEqual(cells[0][1], (Utils.OKGREEN + "+1.00 USD" + Utils.ENDC, 9))
+        self.assertEqual(cells[0][2], (Utils.FAIL + "-3.00 USD" + Utils.ENDC, 9))
+        self.assertEqual(cells[1][1], ("+0.00 USD", 9))
+        self.assertEqual(cells[1][2], ("—", 1))
+
+    def test_table_cells_measure_colored_strings_by_visible_width(self):
+        cells, widths = Utils.table_cells([[Utils.GREEN + "●" + Utils.RESET + " (10:00)", "—"]], ["Status", "Earnings"])
+        self.assertEqual(widths[0], len("● (10:00)"))
+
+    def test_plain_text_cells_are_not_parsed_or_colored(self):
+        cells, _ = Utils.table_cells([["[AAPL]", "+12.50 USD"], ["[BAD]", "Timed out"]], ["Symbol", "Earnings"])
+        self.assertEqual(cells[0][1], ("+12.50 USD", 10))
+        self.assertEqual(cells[1][1], ("Timed out", 9))
+
+    @patch('sys.stdout', new_callable=StringIO)
+    def test_print_table_pads_colored_cells_to_column_width(self, mock_stdout):
+        Utils.print_table_with_fixed_width([
+            ["[AAPL]", "Crypto", "1.00 USD", Cell("+1.00 USD ↑", 1.0), "10.00 USD", "—"],
+            ["Error", "[BAD]", "N/A", "Not found", "10:00:00", "—"],
+        ], include_market_status=False)
+        lines = Utils.strip_ansi_codes(mock_stdout.getvalue()).splitlines()
+        self.assertEqual(len(set(len(line) for line in lines)), 1)
+
 
 if __name__ == '__main__':
     unittest.main()